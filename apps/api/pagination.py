@@ -24,47 +24,62 @@ This will get much simpler  once we switch to django-rest-framework 3.1 which
 has built-in support for this.
 """
 
+import base64
+import json
 import urlparse
 
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
 from django.http import Http404, QueryDict
 from rest_framework import pagination
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
 
-class MetaSerializer(serializers.Serializer):
+class BaseMetaSerializer(serializers.Serializer):
     previous = serializers.SerializerMethodField()
     next = serializers.SerializerMethodField()
-    offset = serializers.IntegerField(read_only=True)
     limit = serializers.IntegerField(read_only=True)
-    total_count = serializers.IntegerField(read_only=True)
 
     def get_next(self, page):
         if page.has_next():
-            return self._make_link(page.next_offset(), page.limit)
+            return self._make_link(page.next_params())
         else:
             return None
 
     def get_previous(self, page):
         if page.has_previous():
-            return self._make_link(page.previous_offset(), page.limit)
+            return self._make_link(page.previous_params())
         else:
             return None
 
-    def _make_link(self, offset, limit):
+    def _make_link(self, params):
         request = self.context.get('request')
         url = request and request.build_absolute_uri() or ''
         (scheme, netloc, path, query, fragment) = urlparse.urlsplit(url)
         query_dict = QueryDict(query).copy()
-        query_dict['offset'] = offset
-        query_dict['limit'] = limit
+        query_dict.update(params)
         query = query_dict.urlencode()
         return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
 
+class MetaSerializer(BaseMetaSerializer):
+    offset = serializers.IntegerField(read_only=True)
+    total_count = serializers.IntegerField(read_only=True)
+
+class CursorMetaSerializer(BaseMetaSerializer):
+    pass
+
 class AmaraPaginationSerializer(pagination.BasePaginationSerializer):
-    meta = MetaSerializer(source='*')
+    meta = serializers.SerializerMethodField()
 
     results_field = 'objects'
 
+    def get_meta(self, page):
+        return page.meta_serializer_class(page, context=self.context).data
+
 class AmaraPage(object):
+    meta_serializer_class = MetaSerializer
+
     def __init__(self, queryset, offset, limit):
         self.object_list = queryset[offset:offset+limit]
         self.total_count = queryset.count()
@@ -74,24 +89,132 @@ class AmaraPage(object):
     def has_next(self):
         return self.offset + self.limit < self.total_count
 
-    def next_offset(self):
-        return self.offset + self.limit
+    def next_params(self):
+        return {
+            'offset': self.offset + self.limit,
+            'limit': self.limit,
+        }
 
     def has_previous(self):
         return self.offset > 0
 
-    def previous_offset(self):
-        return max(self.offset - self.limit, 0)
+    def previous_params(self):
+        return {
+            'offset': max(self.offset - self.limit, 0),
+            'limit': self.limit,
+        }
+
+def encode_cursor(value, pk, backwards):
+    return base64.urlsafe_b64encode(json.dumps([value, pk, backwards]))
+
+def decode_cursor(cursor):
+    """Decode a cursor
+
+    Returns (value, pk, backwards).  value and pk will be None for the empty
+    cursor, which means start at the first page.
+    """
+    if not cursor:
+        return (None, None, False)
+    try:
+        value, pk, backwards = json.loads(
+            base64.urlsafe_b64decode(str(cursor)))
+    except (TypeError, ValueError):
+        raise ParseError('Invalid cursor')
+    return value, pk, bool(backwards)
+
+class CursorPage(object):
+    """Page of results using keyset pagination.
+
+    Rather than using OFFSET, we order the queryset by (sort field, pk) and
+    filter it to start after the last item of the previous page.  This stays
+    fast for deep pages and doesn't need a COUNT query.  The cursor is an
+    opaque string that encodes the (sort value, pk) pair to start from and
+    which direction to go.
+    """
+    meta_serializer_class = CursorMetaSerializer
+
+    def __init__(self, queryset, cursor, limit, ordering):
+        self.limit = limit
+        field_name = ordering.lstrip('-')
+        self.field = queryset.model._meta.get_field(field_name)
+        pk_name = queryset.model._meta.pk.name
+        value, pk, backwards = decode_cursor(cursor)
+        # when going backwards we scan in the opposite direction, then
+        # reverse the results.
+        descending = ordering.startswith('-') != backwards
+        if pk is not None:
+            try:
+                value = self.field.to_python(value)
+                pk = queryset.model._meta.pk.to_python(pk)
+            except ValidationError:
+                raise ParseError('Invalid cursor')
+            queryset = queryset.filter(self._after_position_q(
+                field_name, value, pk, descending))
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(prefix + field_name, prefix + pk_name)
+        object_list = list(queryset[:limit+1])
+        more_results = len(object_list) > limit
+        object_list = object_list[:limit]
+        if backwards:
+            object_list.reverse()
+            self._has_next = True
+            self._has_previous = more_results
+        else:
+            self._has_next = more_results
+            self._has_previous = pk is not None
+        self.object_list = object_list
+
+    def _after_position_q(self, field_name, value, pk, descending):
+        op = 'lt' if descending else 'gt'
+        if field_name == self.field.model._meta.pk.name:
+            return Q(**{'pk__' + op: pk})
+        return (Q(**{field_name + '__' + op: value}) |
+                Q(**{field_name: value, 'pk__' + op: pk}))
+
+    def _cursor_for(self, obj, backwards):
+        return encode_cursor(self.field.value_to_string(obj), obj.pk,
+                             backwards)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def next_params(self):
+        return {
+            'cursor': self._cursor_for(self.object_list[-1], False),
+            'limit': self.limit,
+        }
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def previous_params(self):
+        return {
+            'cursor': self._cursor_for(self.object_list[0], True),
+            'limit': self.limit,
+        }
 
 class AmaraPaginationMixin(object):
+    """Pagination for our API views
+
+    By default we use offset/limit pagination.  Views can set cursor_ordering
+    to also allow cursor pagination, which clients get by passing the cursor
+    query param (use an empty value for the first page).  cursor_ordering is
+    the ordering to use if the queryset doesn't specify one.
+    """
     paginate_by_param = 'limit'
     max_paginate_by = 100
+    cursor_ordering = None
 
     def paginate_queryset(self, queryset):
         limit = self.get_paginate_by()
         if not limit:
             return None
 
+        if (self.cursor_ordering is not None and
+            'cursor' in self.request.query_params):
+            return CursorPage(queryset, self.request.query_params['cursor'],
+                              limit, self.get_cursor_ordering(queryset))
+
         offset = self.request.query_params.get('offset', 0)
         try:
             offset = int(offset)
@@ -99,3 +222,19 @@ class AmaraPaginationMixin(object):
             offset = 0
         return AmaraPage(queryset, offset, limit)
 
+    def get_cursor_ordering(self, queryset):
+        """Get the field to order by for cursor pagination.
+
+        We use the first ordering of the queryset if it's a field on the
+        model itself, since we can't make cursors for related fields.
+        """
+        order_by = queryset.query.order_by
+        if order_by:
+            try:
+                field = queryset.model._meta.get_field(order_by[0].lstrip('-'))
+            except FieldDoesNotExist:
+                pass
+            else:
+                if not field.rel:
+                    return order_by[0]
+        return self.cursor_ordering
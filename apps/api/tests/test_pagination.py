@@ -0,0 +1,90 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.test import TestCase
+from nose.tools import *
+from rest_framework.exceptions import ParseError
+
+from api.pagination import CursorPage, encode_cursor
+from videos.models import Video
+from utils.factories import *
+
+class CursorPageTest(TestCase):
+    def setUp(self):
+        self.videos = [VideoFactory(title='video-%s' % (i // 2))
+                       for i in xrange(7)]
+
+    def page_ids(self, page):
+        return [v.id for v in page.object_list]
+
+    def walk_forwards(self, ordering):
+        page = CursorPage(Video.objects.all(), '', 3, ordering)
+        pages = [page]
+        while page.has_next():
+            page = CursorPage(Video.objects.all(),
+                              page.next_params()['cursor'], 3, ordering)
+            pages.append(page)
+        return pages
+
+    def test_forwards(self):
+        pages = self.walk_forwards('id')
+        assert_equal([self.page_ids(p) for p in pages], [
+            [v.id for v in self.videos[0:3]],
+            [v.id for v in self.videos[3:6]],
+            [v.id for v in self.videos[6:7]],
+        ])
+        assert_false(pages[0].has_previous())
+        assert_true(pages[1].has_previous())
+
+    def test_duplicate_sort_values(self):
+        # titles repeat, so we need the id to break ties
+        pages = self.walk_forwards('-title')
+        ids = sum([self.page_ids(p) for p in pages], [])
+        assert_equal(sorted(ids), sorted(v.id for v in self.videos))
+        titles = [Video.objects.get(id=id).title for id in ids]
+        assert_equal(titles, sorted(titles, reverse=True))
+
+    def test_backwards(self):
+        pages = self.walk_forwards('title')
+        last_page = pages[-1]
+        page = CursorPage(Video.objects.all(),
+                          last_page.previous_params()['cursor'], 3, 'title')
+        assert_equal(self.page_ids(page), self.page_ids(pages[-2]))
+        assert_true(page.has_next())
+        assert_true(page.has_previous())
+
+    def test_invalid_cursor(self):
+        with assert_raises(ParseError):
+            CursorPage(Video.objects.all(), 'not-a-cursor', 3, 'id')
+
+    def test_invalid_cursor_value(self):
+        # The cursor decodes, but the values don't match the field types
+        with assert_raises(ParseError):
+            CursorPage(Video.objects.all(),
+                       encode_cursor('not-a-date', self.videos[1].id, False),
+                       3, '-created')
+        with assert_raises(ParseError):
+            CursorPage(Video.objects.all(),
+                       encode_cursor('1', 'not-a-pk', False), 3, 'id')
+
+    def test_encode_cursor(self):
+        page = CursorPage(Video.objects.all(),
+                          encode_cursor(str(self.videos[1].id),
+                                        self.videos[1].id, False),
+                          3, 'id')
+        assert_equal(self.page_ids(page),
+                     [v.id for v in self.videos[2:5]])
@@ -464,6 +464,45 @@ class SubtitlesViewTest(TestCase):
         assert_equal(response.content,
                      babelsubs.to(self.version.get_subtitles(), 'dfxp'))
 
+    def test_raw_format_is_cached(self):
+        self.client.get(self.url, HTTP_ACCEPT='text/srt')
+        with mock.patch('babelsubs.to') as mock_to:
+            response = self.client.get(self.url, HTTP_ACCEPT='text/srt')
+        assert_false(mock_to.called)
+        assert_equal(response.content,
+                     babelsubs.to(self.version.get_subtitles(), 'srt'))
+
+    def test_raw_format_conditional_get(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt')
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt',
+                                   HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # weak validators should also match
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt',
+                                   HTTP_IF_NONE_MATCH='W/' + etag)
+        assert_equal(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # a different format has a different etag
+        response = self.client.get(self.url, HTTP_ACCEPT='text/vtt',
+                                   HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, status.HTTP_200_OK)
+
+    def test_raw_format_last_modified(self):
+        # Last-Modified is only used when the version number is pinned,
+        # since the public tip can change to an older version
+        pinned_url = self.url + '?version_number=%s' % (
+            self.version.version_number,)
+        response = self.client.get(pinned_url, HTTP_ACCEPT='text/srt')
+        last_modified = response['Last-Modified']
+        response = self.client.get(pinned_url, HTTP_ACCEPT='text/srt',
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert_equal(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt',
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert_equal(response.status_code, status.HTTP_200_OK)
+        assert_false(response.has_header('Last-Modified'))
+
     def test_normal_format(self):
         # if we're not using a raw subtitle format, we should just return json
         response = self.client.get(self.url)
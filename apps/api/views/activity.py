@@ -134,6 +134,7 @@ class ActivityViewSet(AmaraPaginationMixin, viewsets.ReadOnlyModelViewSet):
     lookup_field = 'id'
     serializer_class = ActivitySerializer
     paginate_by = 20
+    cursor_ordering = '-created'
 
     def get_queryset(self):
         self.applied_language_filter = False
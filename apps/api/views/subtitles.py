@@ -235,11 +235,13 @@ Create a new note
 
 from __future__ import absolute_import
 
+import calendar
 import json
 
 from django.db import IntegrityError
 from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.http import http_date, parse_http_date_safe
 from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics
@@ -260,6 +262,7 @@ from api.views.videos import VideoMetadataSerializer
 from videos.models import Video
 from subtitles import compat
 from subtitles import pipeline
+from subtitles import rendercache
 from subtitles import workflows
 from subtitles.models import (SubtitleLanguage, SubtitleVersion,
                               ORIGIN_WEB_EDITOR, ORIGIN_API)
@@ -455,9 +458,15 @@ class SubtitleLanguageViewSet(AmaraPaginationMixin,
         }
 
 class SubtitleRenderer(renderers.BaseRenderer):
-    """Render SubtitleSets using babelsubs."""
+    """Render SubtitleVersions and SubtitleSets using babelsubs.
+
+    SubtitleVersions are rendered through subtitles.rendercache, so we only
+    run babelsubs the first time a version is requested in a format.
+    """
     def render(self, data, media_type=None, renderer_context=None):
-        if isinstance(data, SubtitleSet):
+        if isinstance(data, SubtitleVersion):
+            return rendercache.render(data, self.format)
+        elif isinstance(data, SubtitleSet):
             return babelsubs.to(data, self.format)
         else:
             # Fall back to JSON renderer for other responses.  This handles
@@ -496,8 +505,8 @@ class SubtitlesField(serializers.CharField):
         })
 
     def get_attribute(self, version):
-        return babelsubs.to(version.get_subtitles(),
-                            self.context['sub_format'])
+        return rendercache.render(version,
+                                  self.context['sub_format']).decode('utf-8')
 
     def to_representation(self, value):
         if self.context['sub_format'] == 'json':
@@ -638,19 +647,54 @@ class SubtitlesView(generics.CreateAPIView):
         # If we're rendering the subtitles directly, then we skip creating a
         # serializer and return the subtitles instead
         if isinstance(request.accepted_renderer, SubtitleRenderer):
-            return Response(version.get_subtitles())
+            return self.get_raw_subtitles_response(version)
         serializer = self.get_serializer(version)
         return Response(serializer.data)
 
+    def get_raw_subtitles_response(self, version):
+        """Get a response for a raw subtitle format.
+
+        Versions never change, so the ETag can be derived from the version.
+        Last-Modified is only used when the request pins a version number,
+        since otherwise the public tip can move back to an older version
+        (for example after an unpublish).  304 responses don't need the
+        subtitles at all.
+        """
+        etag = rendercache.etag(version, self.request.accepted_renderer.format)
+        headers = {
+            'ETag': etag,
+        }
+        last_modified = None
+        if self.get_version_number() is not None:
+            last_modified = calendar.timegm(version.created.utctimetuple())
+            headers['Last-Modified'] = http_date(last_modified)
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(
+            self.request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        if if_none_match is not None:
+            not_modified = rendercache.etag_matches(etag, if_none_match)
+        else:
+            not_modified = (last_modified is not None and
+                            if_modified_since is not None and
+                            if_modified_since >= last_modified)
+        if not_modified:
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+        return Response(version, headers=headers)
+
+    def get_version_number(self):
+        version_number = self.request.query_params.get('version_number')
+        if version_number is None:
+            version_number = self.request.query_params.get('version')
+        return version_number
+
     def get_object(self):
         video = self.get_video()
         workflow = workflows.get_workflow(video)
         language_code = self.kwargs['language_code']
         if not workflow.user_can_view_video(self.request.user):
             raise PermissionDenied()
-        version_number = self.request.query_params.get('version_number')
-        if version_number is None:
-            version_number = self.request.query_params.get('version')
+        version_number = self.get_version_number()
         if version_number is not None:
             version = video.newsubtitleversion_set.get(
                 language_code=language_code,
@@ -464,6 +464,7 @@ class TeamSubview(TeamSubviewMixin, viewsets.ModelViewSet):
 class TeamMemberViewSet(AmaraPaginationMixin, TeamSubview):
     lookup_field = 'username'
     paginate_by = 20
+    cursor_ordering = 'id'
 
     def get_serializer_class(self):
         if 'username' in self.kwargs:
@@ -468,6 +468,7 @@ class VideoViewSet(AmaraPaginationMixin,
     serializer_class = VideoSerializer
     queryset = Video.objects.all()
     paginate_by = 20
+    cursor_ordering = 'id'
 
     lookup_field = 'video_id'
     lookup_value_regex = r'(\w|-)+'
@@ -31,13 +31,27 @@ class AmaraAuthenticationMiddleware(object):
             request.user = auth.get_user(request)
             request.session[auth.SESSION_KEY] = request.user.id
         else:
-            request.user = self._get_cached_user(user_id)
+            request.user = self._get_cached_user(
+                user_id, getattr(request, '_user_cache_group', None))
 
-    def _get_cached_user(self, user_id):
+    def get_user_cache_group(self, request):
+        """Get the CacheGroup that use_cached_user() will load the user from
+
+        Use this to fetch the user's cache data together with other cache
+        groups.  Returns None if we don't know the user ID from the session.
+        """
+        user_id = request.session.get(auth.SESSION_KEY)
+        if user_id is None:
+            return None
+        cache_group = User.cache.get_cache_group(user_id)
+        request._user_cache_group = cache_group
+        return cache_group
+
+    def _get_cached_user(self, user_id, cache_group=None):
         if user_id is None:
             return AnonymousUser()
         try:
-            return User.cache.get_instance(user_id)
+            return User.cache.get_instance(user_id, cache_group=cache_group)
         except User.DoesNotExist:
             return AnonymousUser()
 
@@ -48,3 +62,5 @@ class AmaraAuthenticationMiddleware(object):
         # that.
         request.use_cached_user = functools.partial(self.use_cached_user,
                                                     request)
+        request.get_user_cache_group = functools.partial(
+            self.get_user_cache_group, request)
@@ -9,4 +9,4 @@ Amara uses a couple tricks for caching things.
 
 from __future__ import absolute_import
 
-from .cachegroup import CacheGroup, ModelCacheManager
+from .cachegroup import CacheGroup, ModelCacheManager, fetch_cache_groups
@@ -63,9 +63,11 @@ examples of how we use those cache groups:
   page we search that list of the user ID
 
 When we create the cache groups, we use the video-page cache pattern.
-This makes it so we can render the page with 3 cache requests.  One
-get_many fetches the Video instance and all cache values related to the video,
-and similarly for the Team and User.
+This makes it so we can render the page with very few cache requests.  We use
+:func:`fetch_cache_groups` to fetch the Video instance and all cache values
+related to the video, together with the User's values, using one get_many
+call.  If the video is part of a team, we need a second get_many to fetch the
+Team values, since we don't know the team until we've loaded the TeamVideo.
 
 Cache invalidation is always tricky.  We use a simple system where if a change
 could affect any cache value, we invalidate the entire group of values.
@@ -143,6 +145,40 @@ get.  If the version changes between the get() and set() calls, then the
 value stored with set() will not be valid.  This works somewhat similarly to
 the memcached GETS and CAS operations.
 
+When the version value isn't set, we use the memcached ADD operation to set
+it.  ADD only stores the value if the key isn't already set, so if 2
+processes both see a missing version, they will both end up using the same
+one rather than each invalidating the values the other just stored.
+
+Fetching multiple cache groups
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Pages often need values from several cache groups.  Use
+:func:`fetch_cache_groups` to fetch the version keys and cache pattern keys
+for all of them with a single get_many call.  After that, calls to get() and
+get_many() on the groups will only hit the cache for keys that weren't
+already fetched.
+
+.. _cache-stale-while-revalidate:
+
+Stale-while-revalidate
+^^^^^^^^^^^^^^^^^^^^^^
+
+When a popular cache group gets invalidated, every request misses at the same
+time and they all recalculate the values at once.  To avoid this, get_or_calc()
+uses a short lock key for each value.  The process that gets the lock
+recalculates the value.  Other processes keep returning the value from the
+previous version until the new one is stored.
+
+We only return stale values for a grace period after the invalidation
+(CACHE_GROUP_STALE_GRACE_PERIOD, in seconds).  To know when the invalidation
+happened, invalidate() adds a timestamp to the version string.  Versions
+created because the version key was missing (evicted, or new deploy) don't
+have a timestamp, so we never serve stale values for them.
+
+We track the cachegroup.stale-served and cachegroup.lock-contended metrics to
+see how often this happens.
+
 Cache Groups and DB Models
 ^^^^^^^^^^^^^^^^^^^^^^^^^^
 
@@ -158,18 +194,33 @@ attribute to your class definition.
 
 .. autoclass:: CacheGroup
 .. autoclass:: ModelCacheManager
+.. autofunction:: fetch_cache_groups
 """
 from __future__ import absolute_import
 import collections
+import time
 
 from django.conf import settings
 from django.core.cache import cache
 
 from utils import codes
+from utils.metrics import Meter
 
 def get_commit_id():
     return settings.LAST_COMMIT_GUID
 
+def _stale_grace_period():
+    return getattr(settings, 'CACHE_GROUP_STALE_GRACE_PERIOD', 30)
+
+def _lock_timeout():
+    return getattr(settings, 'CACHE_GROUP_LOCK_TIMEOUT', 10)
+
+def _lock_wait():
+    return getattr(settings, 'CACHE_GROUP_LOCK_WAIT', 2)
+
+# How often to check for the value while another process calculates it
+LOCK_POLL_INTERVAL = 0.05
+
 class _CacheWrapper(object):
     """Wrap cache access for CacheGroup.
 
@@ -188,20 +239,46 @@ class _CacheWrapper(object):
         return value
 
     def get_many(self, keys):
-        unfetched_keys = [key for key in keys if key not in self._cache_data]
+        unfetched_keys = self.unfetched_keys(keys)
         if unfetched_keys:
             self._run_get_many(unfetched_keys)
         return dict((key, self._cache_data.get(key)) for key in keys)
 
+    def unfetched_keys(self, keys):
+        return [key for key in keys if key not in self._cache_data]
+
     def _run_get_many(self, keys):
         result = cache.get_many([self._prefix_key(key) for key in keys])
+        self.store_fetched_values(keys, result)
+
+    def store_fetched_values(self, keys, result):
+        """Remember values that were fetched from the cache
+
+        Args:
+            keys: unprefixed keys that were fetched
+            result: result of the get_many() call with the prefixed keys
+        """
         for key in keys:
             self._cache_data[key] = result.get(self._prefix_key(key))
 
     def set(self, key, value, timeout=None):
-        cache.set(self._prefix_key(key), value)
+        cache.set(self._prefix_key(key), value, timeout)
         self._cache_data[key] = value
 
+    def delete(self, key):
+        cache.delete(self._prefix_key(key))
+        self._cache_data.pop(key, None)
+
+    def add(self, key, value, timeout=None):
+        """Set a value only if it's not already set.
+
+        Returns True if the value was stored.
+        """
+        added = cache.add(self._prefix_key(key), value, timeout)
+        if added:
+            self._cache_data[key] = value
+        return added
+
     def set_many(self, values, timeout=None):
         raw_values = dict((self._prefix_key(key), value)
                           for (key, value) in values.items())
@@ -214,6 +291,31 @@ class _CacheWrapper(object):
 # map cache pattern IDs to the keys we've seen used
 _cache_pattern_memory = collections.defaultdict(set)
 
+def fetch_cache_groups(cache_groups):
+    """Fetch data for several cache groups with a single get_many() call
+
+    For each cache group, this fetches the version key (if we haven't already)
+    and the keys from its cache pattern.  Subsequent get() and get_many()
+    calls on the cache groups will use the fetched data rather than going back
+    to the cache.
+
+    Args:
+        cache_groups: list of CacheGroup objects
+    """
+    to_fetch = [(cache_group, cache_group._keys_to_prefetch())
+                for cache_group in cache_groups]
+    prefixed_keys = []
+    for cache_group, keys in to_fetch:
+        prefixed_keys.extend(cache_group.cache_wrapper._prefix_key(key)
+                             for key in keys)
+    if not prefixed_keys:
+        return
+    result = cache.get_many(prefixed_keys)
+    for cache_group, keys in to_fetch:
+        cache_group.cache_wrapper.store_fetched_values(keys, result)
+        cache_group._cache_pattern_keys = None
+        cache_group.ensure_version()
+
 class CacheGroup(object):
     """Manage a group of cached values
 
@@ -246,6 +348,8 @@ class CacheGroup(object):
             self._cache_pattern_keys = None
         self.cache_pattern = cache_pattern
         self.current_version = None
+        # values we fetched that were stored with an older version
+        self._stale_values = {}
         if invalidate_on_deploy:
             self.version_key = 'version:{0}'.format(get_commit_id())
         else:
@@ -254,18 +358,51 @@ class CacheGroup(object):
 
     def invalidate(self):
         """Invalidate all values in this CacheGroup."""
-        self.current_version = codes.make_code()
+        # Include the time in the version so that get_or_calc() knows how
+        # long ago values became stale.
+        self.current_version = '{0}.{1}'.format(codes.make_code(),
+                                                int(time.time()))
         self.cache_wrapper.set(self.version_key, self.current_version)
+        self._stale_values = {}
 
     def ensure_version(self):
         if self.current_version is not None:
             return
-        version = self.cache_wrapper.get(self.version_key)
+        version = self.cache_wrapper.get_many([self.version_key])[
+            self.version_key]
         if version is None:
-            self.invalidate()
+            self._init_version()
         else:
             self.current_version = version
 
+    def _init_version(self):
+        """Set a version when there is no version key in the cache."""
+        version = codes.make_code()
+        if self.cache_wrapper.add(self.version_key, version):
+            self.current_version = version
+        else:
+            # Another process set the version since we checked.  Use the
+            # version it set.
+            version = self.cache_wrapper.get(self.version_key)
+            if version is None:
+                self.invalidate()
+            else:
+                self.current_version = version
+
+    def _keys_to_prefetch(self):
+        """Get keys that we should fetch before any get() calls
+
+        This is the version key, if we haven't fetched it yet, plus the
+        keys from our cache pattern.  Keys that we've already fetched are not
+        included.
+        """
+        keys = set()
+        if self.current_version is None:
+            keys.add(self.version_key)
+        if self._cache_pattern_keys:
+            keys.update(self._cache_pattern_keys)
+        return self.cache_wrapper.unfetched_keys(keys)
+
     def get(self, key):
         """Get a value from the cache
 
@@ -294,7 +431,7 @@ class CacheGroup(object):
         # first of all, handle the version.
         if self.current_version is None:
             if get_many_result[self.version_key] is None:
-                self.invalidate()
+                self._init_version()
                 return {}
             else:
                 self.current_version = get_many_result[self.version_key]
@@ -304,6 +441,8 @@ class CacheGroup(object):
             version, value = self._unpack_cache_value(cache_value)
             if version == self.current_version:
                 result[key] = value
+            elif version is not None:
+                self._stale_values[key] = value
         return result
 
     def set(self, key, value, timeout=None):
@@ -331,14 +470,74 @@ class CacheGroup(object):
 
           - call work_func() to calculate the value
           - store it in the cache
+
+        If another process is already calculating the value, we return the
+        value from the previous version if we can (see
+        :ref:`cache-stale-while-revalidate`).  If there's no previous value,
+        we wait up to CACHE_GROUP_LOCK_WAIT seconds for the other process to
+        store its value.
         """
         cached_value = self.get(key)
         if cached_value is not None:
             return cached_value
-        calculated_value = work_func(*args, **kwargs)
-        self.set(key, calculated_value)
+        lock_key = 'lock:{0}'.format(key)
+        if not self.cache_wrapper.add(lock_key, 1, _lock_timeout()):
+            Meter('cachegroup.lock-contended').inc()
+            stale_value = self._get_stale_value(key)
+            if stale_value is not None:
+                Meter('cachegroup.stale-served').inc()
+                return stale_value
+            calculated_value = self._wait_for_value(key, lock_key)
+            if calculated_value is not None:
+                Meter('cachegroup.lock-wait-served').inc()
+                return calculated_value
+            # The other process didn't finish in time, so we just calculate
+            # the value ourselves.
+            calculated_value = work_func(*args, **kwargs)
+            self.set(key, calculated_value)
+            return calculated_value
+        try:
+            calculated_value = work_func(*args, **kwargs)
+            self.set(key, calculated_value)
+        finally:
+            self.cache_wrapper.delete(lock_key)
         return calculated_value
 
+    def _wait_for_value(self, key, lock_key):
+        """Wait for another process to calculate the value for key.
+
+        Returns the value, or None if the other process released the lock
+        without storing a value or didn't finish within CACHE_GROUP_LOCK_WAIT
+        seconds.
+        """
+        for i in xrange(int(_lock_wait() / LOCK_POLL_INTERVAL)):
+            time.sleep(LOCK_POLL_INTERVAL)
+            version, value = self._unpack_cache_value(
+                self.cache_wrapper.get(key))
+            if version == self.current_version:
+                return value
+            if self.cache_wrapper.get(lock_key) is None:
+                return None
+        return None
+
+    def _get_stale_value(self, key):
+        """Get the value for key from a previous version.
+
+        Returns None if there is no stale value or if it's been longer than
+        the grace period since the invalidation.
+        """
+        value = self._stale_values.get(key)
+        if value is None:
+            return None
+        try:
+            invalidated_at = int(self.current_version.rsplit('.', 1)[1])
+        except (IndexError, ValueError):
+            # version wasn't created by invalidate()
+            return None
+        if time.time() - invalidated_at > _stale_grace_period():
+            return None
+        return value
+
     def get_model(self, ModelClass, key):
         """Get a model stored with set_model()
 
@@ -470,15 +669,23 @@ class ModelCacheManager(object):
         """
         return self.get_cache_group(pk).invalidate()
 
-    def get_instance(self, pk, cache_pattern=None):
+    def get_instance(self, pk, cache_pattern=None, cache_group=None):
         """Get a cached instance from it's cache group
 
         This will create a CacheGroup, get the instance from it or load it
         from the DB, then reuse the CacheGroup for the instance's cache.  If a
         cache pattern is used this means we can load the instance and all of
         the needed cache values with one get_many() call.
+
+        Args:
+            pk: primary key value for the instance
+            cache_pattern: cache pattern to use for the CacheGroup
+            cache_group: Use this CacheGroup rather than creating a new one.
+                Use this to load the instance from a CacheGroup that was
+                fetched with fetch_cache_groups().
         """
-        cache_group = self.get_cache_group(pk, cache_pattern)
+        if cache_group is None:
+            cache_group = self.get_cache_group(pk, cache_pattern)
         instance = cache_group.get_model(self.model_class, 'self')
         if instance is None:
             instance = self.model_class.objects.get(pk=pk)
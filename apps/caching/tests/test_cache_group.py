@@ -26,7 +26,7 @@ from nose.tools import *
 import mock
 
 from caching.cachegroup import (CacheGroup, _cache_pattern_memory,
-                                ModelCacheManager)
+                                ModelCacheManager, fetch_cache_groups)
 from utils import test_utils
 from utils.factories import *
 from videos.models import Video
@@ -169,6 +169,74 @@ class CacheGroupTest(TestCase):
         self.invalidate_group()
         assert_not_equal(cache.get(version_key), None)
 
+class StaleWhileRevalidateTest(TestCase):
+    def setUp(self):
+        self.cache_group = make_cache_group()
+        self.cache_group.set('key', 'old-value')
+        make_cache_group().invalidate()
+
+    def hold_lock(self):
+        cache.add('cache-group-prefix:lock:key', 1)
+
+    def test_stale_value_returned_while_locked(self):
+        self.hold_lock()
+        work_func = mock.Mock(return_value='new-value')
+        assert_equal(make_cache_group().get_or_calc('key', work_func),
+                     'old-value')
+        assert_equal(work_func.call_count, 0)
+
+    def test_recalc_when_not_locked(self):
+        work_func = mock.Mock(return_value='new-value')
+        assert_equal(make_cache_group().get_or_calc('key', work_func),
+                     'new-value')
+        # the lock should be released after the value is stored
+        assert_equal(cache.get('cache-group-prefix:lock:key'), None)
+
+    @override_settings(CACHE_GROUP_STALE_GRACE_PERIOD=0,
+                       CACHE_GROUP_LOCK_WAIT=0)
+    def test_grace_period(self):
+        self.hold_lock()
+        work_func = mock.Mock(return_value='new-value')
+        with mock.patch('time.time') as mock_time:
+            mock_time.return_value = 2 ** 40
+            assert_equal(make_cache_group().get_or_calc('key', work_func),
+                         'new-value')
+
+    @override_settings(CACHE_GROUP_LOCK_WAIT=0)
+    def test_no_stale_values_after_missing_version(self):
+        cache.delete('cache-group-prefix:{0}'.format(
+            self.cache_group.version_key))
+        self.hold_lock()
+        work_func = mock.Mock(return_value='new-value')
+        assert_equal(make_cache_group().get_or_calc('key', work_func),
+                     'new-value')
+
+    def test_wait_for_value_on_cold_miss(self):
+        # With no stale value, we should wait for the process holding the
+        # lock to store its value rather than calculating it ourselves.
+        cache.clear()
+        self.hold_lock()
+        def other_process_stores_value(seconds):
+            make_cache_group().set('key', 'winner-value')
+        work_func = mock.Mock(return_value='new-value')
+        with mock.patch('time.sleep') as mock_sleep:
+            mock_sleep.side_effect = other_process_stores_value
+            assert_equal(make_cache_group().get_or_calc('key', work_func),
+                         'winner-value')
+        assert_equal(work_func.call_count, 0)
+
+    def test_lock_released_without_value(self):
+        cache.clear()
+        self.hold_lock()
+        def other_process_fails(seconds):
+            cache.delete('cache-group-prefix:lock:key')
+        work_func = mock.Mock(return_value='new-value')
+        with mock.patch('time.sleep') as mock_sleep:
+            mock_sleep.side_effect = other_process_fails
+            assert_equal(make_cache_group().get_or_calc('key', work_func),
+                         'new-value')
+        assert_equal(mock_sleep.call_count, 1)
+
 class CacheGroupTest2(CacheGroupTest):
     # test non-string values, which go through a slightly different codepath
     CACHE_VALUE = {'value': 'test'}
@@ -240,6 +308,51 @@ class CachePatternTest(TestCase):
         assert_equal(cache_group.cache_wrapper.get_many.call_args,
                      mock.call(set(['a', 'b', 'c', cache_group.version_key])))
 
+class VersionInitTest(TestCase):
+    def test_missing_version_uses_add(self):
+        # If another process sets the version between our get and our set,
+        # we should use its version rather than overwriting it.
+        cache_group = make_cache_group()
+        other_cache_group = make_cache_group()
+        other_cache_group.invalidate()
+        with mock.patch.object(cache, 'get_many', return_value={}):
+            cache_group.get('key')
+        assert_equal(cache_group.current_version,
+                     other_cache_group.current_version)
+
+class FetchCacheGroupsTest(TestCase):
+    def tearDown(self):
+        _cache_pattern_memory.clear()
+
+    def make_cache_groups(self):
+        return [
+            CacheGroup('prefix1', cache_pattern='foo',
+                       invalidate_on_deploy=False),
+            CacheGroup('prefix2', cache_pattern='bar',
+                       invalidate_on_deploy=False),
+        ]
+
+    def test_fetch_cache_groups(self):
+        group1, group2 = self.make_cache_groups()
+        group1.set('a', 'value-a')
+        group2.set('b', 'value-b')
+        group1.get('a')
+        group2.get('b')
+
+        group1, group2 = self.make_cache_groups()
+        with mock.patch.object(cache, 'get_many',
+                               wraps=cache.get_many) as mock_get_many:
+            fetch_cache_groups([group1, group2])
+            assert_equal(group1.get('a'), 'value-a')
+            assert_equal(group2.get('b'), 'value-b')
+        assert_equal(mock_get_many.call_count, 1)
+
+    def test_missing_versions(self):
+        group1, group2 = self.make_cache_groups()
+        fetch_cache_groups([group1, group2])
+        assert_not_equal(group1.current_version, None)
+        assert_not_equal(group2.current_version, None)
+
 class ModelCachingTest(TestCase):
     def test_model_to_tuple(self):
         video = VideoFactory()
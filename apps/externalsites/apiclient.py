@@ -0,0 +1,142 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""externalsites.apiclient -- HTTP client for external site APIs
+
+All of our requests to the YouTube, Kaltura and Brightcove APIs go through a
+Client object.  Clients:
+
+    - Keep a requests session per process and thread, so that we reuse
+      connections rather than opening a new one for each API call.  Sessions
+      aren't thread-safe, so threads (like the feed importer's pool) each
+      get their own.
+    - Limit the rate of requests to each provider across all processes.  The
+      limits are set with the EXTERNAL_SITES_RATE_LIMITS setting, which maps
+      provider names to the max requests per second.
+    - Record metrics for the requests.
+
+Usage:
+
+    client = Client('kaltura')
+    response = client.post(url, params=params, data=data)
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+import requests
+
+from utils.metrics import Meter, Timer
+
+logger = logging.getLogger(__name__)
+
+# Thread-local storage for our sessions.  Its sessions attribute maps
+# provider names to (pid, session) tuples.  We store the pid so that we don't
+# share connections with the parent after a fork.
+_local = threading.local()
+
+def _get_session(name):
+    pid = os.getpid()
+    sessions = getattr(_local, 'sessions', None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+    if name not in sessions or sessions[name][0] != pid:
+        sessions[name] = (pid, requests.session())
+    return sessions[name][1]
+
+class RateLimiter(object):
+    """Limit the rate of an action across all processes.
+
+    We count the actions for each 1-second window in the cache.  Once the
+    count goes past the limit, callers wait for the next window.
+    """
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate
+
+    def _cache_key(self, window):
+        return 'rate-limit:%s:%s' % (self.name, window)
+
+    def wait(self):
+        """Wait until we are allowed to perform the action.
+
+        Returns the number of seconds that we waited.
+        """
+        start_time = time.time()
+        while True:
+            now = time.time()
+            window = int(now)
+            key = self._cache_key(window)
+            cache.add(key, 0, 2)
+            try:
+                count = cache.incr(key)
+            except ValueError:
+                # Key was evicted between the add() and incr(), just let the
+                # request through
+                break
+            if count <= self.rate:
+                break
+            time.sleep(window + 1 - now)
+        waited = time.time() - start_time
+        if waited > 0.001:
+            Meter('externalsites.api.%s.rate-limited' % self.name).inc()
+        return waited
+
+class Client(object):
+    """HTTP client for an external site API
+
+    Attributes:
+        name: name of the provider.  This is used to look up the rate limit
+            and for the metric names.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def session(self):
+        return _get_session(self.name)
+
+    def get_rate_limiter(self):
+        rate = getattr(settings, 'EXTERNAL_SITES_RATE_LIMITS', {}).get(
+            self.name)
+        if rate is None:
+            return None
+        return RateLimiter(self.name, rate)
+
+    def request(self, method, url, **kwargs):
+        rate_limiter = self.get_rate_limiter()
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        with Timer('externalsites.api.%s.request-time' % self.name):
+            return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('post', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('put', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('delete', url, **kwargs)
@@ -0,0 +1,213 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""externalsites.bulksync -- sync all subtitles for an account
+
+When an account is created or changed, we need to sync every public
+subtitle language for every video that the account covers.  For big teams
+that's a lot of work, so we break it up:
+
+    - We go through the account's videos in id order, BULK_SYNC_BATCH_SIZE
+      videos at a time.
+    - For each batch, plan_batch() calculates the (video_url, language) pairs
+      to sync using a few set-based queries.
+    - We dispatch a task for each video url, then store the last video id in
+      the account's BulkSyncCheckpoint.  Video urls with multiple languages
+      use update_subtitles_batch, which needs fewer API calls.
+    - The next batch is scheduled with a countdown that keeps us under
+      BULK_SYNC_RATE tasks per second for the account.
+
+If the batch chain dies, resume_stalled() restarts it from the checkpoint.
+"""
+
+import logging
+import math
+
+from django.conf import settings
+
+from externalsites.models import BulkSyncCheckpoint, get_account, now
+from subtitles.models import SubtitleLanguage
+from utils.metrics import Meter
+from videos.models import VideoUrl
+
+logger = logging.getLogger(__name__)
+
+def batch_size():
+    return getattr(settings, 'BULK_SYNC_BATCH_SIZE', 100)
+
+def rate():
+    return getattr(settings, 'BULK_SYNC_RATE', 10)
+
+def stall_timeout():
+    return getattr(settings, 'BULK_SYNC_STALL_TIMEOUT', 60 * 30)
+
+def plan_batch(account, after_video_id, limit):
+    """Calculate the subtitles to sync for a batch of videos.
+
+    Args:
+        account: ExternalAccount to sync to
+        after_video_id: only look at videos with ids greater than this
+        limit: max number of videos to look at
+
+    Returns: (items, video_ids) tuple.  items is a list of (video_url_id,
+        language_id) tuples to sync.  video_ids is the list of video ids we
+        looked at.
+    """
+    video_ids = list(account.get_video_qs()
+                     .filter(id__gt=after_video_id)
+                     .order_by('id')
+                     .values_list('id', flat=True)[:limit])
+    if not video_ids:
+        return [], []
+    video_urls = list(VideoUrl.objects
+                      .filter(video__id__in=video_ids,
+                              type=account.video_url_type)
+                      .order_by('video', 'id'))
+    for video_url in video_urls:
+        if video_url.owner_username is None:
+            video_url.fix_owner_username()
+    video_urls = account.filter_video_urls_to_sync(video_urls)
+    if not video_urls:
+        return [], video_ids
+
+    language_ids = {}
+    language_qs = (SubtitleLanguage.objects.having_public_versions()
+                   .filter(video__id__in=set(vu.video_id
+                                             for vu in video_urls))
+                   .order_by('id')
+                   .values_list('video_id', 'id'))
+    for video_id, language_id in language_qs:
+        language_ids.setdefault(video_id, []).append(language_id)
+
+    items = [
+        (video_url.id, language_id)
+        for video_url in video_urls
+        for language_id in language_ids.get(video_url.video_id, [])
+    ]
+    return items, video_ids
+
+def group_items(items):
+    """Group work items by video url
+
+    Returns: list of (video_url_id, language_ids) tuples
+    """
+    rv = []
+    language_map = {}
+    for video_url_id, language_id in items:
+        if video_url_id not in language_map:
+            language_map[video_url_id] = []
+            rv.append((video_url_id, language_map[video_url_id]))
+        language_map[video_url_id].append(language_id)
+    return rv
+
+def start(account):
+    """Start syncing all subtitles for an account.
+
+    Returns: the run_id for the new run
+    """
+    checkpoint = BulkSyncCheckpoint.objects.start(account)
+    return checkpoint.run_id
+
+def run_batch(account_type, account_id, run_id, after_video_id):
+    """Sync subtitles for the next batch of videos.
+
+    Returns: (after_video_id, countdown) for the next batch, or None if
+        we're done
+    """
+    from externalsites.tasks import update_subtitles, update_subtitles_batch
+    try:
+        checkpoint = BulkSyncCheckpoint.objects.get(account_type=account_type,
+                                                    account_id=account_id)
+    except BulkSyncCheckpoint.DoesNotExist:
+        return None
+    if (checkpoint.run_id != run_id or
+        checkpoint.last_video_id != after_video_id or
+        checkpoint.finished is not None):
+        # A new run was started or another task already did this batch
+        return None
+    account = get_account(account_type, account_id)
+    if account is None:
+        checkpoint.delete()
+        return None
+
+    limit = batch_size()
+    items, video_ids = plan_batch(account, after_video_id, limit)
+    tasks = group_items(items)
+    for video_url_id, language_ids in tasks:
+        if len(language_ids) == 1:
+            update_subtitles.delay(account_type, account_id, video_url_id,
+                                   language_ids[0])
+        else:
+            update_subtitles_batch.delay(account_type, account_id,
+                                         video_url_id, language_ids)
+    Meter('externalsites.bulk-sync.items-dispatched').inc(len(items))
+
+    finished = len(video_ids) < limit
+    current_time = now()
+    updates = {
+        'videos_checked': checkpoint.videos_checked + len(video_ids),
+        'items_dispatched': checkpoint.items_dispatched + len(items),
+        'updated': current_time,
+    }
+    if video_ids:
+        updates['last_video_id'] = video_ids[-1]
+    if finished:
+        updates['finished'] = current_time
+    # Only update the checkpoint if nobody else moved it while we were
+    # working.
+    updated = (BulkSyncCheckpoint.objects
+               .filter(id=checkpoint.id, run_id=run_id,
+                       last_video_id=after_video_id)
+               .update(**updates))
+    if not updated:
+        return None
+    for name, value in updates.items():
+        setattr(checkpoint, name, value)
+    log_progress(checkpoint)
+    if finished:
+        return None
+    return (checkpoint.last_video_id,
+            int(math.ceil(float(len(tasks)) / rate())))
+
+def log_progress(checkpoint):
+    logger.info("bulk sync for %s%s: %s videos checked, "
+                "%s items dispatched (%.1f/sec)%s",
+                checkpoint.account_type, checkpoint.account_id,
+                checkpoint.videos_checked, checkpoint.items_dispatched,
+                checkpoint.throughput(),
+                " [finished]" if checkpoint.finished else "")
+
+def resume_stalled():
+    """Find bulk syncs that stopped making progress.
+
+    Returns: list of (account_type, account_id, run_id, last_video_id) tuples
+    to restart.
+    """
+    rv = []
+    for checkpoint in BulkSyncCheckpoint.objects.stalled(stall_timeout()):
+        # Bump the updated time so that we don't resume it again right away
+        updated = (BulkSyncCheckpoint.objects
+                   .filter(id=checkpoint.id, updated=checkpoint.updated)
+                   .update(updated=now()))
+        if updated:
+            logger.warn("resuming stalled bulk sync for %s%s at video %s",
+                        checkpoint.account_type, checkpoint.account_id,
+                        checkpoint.last_video_id)
+            rv.append((checkpoint.account_type, checkpoint.account_id,
+                       checkpoint.run_id, checkpoint.last_video_id))
+    return rv
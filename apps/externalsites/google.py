@@ -21,6 +21,7 @@
 from collections import namedtuple
 from email.mime.multipart import MIMEMultipart, MIMEBase
 from lxml import etree
+import hashlib
 import json
 import logging
 import urllib
@@ -28,11 +29,12 @@ import urlparse
 import re
 
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import ugettext as _
 import jwt
-import requests
 import pafy
 
+from externalsites.apiclient import Client
 from utils.subtitles import load_subtitles
 from utils.text import fmt
 
@@ -54,6 +56,8 @@ OpenIDProfile = namedtuple('OpenIDProfile',
 
 logger = logging.getLogger('utils.youtube')
 
+client = Client('youtube')
+
 def youtube_scopes():
     return [
         "https://www.googleapis.com/auth/youtube",
@@ -100,8 +104,8 @@ def _oauth_token_post(**params):
     params["client_id"] = settings.YOUTUBE_CLIENT_ID
     params["client_secret"] = settings.YOUTUBE_CLIENT_SECRET
 
-    response = requests.post("https://accounts.google.com/o/oauth2/token",
-                             data=params, headers={
+    response = client.post("https://accounts.google.com/o/oauth2/token",
+                           data=params, headers={
         "Content-Type": "application/x-www-form-urlencoded"
     })
 
@@ -168,9 +172,30 @@ def get_new_access_token(refresh_token):
                                  refresh_token=refresh_token)
     return response.json['access_token']
 
+def _access_token_cache_key(refresh_token):
+    return 'youtube-access-token:%s' % hashlib.sha1(refresh_token).hexdigest()
+
+def get_access_token(refresh_token):
+    """Get an access token, reusing a recently fetched one if we can.
+
+    This avoids an OAuth round trip for each API call when we sync lots of
+    subtitles for an account.
+    """
+    cache_key = _access_token_cache_key(refresh_token)
+    access_token = cache.get(cache_key)
+    if access_token is None:
+        access_token = get_new_access_token(refresh_token)
+        cache.set(cache_key, access_token,
+                  settings.YOUTUBE_ACCESS_TOKEN_CACHE_TIME)
+    return access_token
+
+def forget_access_token(refresh_token):
+    cache.delete(_access_token_cache_key(refresh_token))
+
 def revoke_auth_token(refresh_token):
-    requests.get('https://accounts.google.com/o/oauth2/revoke',
-                 params={'token': refresh_token})
+    forget_access_token(refresh_token)
+    client.get('https://accounts.google.com/o/oauth2/revoke',
+               params={'token': refresh_token})
 
 def multipart_format(parts):
     """Make a multipart message
@@ -212,7 +237,7 @@ def _make_api_request(method, access_token, url, **kwargs):
         method: HTTP method to use
         access_token: access token to use, or None for APIs that don't need
             authentication
-        **kwargs: args to send to requests.request()
+        **kwargs: args to send to Client.request()
     """
     if access_token is not None:
         if 'headers' not in kwargs:
@@ -222,7 +247,7 @@ def _make_api_request(method, access_token, url, **kwargs):
         if 'params' not in kwargs:
             kwargs['params'] = {}
         kwargs['params']['key'] = settings.YOUTUBE_API_KEY
-    response = requests.request(method, url, **kwargs)
+    response = client.request(method, url, **kwargs)
     if method == 'delete':
         expected_status_code = 204
     else:
@@ -18,6 +18,7 @@
 
 import collections
 import datetime
+import logging
 from urllib import quote_plus
 import urlparse
 
@@ -43,6 +44,8 @@ from videos.permissions import can_user_resync_own_video
 import videos.models
 import videos.tasks
 
+logger = logging.getLogger(__name__)
+
 def now():
     # define now as a function so it can be patched in the unittests
     return datetime.datetime.now()
@@ -134,6 +137,25 @@ class ExternalAccount(models.Model):
     def should_sync_video_url(self, video, video_url):
         return video_url.type == self.video_url_type
 
+    def filter_video_urls_to_sync(self, video_urls):
+        """Bulk version of should_sync_video_url()
+
+        Subclasses that override should_sync_video_url() must also override
+        this method.
+
+        Returns: list of the video urls that we should sync
+        """
+        return [vu for vu in video_urls if vu.type == self.video_url_type]
+
+    def get_video_qs(self):
+        """Get a queryset of the videos that belong to this account's
+        owner.
+        """
+        if self.type == ExternalAccount.TYPE_TEAM:
+            return Video.objects.filter(teamvideo__team__id=self.owner_id)
+        else:
+            return Video.objects.filter(user__id=self.owner_id)
+
     def update_subtitles(self, video_url, language):
         version = language.get_public_tip()
         if version is None or self.should_skip_syncing():
@@ -155,6 +177,40 @@ class ExternalAccount(models.Model):
             SyncedSubtitleVersion.objects.set_synced_version(
                 self, video_url, language, version)
 
+    def update_subtitles_batch(self, video_url, languages):
+        """Update subtitles for several languages of a video.
+
+        Some sites let us do this with fewer API calls than calling
+        update_subtitles() for each language.
+        """
+        if self.should_skip_syncing():
+            return
+        to_sync = []
+        for language in languages:
+            version = language.get_public_tip()
+            if version is not None:
+                to_sync.append((language, version))
+        if not to_sync:
+            return
+
+        try:
+            self.do_update_subtitles_batch(video_url, to_sync)
+        except Exception:
+            logger.warn("Error updating subtitles in a batch for %s (%s)",
+                        video_url, self, exc_info=True)
+            # Fall back to syncing the languages one-by-one.  This records
+            # errors for the languages that actually failed.
+            for language, version in to_sync:
+                self.update_subtitles(video_url, language)
+        else:
+            for language, version in to_sync:
+                SyncHistory.objects.create_for_success(
+                    account=self, video_url=video_url, language=language,
+                    action=SyncHistory.ACTION_UPDATE_SUBTITLES,
+                    version=version)
+                SyncedSubtitleVersion.objects.set_synced_version(
+                    self, video_url, language, version)
+
     def delete_subtitles(self, video_url, language):
         sync_history_values = {
             'account': self,
@@ -181,6 +237,18 @@ class ExternalAccount(models.Model):
         """
         raise NotImplementedError()
 
+    def do_update_subtitles_batch(self, video_url, subtitles):
+        """Do the work needed to update subtitles for several languages.
+
+        By default we call do_update_subtitles() for each language.
+        Subclasses may override this if they can do it more efficiently.
+
+        Args:
+            subtitles: list of (language, version) tuples
+        """
+        for language, version in subtitles:
+            self.do_update_subtitles(video_url, language, version)
+
     def do_delete_subtitles(self, video_url, language):
         """Do the work needed to delete subtitles
 
@@ -231,6 +299,15 @@ class KalturaAccount(ExternalAccount):
                                          kaltura_id, language.language_code,
                                          sub_data)
 
+    def do_update_subtitles_batch(self, video_url, subtitles):
+        kaltura_id = video_url.get_video_type().kaltura_id()
+        syncing.kaltura.update_subtitles_batch(
+            self.partner_id, self.secret, kaltura_id, [
+                (language.language_code,
+                 babelsubs.to(version.get_subtitles(), 'srt'))
+                for language, version in subtitles
+            ])
+
     def do_delete_subtitles(self, video_url, language):
         kaltura_id = video_url.get_video_type().kaltura_id()
         syncing.kaltura.delete_subtitles(self.partner_id, self.secret,
@@ -264,6 +341,13 @@ class BrightcoveAccount(ExternalAccount):
         syncing.brightcove.update_subtitles(self.write_token, video_id,
                                             language.video)
 
+    def do_update_subtitles_batch(self, video_url, subtitles):
+        # We upload the merged DFXP for all languages, so a single upload
+        # handles the entire batch.
+        video_id = video_url.get_video_type().brightcove_id
+        syncing.brightcove.update_subtitles(self.write_token, video_id,
+                                            video_url.video)
+
     def do_delete_subtitles(self, video_url, language):
         video_id = video_url.get_video_type().brightcove_id
         if language.video.get_merged_dfxp() is not None:
@@ -457,24 +541,53 @@ class YouTubeAccount(ExternalAccount):
                 return (team_video.team_id == self.owner_id or
                         self.sync_teams.filter(id=team_video.team_id).exists())
 
+    def filter_video_urls_to_sync(self, video_urls):
+        video_urls = [
+            vu for vu in video_urls
+            if (vu.type == self.video_url_type and
+                vu.owner_username == self.channel_id)
+        ]
+        if self.type == ExternalAccount.TYPE_USER or not video_urls:
+            return video_urls
+        team_ids = set(self.sync_teams.values_list('id', flat=True))
+        team_ids.add(self.owner_id)
+        video_ids_to_sync = set(TeamVideo.objects
+                                .filter(video__id__in=[vu.video_id
+                                                       for vu in video_urls],
+                                        team__id__in=team_ids)
+                                .values_list('video_id', flat=True))
+        return [vu for vu in video_urls if vu.video_id in video_ids_to_sync]
+
     def _get_sync_account_nonteam_video(self, video, video_url):
         return self.get(
             type=ExternalAccount.TYPE_USER,
             channel_id=video_url.owner_username)
 
+    def _call_with_access_token(self, func):
+        access_token = google.get_access_token(self.oauth_refresh_token)
+        try:
+            return func(access_token)
+        except google.APIError:
+            # The access token may have been revoked.  Make sure that we get
+            # a fresh one next time.
+            google.forget_access_token(self.oauth_refresh_token)
+            raise
+
     def do_update_subtitles(self, video_url, language, version):
-        """Do the work needed to update subtitles.
+        self._call_with_access_token(
+            lambda access_token: syncing.youtube.update_subtitles(
+                video_url.videoid, access_token, version))
 
-        Subclasses must implement this method.
-        """
-        access_token = google.get_new_access_token(self.oauth_refresh_token)
-        syncing.youtube.update_subtitles(video_url.videoid, access_token,
-                                         version)
+    def do_update_subtitles_batch(self, video_url, subtitles):
+        versions = [version for language, version in subtitles]
+        self._call_with_access_token(
+            lambda access_token: syncing.youtube.update_subtitles_batch(
+                video_url.videoid, access_token, versions))
 
     def do_delete_subtitles(self, video_url, language):
-        access_token = google.get_new_access_token(self.oauth_refresh_token)
-        syncing.youtube.delete_subtitles(video_url.videoid, access_token,
-                                         language.language_code)
+        self._call_with_access_token(
+            lambda access_token: syncing.youtube.delete_subtitles(
+                video_url.videoid, access_token, language.language_code))
 
     def delete(self):
         google.revoke_auth_token(self.oauth_refresh_token)
@@ -796,6 +909,75 @@ class SyncHistory(models.Model):
     def cache_account(self, account):
         self._account = account
 
+class BulkSyncCheckpointManager(models.Manager):
+    def start(self, account):
+        """Start a new bulk sync run for an account.
+
+        This resets the progress of any run that's already in progress.
+        Tasks from the old run notice that the run_id changed and stop.
+
+        Returns: BulkSyncCheckpoint for the new run
+        """
+        lookup = {
+            'account_type': account.account_type,
+            'account_id': account.id,
+        }
+        current_time = now()
+        self.get_or_create(defaults={
+            'started': current_time,
+            'updated': current_time,
+        }, **lookup)
+        self.filter(**lookup).update(
+            run_id=models.F('run_id') + 1, last_video_id=0,
+            videos_checked=0, items_dispatched=0, started=current_time,
+            updated=current_time, finished=None)
+        return self.get(**lookup)
+
+    def stalled(self, timeout):
+        """Get unfinished runs that haven't made progress recently."""
+        cutoff = now() - datetime.timedelta(seconds=timeout)
+        return self.filter(finished__isnull=True, updated__lt=cutoff)
+
+class BulkSyncCheckpoint(models.Model):
+    """Tracks the progress of syncing all subtitles for an account.
+
+    We go through the account's videos in id order and store the last video
+    id that we've dispatched sync tasks for.  If the process gets
+    interrupted, we can pick up where we left off rather than starting over.
+    """
+    account_type = models.CharField(max_length=1,
+                                    choices=_account_type_choices)
+    account_id = models.PositiveIntegerField()
+    # Incremented each time we start over
+    run_id = models.PositiveIntegerField(default=0)
+    last_video_id = models.PositiveIntegerField(default=0)
+    videos_checked = models.PositiveIntegerField(default=0)
+    items_dispatched = models.PositiveIntegerField(default=0)
+    started = models.DateTimeField()
+    updated = models.DateTimeField()
+    finished = models.DateTimeField(blank=True, null=True)
+
+    objects = BulkSyncCheckpointManager()
+
+    class Meta:
+        unique_together = (
+            ('account_type', 'account_id'),
+        )
+
+    def __unicode__(self):
+        return "BulkSyncCheckpoint: %s (video %s)" % (
+            account_display(self.get_account()), self.last_video_id)
+
+    def get_account(self):
+        return get_account(self.account_type, self.account_id)
+
+    def throughput(self):
+        """Get the number of items dispatched per second."""
+        elapsed = (self.updated - self.started).total_seconds()
+        if elapsed <= 0:
+            return float(self.items_dispatched)
+        return self.items_dispatched / elapsed
+
 class CreditedVideoUrl(models.Model):
     """Track videos that we have added our amara credit to.
 
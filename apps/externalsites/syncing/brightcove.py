@@ -20,13 +20,14 @@
 
 import json
 
-import requests
-
+from externalsites.apiclient import Client
 from externalsites.exceptions import SyncingError
 
 MEDIA_READ_URL = 'https://api.brightcove.com/services/library'
 MEDIA_WRITE_URL = 'https://api.brightcove.com/services/post'
 
+client = Client('brightcove')
+
 def _make_write_request(write_token, method, **params):
     file_content = params.pop('file_content', None)
     data = {
@@ -36,12 +37,12 @@ def _make_write_request(write_token, method, **params):
     data['params']['token'] = write_token
 
     if file_content is None:
-        response = requests.post(MEDIA_WRITE_URL,
-                                 data={'json': json.dumps(data) })
+        response = client.post(MEDIA_WRITE_URL,
+                               data={'json': json.dumps(data) })
     else:
-        response = requests.post(MEDIA_WRITE_URL,
-                                 data={ 'JSONRPC': json.dumps(data) },
-                                 files={ 'file': file_content})
+        response = client.post(MEDIA_WRITE_URL,
+                               data={ 'JSONRPC': json.dumps(data) },
+                               files={ 'file': file_content})
 
     if not hasattr(response, 'json'):
         raise SyncingError("Invalid response data: %s" % response.content)
@@ -16,12 +16,19 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
-"""externalsites.syncing.kaltura -- Sync subtitles to/from kaltura"""
+"""externalsites.syncing.kaltura -- Sync subtitles to/from kaltura
+
+We cache Kaltura sessions (KS strings) for each partner, rather than starting
+and ending a session for each API call.
+"""
 
 from xml.dom import minidom
+import hashlib
 
-import requests
+from django.conf import settings
+from django.core.cache import cache
 
+from externalsites.apiclient import Client
 from externalsites.exceptions import SyncingError
 from externalsites.syncing.kaltura_languages import KalturaLanguageMap
 
@@ -33,6 +40,15 @@ CAPTION_TYPE_SRT = 1
 CAPTION_TYPE_WEBVTT = 3
 # partnerData value we set for subtitles that we've synced
 PARTNER_DATA_TAG = 'synced-from-amara'
+# Error codes that mean we need to start a new session
+SESSION_ERROR_CODES = ('INVALID_KS', 'EXPIRED_KS')
+
+client = Client('kaltura')
+
+class KalturaError(SyncingError):
+    def __init__(self, code, message):
+        SyncingError.__init__(self, "%s: %s", code, message)
+        self.code = code
 
 def _node_text(node):
     return ''.join(child.nodeValue
@@ -51,11 +67,11 @@ def _check_error(result):
         error = _find_child(result, 'error')
         code = _node_text(_find_child(error, 'code'))
         message = _node_text(_find_child(error, 'message'))
-        raise SyncingError("%s: %s" % (code, message))
+        raise KalturaError(code, message)
 
 def _make_request(service, action, data):
     params = { 'service': service, 'action': action, }
-    response = requests.post(KALTURA_API_URL, params=params, data=data)
+    response = client.post(KALTURA_API_URL, params=params, data=data)
     dom = minidom.parseString(response.content)
     try:
         result = _find_child(dom, 'result')
@@ -72,24 +88,55 @@ def _start_session(partner_id, secret):
     })
     return _node_text(result)
 
-def _end_session(ks):
-    _make_request('session', 'end', { 'ks': ks })
+def _session_cache_key(partner_id, secret):
+    return 'kaltura-session:%s:%s' % (partner_id,
+                                      hashlib.sha1(secret).hexdigest())
 
-def _find_existing_captionset(ks, video_id, language_code):
-    language = KalturaLanguageMap.get_name(language_code)
+def _get_session(partner_id, secret):
+    cache_key = _session_cache_key(partner_id, secret)
+    ks = cache.get(cache_key)
+    if ks is None:
+        ks = _start_session(partner_id, secret)
+        cache.set(cache_key, ks, settings.KALTURA_SESSION_CACHE_TIME)
+    return ks
+
+def _call_with_session(partner_id, secret, func, *args):
+    """Call func with a cached session as the first argument.
+
+    If kaltura tells us the session is no longer valid, we start a new one
+    and try again.
+    """
+    try:
+        return func(_get_session(partner_id, secret), *args)
+    except KalturaError, e:
+        if e.code not in SESSION_ERROR_CODES:
+            raise
+        cache.delete(_session_cache_key(partner_id, secret))
+        return func(_get_session(partner_id, secret), *args)
+
+def _list_synced_captions(ks, video_id):
+    """Get the captions that we've synced for a video
+
+    Returns: dict mapping kaltura language names to caption ids
+    """
     result = _make_request('caption_captionasset', 'list', {
         'ks': ks,
         'filter:entryIdEqual': video_id,
     })
 
+    captions = {}
     objects = _find_child(result, 'objects')
     for item in objects.getElementsByTagName('item'):
         partner_data = _find_child(item, 'partnerData')
         language_node = _find_child(item, 'language')
-        if (_node_text(partner_data) == PARTNER_DATA_TAG and
-            _node_text(language_node) == language):
-            return _node_text(_find_child(item, 'id'))
-    return None
+        if _node_text(partner_data) == PARTNER_DATA_TAG:
+            captions.setdefault(_node_text(language_node),
+                                _node_text(_find_child(item, 'id')))
+    return captions
+
+def _find_existing_captionset(ks, video_id, language_code):
+    language = KalturaLanguageMap.get_name(language_code)
+    return _list_synced_captions(ks, video_id).get(language)
 
 def _add_captions(ks, video_id, language_code):
     language = KalturaLanguageMap.get_name(language_code)
@@ -118,22 +165,42 @@ def _delete_captions(ks, caption_id):
         'captionAssetId': caption_id,
     })
 
-def update_subtitles(partner_id, secret, video_id, language_code,
-                     srt_data):
-    ks = _start_session(partner_id, secret)
-    try:
-        caption_id = _find_existing_captionset(ks, video_id, language_code)
+def _update_subtitles_batch(ks, video_id, subtitles):
+    existing_captions = _list_synced_captions(ks, video_id)
+    for language, language_code, srt_data in subtitles:
+        caption_id = existing_captions.get(language)
         if caption_id is None:
             caption_id = _add_captions(ks, video_id, language_code)
+            existing_captions[language] = caption_id
         _update_caption_content(ks, caption_id, srt_data)
-    finally:
-        _end_session(ks)
+
+def update_subtitles(partner_id, secret, video_id, language_code,
+                     srt_data):
+    update_subtitles_batch(partner_id, secret, video_id,
+                           [(language_code, srt_data)])
+
+def update_subtitles_batch(partner_id, secret, video_id, subtitles):
+    """Update subtitles for several languages of a video
+
+    This only fetches the list of captions for the video once.
+
+    Args:
+        subtitles: list of (language_code, srt_data) tuples
+    """
+    # Convert the language codes first, so that we don't make any API calls
+    # if one of them is invalid
+    subtitles = [
+        (KalturaLanguageMap.get_name(language_code), language_code, srt_data)
+        for language_code, srt_data in subtitles
+    ]
+    _call_with_session(partner_id, secret, _update_subtitles_batch,
+                       video_id, subtitles)
+
+def _delete_subtitles(ks, video_id, language_code):
+    caption_id = _find_existing_captionset(ks, video_id, language_code)
+    if caption_id is not None:
+        _delete_captions(ks, caption_id)
 
 def delete_subtitles(partner_id, secret, video_id, language_code):
-    ks = _start_session(partner_id, secret)
-    try:
-        caption_id = _find_existing_captionset(ks, video_id, language_code)
-        if caption_id is not None:
-            _delete_captions(ks, caption_id)
-    finally:
-        _end_session(ks)
+    _call_with_session(partner_id, secret, _delete_subtitles, video_id,
+                       language_code)
@@ -54,14 +54,22 @@ def get_youtube_language_code(language_code):
     lc = unilangs.LanguageCode(language_code.lower(), "unisubs")
     return lc.encode("youtube")
 
-def find_existing_caption_id(access_token, video_id, language_code):
-    for caption_info in google.captions_list(access_token, video_id):
+def find_existing_caption_id(access_token, video_id, language_code,
+                             captions_list=None):
+    if captions_list is None:
+        captions_list = google.captions_list(access_token, video_id)
+    for caption_info in captions_list:
         if language_code == caption_info[1] and caption_info[2] == '':
             return caption_info[0]
     return None
 
-def update_subtitles(video_id, access_token, subtitle_version):
-    """Push the subtitles for a language to YouTube """
+def update_subtitles(video_id, access_token, subtitle_version,
+                     captions_list=None):
+    """Push the subtitles for a language to YouTube
+
+    Pass in captions_list to avoid fetching the list of captions for the video
+    again.
+    """
 
     try:
         language_code = get_youtube_language_code(
@@ -76,13 +84,24 @@ def update_subtitles(video_id, access_token, subtitle_version):
     content = _format_subs_for_youtube(subs)
 
     caption_id = find_existing_caption_id(access_token, video_id,
-                                          language_code)
+                                          language_code, captions_list)
     if caption_id:
         google.captions_update(access_token, caption_id, 'text/sbv', content)
     else:
         google.captions_insert(access_token, video_id, language_code,
                                'text/sbv', content)
 
+def update_subtitles_batch(video_id, access_token, subtitle_versions):
+    """Push the subtitles for several languages to YouTube
+
+    This fetches the list of captions for the video once, rather than once
+    per language.
+    """
+    captions_list = google.captions_list(access_token, video_id)
+    for subtitle_version in subtitle_versions:
+        update_subtitles(video_id, access_token, subtitle_version,
+                         captions_list)
+
 def delete_subtitles(video_id, access_token, language_code):
     """Delete the subtitles for a language on YouTube """
 
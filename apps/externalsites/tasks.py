@@ -21,6 +21,7 @@ import logging
 from celery.task import task
 from django.core.exceptions import ObjectDoesNotExist
 
+from externalsites import bulksync
 from externalsites import credit
 from externalsites import google
 from externalsites import subfetch
@@ -57,6 +58,35 @@ def update_subtitles(account_type, account_id, video_url_id, lang_id):
     else:
         account.update_subtitles(video_url, language)
 
+@task
+def update_subtitles_batch(account_type, account_id, video_url_id, lang_ids):
+    """Update subtitles for several languages of a video"""
+    logger.info("externalsites.tasks.update_subtitles_batch(%s, %s, %s, %s)",
+                account_type, account_id, video_url_id, lang_ids)
+    try:
+        account = get_account(account_type, account_id)
+        video_url = VideoUrl.objects.get(id=video_url_id)
+    except ObjectDoesNotExist, e:
+        logger.error(
+            'Lookup error in update_subtitles_batch(): %s' % e,
+            exc_info=True,
+            extra={
+                'data': {
+                    'account_type': account_type,
+                    'account_id': account_id,
+                    'video_url_id': video_url_id,
+                    'lang_ids': lang_ids,
+                }
+            }
+        )
+        return
+    if account is None:
+        logger.warn("update_subtitles_batch(): account %s %s deleted",
+                    account_type, account_id)
+        return
+    languages = list(SubtitleLanguage.objects.filter(id__in=lang_ids))
+    account.update_subtitles_batch(video_url, languages)
+
 @task
 def delete_subtitles(account_type, account_id, video_url_id, lang_id):
     """Delete a subtitles for a language"""
@@ -87,41 +117,42 @@ def delete_subtitles(account_type, account_id, video_url_id, lang_id):
 
 @task
 def update_all_subtitles(account_type, account_id):
-    """Update all subtitles for a given account."""
+    """Update all subtitles for a given account.
+
+    This starts a new bulk sync run, see externalsites.bulksync for details.
+    """
     logger.info("externalsites.tasks.update_all_subtitles(%s, %s)",
                 account_type, account_id)
-    try:
-        account = get_account(account_type, account_id)
-    except ObjectDoesNotExist, e:
+    account = get_account(account_type, account_id)
+    if account is None:
         logger.error(
-            'Lookup error in update_all_subtitles(): %s' % e,
-            exc_info=True,
+            'Lookup error in update_all_subtitles()',
             extra={
                 'data': {
                     'account_type': account_type,
                     'account_id': account_id,
-                    'video_url_id': video_url_id,
-                    'lang_id': lang_id,
-                    'version_id': version_id,
                 }
             }
         )
         return
-    if account.team:
-        videos = account.team.videos
-    else:
-        videos = account.user.video_set
-
-    for video in videos.all():
-        for video_url in video.get_video_urls():
-            video_url.fix_owner_username()
-            if not account.should_sync_video_url(video, video_url):
-                continue
-            language_qs = (video.newsubtitlelanguage_set
-                           .having_public_versions())
-            for language in language_qs:
-                update_subtitles.delay(account_type, account_id,
-                                       video_url.id, language.id)
+    run_id = bulksync.start(account)
+    update_all_subtitles_batch.delay(account_type, account_id, run_id, 0)
+
+@task
+def update_all_subtitles_batch(account_type, account_id, run_id,
+                               after_video_id):
+    next_batch = bulksync.run_batch(account_type, account_id, run_id,
+                                    after_video_id)
+    if next_batch is not None:
+        next_video_id, countdown = next_batch
+        update_all_subtitles_batch.apply_async(
+            args=(account_type, account_id, run_id, next_video_id),
+            countdown=countdown)
+
+@task
+def resume_stalled_bulk_syncs():
+    for args in bulksync.resume_stalled():
+        update_all_subtitles_batch.delay(*args)
 
 @task
 def add_amara_credit(video_url_id):
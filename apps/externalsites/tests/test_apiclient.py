@@ -0,0 +1,96 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+import threading
+
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from externalsites import apiclient
+from externalsites import google
+from utils import test_utils
+
+class RateLimiterTest(TestCase):
+    def setUp(self):
+        self.current_time = 1000.0
+        self.sleeps = []
+        patcher = mock.patch.multiple(apiclient.time,
+                                      time=self.mock_time,
+                                      sleep=self.mock_sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def mock_time(self):
+        return self.current_time
+
+    def mock_sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.current_time += seconds
+
+    def test_wait(self):
+        rate_limiter = apiclient.RateLimiter('test', 2)
+        self.current_time = 1000.5
+        rate_limiter.wait()
+        rate_limiter.wait()
+        assert_equal(self.sleeps, [])
+        # The 3rd call should wait for the next window
+        rate_limiter.wait()
+        assert_equal(self.sleeps, [0.5])
+        rate_limiter.wait()
+        assert_equal(self.sleeps, [0.5])
+
+class ClientTest(TestCase):
+    def test_reuses_session(self):
+        client = apiclient.Client('test')
+        assert_true(client.session is client.session)
+        assert_true(client.session is apiclient.Client('test').session)
+        assert_false(client.session is apiclient.Client('test2').session)
+
+    def test_session_per_thread(self):
+        # requests sessions aren't thread-safe, so each thread should get its
+        # own
+        sessions = []
+        def get_session():
+            sessions.append(apiclient.Client('test').session)
+        thread = threading.Thread(target=get_session)
+        thread.start()
+        thread.join()
+        assert_false(sessions[0] is apiclient.Client('test').session)
+
+    def test_request(self):
+        mocker = test_utils.RequestsMocker()
+        mocker.expect_request('get', 'http://example.com/',
+                              params={'foo': 'bar'}, body='content')
+        with mocker:
+            response = apiclient.Client('test').get('http://example.com/',
+                                                    params={'foo': 'bar'})
+        assert_equal(response.content, 'content')
+
+class AccessTokenCacheTest(TestCase):
+    def test_get_access_token(self):
+        with mock.patch.object(google, 'get_new_access_token') as mock_get:
+            mock_get.return_value = 'token'
+            assert_equal(google.get_access_token('refresh-token'), 'token')
+            assert_equal(google.get_access_token('refresh-token'), 'token')
+            assert_equal(mock_get.call_count, 1)
+            google.forget_access_token('refresh-token')
+            google.get_access_token('refresh-token')
+            assert_equal(mock_get.call_count, 2)
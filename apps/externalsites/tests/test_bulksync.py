@@ -0,0 +1,168 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from nose.tools import *
+
+from externalsites import bulksync
+from externalsites import tasks
+from externalsites.models import BulkSyncCheckpoint, KalturaAccount
+from subtitles import pipeline
+from utils import test_utils
+from utils.factories import *
+
+class BulkSyncTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.account = KalturaAccount.objects.create(
+            team=self.team, partner_id=1234, secret='abcd')
+        self.videos = []
+        self.languages = []
+        for i in xrange(3):
+            video = KalturaVideoFactory(name='video-%s' % i)
+            TeamVideoFactory(video=video, team=self.team)
+            self.videos.append(video)
+            for language_code in ('en', 'fr'):
+                version = pipeline.add_subtitles(video, language_code, None)
+                self.languages.append(version.subtitle_language)
+        # videos that shouldn't be synced: one with only private subtitles,
+        # one in another team
+        private_video = KalturaVideoFactory(name='private')
+        TeamVideoFactory(video=private_video, team=self.team)
+        pipeline.add_subtitles(private_video, 'en', None,
+                               visibility='private')
+        other_video = KalturaVideoFactory(name='other')
+        TeamVideoFactory(video=other_video)
+        pipeline.add_subtitles(other_video, 'en', None)
+        self.reset_dispatch_mocks()
+
+    def correct_items(self):
+        return [
+            (language.video.get_primary_videourl_obj().id, language.id)
+            for language in self.languages
+        ]
+
+    def dispatched_items(self):
+        items = [
+            args[2:] for args, kwargs in
+            test_utils.update_subtitles.delay.call_args_list
+        ]
+        for args, kwargs in \
+                test_utils.update_subtitles_batch.delay.call_args_list:
+            video_url_id, language_ids = args[2:]
+            items.extend((video_url_id, language_id)
+                         for language_id in language_ids)
+        return items
+
+    def reset_dispatch_mocks(self):
+        test_utils.update_subtitles.reset_mock()
+        test_utils.update_subtitles_batch.reset_mock()
+
+    def test_plan_batch(self):
+        items, video_ids = bulksync.plan_batch(self.account, 0, 2)
+        assert_equal(items, self.correct_items()[:4])
+        assert_equal(video_ids, [v.id for v in self.videos[:2]])
+
+        items, video_ids = bulksync.plan_batch(self.account, video_ids[-1],
+                                               2)
+        assert_equal(items, self.correct_items()[4:])
+
+    def test_batch_tasks(self):
+        # Video urls with multiple languages should use
+        # update_subtitles_batch()
+        with self.settings(BULK_SYNC_BATCH_SIZE=2):
+            test_utils.update_all_subtitles.original_func.apply(
+                args=(self.account.account_type, self.account.id))
+        assert_equal(test_utils.update_subtitles.delay.call_count, 0)
+        assert_equal(test_utils.update_subtitles_batch.delay.call_count, 3)
+
+    def test_update_all_subtitles(self):
+        with self.settings(BULK_SYNC_BATCH_SIZE=2):
+            test_utils.update_all_subtitles.original_func.apply(
+                args=(self.account.account_type, self.account.id))
+        assert_equal(sorted(self.dispatched_items()),
+                     sorted(self.correct_items()))
+        checkpoint = BulkSyncCheckpoint.objects.get(
+            account_type=self.account.account_type,
+            account_id=self.account.id)
+        assert_not_equal(checkpoint.finished, None)
+        assert_equal(checkpoint.videos_checked, 4)
+        assert_equal(checkpoint.items_dispatched, 6)
+
+    def test_resume(self):
+        run_id = bulksync.start(self.account)
+        with self.settings(BULK_SYNC_BATCH_SIZE=2):
+            bulksync.run_batch(self.account.account_type, self.account.id,
+                               run_id, 0)
+            self.reset_dispatch_mocks()
+            # simulate the chain dying and getting restarted
+            with self.settings(BULK_SYNC_STALL_TIMEOUT=-1):
+                tasks.resume_stalled_bulk_syncs.apply()
+        assert_equal(sorted(self.dispatched_items()),
+                     sorted(self.correct_items()[4:]))
+
+    def test_old_run_stops(self):
+        old_run_id = bulksync.start(self.account)
+        bulksync.start(self.account)
+        assert_equal(bulksync.run_batch(self.account.account_type,
+                                        self.account.id, old_run_id, 0),
+                     None)
+        assert_equal(self.dispatched_items(), [])
+
+    def test_batch_already_done(self):
+        # If 2 tasks try to run the same batch, only 1 should dispatch it
+        run_id = bulksync.start(self.account)
+        with self.settings(BULK_SYNC_BATCH_SIZE=2):
+            bulksync.run_batch(self.account.account_type, self.account.id,
+                               run_id, 0)
+            self.reset_dispatch_mocks()
+            bulksync.run_batch(self.account.account_type, self.account.id,
+                               run_id, 0)
+        assert_equal(self.dispatched_items(), [])
+
+class YouTubeFilterTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.sync_team = TeamFactory()
+        self.account = YouTubeAccountFactory(team=self.team,
+                                             channel_id='channel')
+        self.account.sync_teams = [self.sync_team]
+
+    def make_video_url(self, team=None, channel_id='channel'):
+        video = YouTubeVideoFactory(channel_id=channel_id)
+        if team is not None:
+            TeamVideoFactory(video=video, team=team)
+        return video.get_primary_videourl_obj()
+
+    def test_filter_video_urls_to_sync(self):
+        video_urls = [
+            self.make_video_url(self.team),
+            self.make_video_url(self.sync_team),
+            self.make_video_url(TeamFactory()),
+            self.make_video_url(None),
+            self.make_video_url(self.team, channel_id='other-channel'),
+        ]
+        assert_equal(self.account.filter_video_urls_to_sync(video_urls),
+                     video_urls[:2])
+        # check that we match should_sync_video_url()
+        assert_equal(
+            [vu for vu in video_urls
+             if self.account.should_sync_video_url(vu.video, vu)],
+            video_urls[:2])
@@ -252,6 +252,52 @@ class SubtitleTaskTest(TestCase):
         ])
         self.check_synced_version(language, version)
 
+    @test_utils.patch_for_test(
+        'externalsites.models.KalturaAccount.do_update_subtitles_batch')
+    def test_update_subtitles_batch(self, mock_do_update_subtitles_batch):
+        now = self.now
+        en = self.video.subtitle_language('en')
+        fr = pipeline.add_subtitles(self.video, 'fr', None).subtitle_language
+        self.reset_history()
+        args = ('K', self.account.id, self.video_url.id, [en.id, fr.id])
+        test_utils.update_subtitles_batch.original_func.apply(args=args)
+
+        self.assertEquals(mock_do_update_subtitles_batch.call_count, 1)
+        self.assertEquals(self.mock_update_subtitles.call_count, 0)
+        video_url, subtitles = mock_do_update_subtitles_batch.call_args[0]
+        self.assertEquals(video_url, self.video_url)
+        self.assertEquals(sorted(subtitles), sorted([
+            (en, en.get_tip()),
+            (fr, fr.get_tip()),
+        ]))
+        for language in (en, fr):
+            self.check_synced_version(language, language.get_tip())
+            self.assertEquals(SyncHistory.objects.filter(
+                language=language,
+                result=SyncHistory.RESULT_SUCCESS).count(), 1)
+
+    @test_utils.patch_for_test(
+        'externalsites.models.KalturaAccount.do_update_subtitles_batch')
+    def test_update_subtitles_batch_error(self,
+                                          mock_do_update_subtitles_batch):
+        # If the batch update fails, we should fall back to updating each
+        # language separately
+        mock_do_update_subtitles_batch.side_effect = SyncingError('Error')
+        en = self.video.subtitle_language('en')
+        fr = pipeline.add_subtitles(self.video, 'fr', None).subtitle_language
+        self.reset_history()
+        self.mock_update_subtitles.side_effect = [
+            None, SyncingError('Site exploded'),
+        ]
+        args = ('K', self.account.id, self.video_url.id, [en.id, fr.id])
+        test_utils.update_subtitles_batch.original_func.apply(args=args)
+
+        self.assertEquals(self.mock_update_subtitles.call_count, 2)
+        self.assertEquals(SyncHistory.objects.filter(
+            result=SyncHistory.RESULT_SUCCESS).count(), 1)
+        self.assertEquals(SyncHistory.objects.filter(
+            result=SyncHistory.RESULT_ERROR).count(), 1)
+
     def test_history(self):
         en_1 = self.video.subtitle_language('en').get_tip()
         en_2 = pipeline.add_subtitles(self.video, 'en', None)
@@ -375,14 +421,6 @@ class KalturaApiMocker(test_utils.RequestsMocker):
             result,
         )
 
-    def expect_session_end(self):
-        self.expect_api_call(
-            'session', 'end', {
-                'ks': self.session_id,
-            },
-            self.kaltura_result('')
-        )
-
     def expect_captionasset_list(self, return_captions):
         self.expect_api_call(
             'caption_captionasset', 'list', {
@@ -544,7 +582,6 @@ class KalturaSyncingTest(TestCase):
         mocker.expect_captionasset_add('captionid', 'English')
         mocker.expect_captionasset_setcontent('captionid', "CaptionData",
                                               "English")
-        mocker.expect_session_end()
         with mocker:
             kaltura.update_subtitles(self.partner_id, self.secret,
                                      self.video_id, "en", "CaptionData")
@@ -557,7 +594,6 @@ class KalturaSyncingTest(TestCase):
         ])
         mocker.expect_captionasset_setcontent('captionid', "CaptionData",
                                               "English")
-        mocker.expect_session_end()
         with mocker:
             kaltura.update_subtitles(self.partner_id, self.secret,
                                      self.video_id, 'en', "CaptionData")
@@ -571,7 +607,6 @@ class KalturaSyncingTest(TestCase):
         mocker.expect_captionasset_add('captionid', 'English')
         mocker.expect_captionasset_setcontent('captionid', "CaptionData",
                                               "English")
-        mocker.expect_session_end()
         with mocker:
             kaltura.update_subtitles(self.partner_id, self.secret,
                                      self.video_id, 'en', "CaptionData")
@@ -585,7 +620,6 @@ class KalturaSyncingTest(TestCase):
         mocker.expect_captionasset_add('captionid', 'English')
         mocker.expect_captionasset_setcontent('captionid', "CaptionData",
                                               "English")
-        mocker.expect_session_end()
         with mocker:
             kaltura.update_subtitles(self.partner_id, self.secret,
                                      self.video_id, 'en', "CaptionData")
@@ -598,7 +632,6 @@ class KalturaSyncingTest(TestCase):
             ('captionid2', 'French', 100, kaltura.PARTNER_DATA_TAG),
         ])
         mocker.expect_captionasset_delete('captionid')
-        mocker.expect_session_end()
         with mocker:
             kaltura.delete_subtitles(self.partner_id, self.secret,
                                      self.video_id, 'en')
@@ -616,7 +649,6 @@ class KalturaSyncingTest(TestCase):
         mocker.expect_session_start()
         mocker.expect_captionasset_list(return_captions=[])
         mocker.expect_captionasset_add_return_error('English')
-        mocker.expect_session_end()
         with mocker:
             self.assertRaises(SyncingError, kaltura.update_subtitles,
                               self.partner_id, self.secret, self.video_id,
@@ -626,13 +658,68 @@ class KalturaSyncingTest(TestCase):
         # test what happens when we try to sync a language that doesn't map to
         # a kaltura language, like pt-br
         mocker = KalturaApiMocker(self.partner_id, self.secret, self.video_id)
-        mocker.expect_session_start()
-        mocker.expect_session_end()
         with mocker:
             self.assertRaises(SyncingError, kaltura.update_subtitles,
                               self.partner_id, self.secret, self.video_id,
                               'pt-br', "CaptionData")
 
+    def test_reuse_session(self):
+        mocker = KalturaApiMocker(self.partner_id, self.secret, self.video_id)
+        mocker.expect_session_start()
+        mocker.expect_captionasset_list(return_captions=[
+            ('captionid', 'English', 100, kaltura.PARTNER_DATA_TAG),
+        ])
+        mocker.expect_captionasset_setcontent('captionid', "CaptionData",
+                                              "English")
+        mocker.expect_captionasset_list(return_captions=[
+            ('captionid', 'English', 100, kaltura.PARTNER_DATA_TAG),
+        ])
+        mocker.expect_captionasset_delete('captionid')
+        with mocker:
+            kaltura.update_subtitles(self.partner_id, self.secret,
+                                     self.video_id, 'en', "CaptionData")
+            kaltura.delete_subtitles(self.partner_id, self.secret,
+                                     self.video_id, 'en')
+
+    def test_expired_session(self):
+        mocker = KalturaApiMocker(self.partner_id, self.secret, self.video_id)
+        mocker.expect_session_start()
+        mocker.expect_api_call(
+            'caption_captionasset', 'list', {
+                'ks': mocker.session_id,
+                'filter:entryIdEqual': self.video_id,
+            },
+            mocker.error_response('EXPIRED_KS', 'KS has expired'))
+        # we should start a new session and try again
+        mocker.expect_session_start()
+        mocker.expect_captionasset_list(return_captions=[
+            ('captionid', 'English', 100, kaltura.PARTNER_DATA_TAG),
+        ])
+        mocker.expect_captionasset_delete('captionid')
+        with mocker:
+            kaltura.delete_subtitles(self.partner_id, self.secret,
+                                     self.video_id, 'en')
+
+    def test_upload_batch(self):
+        # When we upload multiple languages, we should only list the captions
+        # once
+        mocker = KalturaApiMocker(self.partner_id, self.secret, self.video_id)
+        mocker.expect_session_start()
+        mocker.expect_captionasset_list(return_captions=[
+            ('captionid', 'English', 100, kaltura.PARTNER_DATA_TAG),
+        ])
+        mocker.expect_captionasset_setcontent('captionid', "CaptionData",
+                                              "English")
+        mocker.expect_captionasset_add('captionid2', 'French')
+        mocker.expect_captionasset_setcontent('captionid2', "FrenchData",
+                                              "French")
+        with mocker:
+            kaltura.update_subtitles_batch(self.partner_id, self.secret,
+                                           self.video_id, [
+                                               ('en', "CaptionData"),
+                                               ('fr', "FrenchData"),
+                                           ])
+
 class BrightcoveAccountSyncingTest(TestCase):
     # Test that the BrightcoveAccount model makes the correct calls in
     # response to update_subtitles() and delete_subtitles()
@@ -703,7 +790,7 @@ class BrightcoveAccountSyncingTest(TestCase):
 class BrightcoveAPITest(TestCase):
     WRITE_URL = 'https://api.brightcove.com/services/post'
 
-    @test_utils.patch_for_test('externalsites.syncing.brightcove.requests')
+    @test_utils.patch_for_test('externalsites.syncing.brightcove.client')
     def setUp(self, mock_requests):
         self.mock_requests = mock_requests
         self.write_token = 'abc'
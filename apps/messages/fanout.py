@@ -0,0 +1,137 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""messages.fanout -- Send a notification to many users at once.
+
+Some notifications go to every admin of a team, or every member.  Handling
+those one user at a time means rendering the templates, saving a Message, and
+opening an SMTP connection for each user.  This module does it in bulk:
+
+    - Recipients are split into chunks of CHUNK_SIZE and each chunk is handled
+      by a separate celery task (see messages.tasks.send_notification), so
+      one large team can't tie up a worker for a long time.
+    - Templates are rendered once for each distinct context.  If the context
+      doesn't depend on the recipient, that means once per chunk.
+    - Messages are created with bulk_create().
+    - Emails for a chunk are all sent over a single connection.
+"""
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from auth.models import CustomUser as User
+from messages.models import Message
+from utils import render_templated_email_body, make_email, send_email_batch
+from utils.metrics import Meter
+
+CHUNK_SIZE = 200
+
+class Notification(object):
+    """A notification to send to a group of users.
+
+    Notifications get pickled and passed to celery tasks, so the context
+    should only contain things that can be pickled.
+
+    Attributes:
+        subject: subject for the message/email
+        context: context to render the templates with
+        message_template: template for the site message, or None to not send
+            a message
+        email_template: template for the email, or None to not send an email
+        message_object: object to attach to the message
+        message_author: author of the message
+        per_user: If True, we add the recipient to the context as "user", and
+            render the templates separately for each recipient.  If False we
+            render them once for all recipients.
+        meter_name: Name of the meter to increment for each email sent
+        fail_silently: Ignore errors when sending emails
+    """
+    def __init__(self, subject, context, message_template=None,
+                 email_template=None, message_object=None,
+                 message_author=None, per_user=True, meter_name=None,
+                 fail_silently=False):
+        self.subject = subject
+        self.context = context
+        self.message_template = message_template
+        self.email_template = email_template
+        self.message_object = message_object
+        self.message_author = message_author
+        self.per_user = per_user
+        self.meter_name = meter_name
+        self.fail_silently = fail_silently
+
+    def context_for(self, user):
+        context = dict(self.context)
+        if self.per_user:
+            context['user'] = user
+        return context
+
+    def should_send_message(self, user):
+        return (self.message_template is not None and
+                user.notify_by_message and
+                not getattr(settings, "MESSAGES_DISABLED", False))
+
+    def should_send_email(self, user):
+        return (self.email_template is not None and
+                bool(user.email) and user.notify_by_email)
+
+def chunk_user_ids(user_ids, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    user_ids = list(user_ids)
+    return [user_ids[i:i+chunk_size]
+            for i in xrange(0, len(user_ids), chunk_size)]
+
+def send_to_users(notification, user_ids):
+    """Send a notification to a chunk of users.
+
+    This is called by the send_notification_chunk task, normally you want to
+    use messages.tasks.send_notification() instead.
+    """
+    users = User.objects.filter(id__in=user_ids)
+    message_bodies = {}
+    email_bodies = {}
+    messages = []
+    emails = []
+
+    def render(cache, user, render_func, template):
+        key = user.pk if notification.per_user else None
+        if key not in cache:
+            cache[key] = render_func(template, notification.context_for(user))
+        return cache[key]
+
+    for user in users:
+        if notification.should_send_message(user):
+            message = Message(user=user, subject=notification.subject,
+                              author=notification.message_author)
+            message.content = render(message_bodies, user, render_to_string,
+                                     notification.message_template)
+            if notification.message_object is not None:
+                message.object = notification.message_object
+            messages.append(message)
+        if notification.should_send_email(user):
+            body = render(email_bodies, user, render_templated_email_body,
+                          notification.email_template)
+            emails.append(make_email([user.email], notification.subject,
+                                     body))
+            if notification.meter_name:
+                Meter(notification.meter_name).inc()
+
+    if messages:
+        Message.objects.bulk_create(messages)
+    send_email_batch(emails, notification.fail_silently)
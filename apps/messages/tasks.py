@@ -42,6 +42,7 @@ from localeurl.utils import universal_url
 from teams.moderation_const import REVIEWED_AND_PUBLISHED, \
      REVIEWED_AND_PENDING_APPROVAL, REVIEWED_AND_SENT_BACK
 
+from messages import fanout
 from messages.models import Message
 from utils import send_templated_email
 from utils.metrics import Meter
@@ -55,6 +56,19 @@ def _team_sends_notification(team, notification_setting_name):
     from teams.models import Setting
     return not team.settings.filter( key=Setting.KEY_IDS[notification_setting_name]).exists()
 
+def send_notification(notification, user_ids):
+    """Send a fanout.Notification to a list of users.
+
+    The users are split into chunks and each chunk is handled by its own
+    task.
+    """
+    for chunk in fanout.chunk_user_ids(user_ids):
+        send_notification_chunk.delay(notification, chunk)
+
+@task()
+def send_notification_chunk(notification, user_ids):
+    fanout.send_to_users(notification, user_ids)
+
 @task()
 def send_new_messages_notifications(message_ids):
     for message_id in message_ids:
@@ -148,31 +162,25 @@ def application_sent(application_pk):
         return False
     notifiable = TeamMember.objects.filter( team=application.team,
        role__in=[TeamMember.ROLE_ADMIN, TeamMember.ROLE_OWNER])
-    for m in notifiable:
-
-        template_name = "messages/application-sent.txt"
-        context = {
+    subject  = fmt(
+        ugettext(u'%(user)s is applying for team %(team)s'),
+        user=application.user, team=application.team.name)
+    notification = fanout.Notification(
+        subject,
+        context={
             "application": application,
             "applicant": application.user,
             "url_base": get_url_base(),
             "team":application.team,
             "note":application.note,
-            "user":m.user,
-        }
-        body = render_to_string(template_name,context)
-        subject  = fmt(
-            ugettext(u'%(user)s is applying for team %(team)s'),
-            user=application.user, team=application.team.name)
-        if m.user.notify_by_message:
-            msg = Message()
-            msg.subject = subject
-            msg.content = body
-            msg.user = m.user
-            msg.object = application.team
-            msg.author = application.user
-            msg.save()
-        Meter('templated-emails-sent-by-type.teams.application-sent').inc()
-        send_templated_email(m.user, subject, "messages/email/application-sent-email.html", context)
+        },
+        message_template="messages/application-sent.txt",
+        email_template="messages/email/application-sent-email.html",
+        message_object=application.team,
+        message_author=application.user,
+        meter_name='templated-emails-sent-by-type.teams.application-sent')
+    send_notification(notification,
+                      notifiable.values_list('user_id', flat=True))
     return True
 
 
@@ -225,28 +233,20 @@ def team_member_new(member_pk):
     # notify  admins and owners through messages
     notifiable = TeamMember.objects.filter( team=member.team,
        role__in=[TeamMember.ROLE_ADMIN, TeamMember.ROLE_OWNER]).exclude(pk=member.pk)
-    for m in notifiable:
-        context = {
+    notification = fanout.Notification(
+        fmt(ugettext("%(team)s team has a new member"), team=member.team),
+        context={
             "new_member": member.user,
             "team":member.team,
-            "user":m.user,
             "role":member.role,
             "url_base":get_url_base(),
-        }
-        body = render_to_string("messages/team-new-member.txt",context)
-        subject = fmt(
-            ugettext("%(team)s team has a new member"),
-            team=member.team)
-        if m.user.notify_by_message:
-            msg = Message()
-            msg.subject = subject
-            msg.content = body
-            msg.user = m.user
-            msg.object = m.team
-            msg.save()
-        template_name = "messages/email/team-new-member.html"
-        Meter('templated-emails-sent-by-type.teams.new-member').inc()
-        send_templated_email(m.user, subject, template_name, context)
+        },
+        message_template="messages/team-new-member.txt",
+        email_template="messages/email/team-new-member.html",
+        message_object=member.team,
+        meter_name='templated-emails-sent-by-type.teams.new-member')
+    send_notification(notification,
+                      notifiable.values_list('user_id', flat=True))
 
     # does this team have a custom message for this?
     team_default_message = None
@@ -300,23 +300,19 @@ def team_member_leave(team_pk, user_pk):
     subject = fmt(
         ugettext(u"%(user)s has left the %(team)s team"),
         user=user, team=team)
-    for m in notifiable:
-        context = {
+    notification = fanout.Notification(
+        subject,
+        context={
             "parting_member": user,
             "team":team,
-            "user":m.user,
             "url_base":get_url_base(),
-        }
-        body = render_to_string("messages/team-member-left.txt",context)
-        if m.user.notify_by_message:
-            msg = Message()
-            msg.subject = subject
-            msg.content = body
-            msg.user = m.user
-            msg.object = team
-            msg.save()
-        Meter('templated-emails-sent-by-type.teams.someone-left').inc()
-        send_templated_email(m.user, subject, "messages/email/team-member-left.html", context)
+        },
+        message_template="messages/team-member-left.txt",
+        email_template="messages/email/team-member-left.html",
+        message_object=team,
+        meter_name='templated-emails-sent-by-type.teams.someone-left')
+    send_notification(notification,
+                      notifiable.values_list('user_id', flat=True))
 
 
     context = {
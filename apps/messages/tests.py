@@ -19,8 +19,10 @@
 from django.core import mail
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+import mock
 
 from auth.models import CustomUser as User, EmailConfirmation
+from messages import fanout
 from messages.models import Message
 from subtitles import models as sub_models
 from subtitles.pipeline import add_subtitles
@@ -450,3 +452,43 @@ class TeamBlockSettingsTest(TestCase):
         team_tasks.add_videos_notification_daily()
         self.assertEquals(Message.objects.all().count(), 0,
             "%s is on, so this message should *not * be sent" % setting_name)
+
+class FanoutTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.users = [
+            UserFactory(notify_by_email=True, notify_by_message=True),
+            UserFactory(notify_by_email=False, notify_by_message=True),
+            UserFactory(notify_by_email=True, notify_by_message=False),
+        ]
+        mail.outbox = []
+
+    def make_notification(self, **kwargs):
+        return fanout.Notification(
+            'Test subject', {'team': self.team, 'url_base': 'http://a.b'},
+            message_template='messages/team-new-member.txt',
+            email_template='messages/email/team-new-member.html',
+            message_object=self.team, **kwargs)
+
+    def test_send(self):
+        messages.tasks.send_notification(self.make_notification(),
+                                         [u.id for u in self.users])
+        self.assertEqual(
+            set(Message.objects.values_list('user_id', flat=True)),
+            set([self.users[0].id, self.users[1].id]))
+        self.assertEqual(Message.objects.filter(object_pk=self.team.pk,
+                                                subject='Test subject')
+                         .count(), 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         sorted([self.users[0].email, self.users[2].email]))
+
+    def test_chunks(self):
+        self.assertEqual(fanout.chunk_user_ids(range(5), 2),
+                         [[0, 1], [2, 3], [4]])
+
+    def test_render_once(self):
+        with mock.patch('messages.fanout.render_to_string',
+                        return_value='body') as mock_render:
+            fanout.send_to_users(self.make_notification(per_user=False),
+                                 [u.id for u in self.users])
+        self.assertEqual(mock_render.call_count, 1)
@@ -16,10 +16,24 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+import copy
+
+from django.conf import settings
 from django.core.cache import cache
 
+from utils.lrucache import LRUCache
+from utils.metrics import Meter
+
 TIMEOUT = 60 * 60 * 24 * 5 # 5 days
 
+# Parsed SubtitleSets take up a lot more memory than the compressed blob they
+# come from.  This is a rough estimate of the ratio, used to convert the blob
+# size to the size we count against PARSED_SUBTITLES_CACHE_SIZE.
+PARSED_SIZE_RATIO = 20
+
+parsed_subtitles_cache = LRUCache(
+    getattr(settings, 'PARSED_SUBTITLES_CACHE_SIZE', 64 * 1024 * 1024))
+
 
 def _lang_is_synced_id(language, public):
     if public:
@@ -38,3 +52,55 @@ def get_is_synced(language, public):
 def set_is_synced(language, public, value):
     cache_key = _lang_is_synced_id(language, public)
     cache.set(cache_key, value, TIMEOUT)
+
+def get_many_is_synced(languages, public):
+    """Get is_synced values for several languages with one cache request.
+
+    Returns: dict mapping language ids to is_synced values.  Languages that
+        don't have a value in the cache are left out.
+    """
+    cache_keys = dict((_lang_is_synced_id(language, public), language.pk)
+                      for language in languages)
+    if not cache_keys:
+        return {}
+    return dict((cache_keys[key], value)
+                for key, value in cache.get_many(cache_keys.keys()).items())
+
+def set_many_is_synced(values, public):
+    """Store is_synced values for several languages.
+
+    Args:
+        values: list of (language, is_synced) tuples
+    """
+    cache.set_many(dict((_lang_is_synced_id(language, public), value)
+                        for language, value in values), TIMEOUT)
+
+def _parsed_subtitles_key(version):
+    return (version.pk, version.language_code)
+
+def get_parsed_subtitles(version):
+    """Get a SubtitleSet for a version from the process-local cache.
+
+    Returns None if the subtitles aren't cached.  Callers are free to modify
+    the returned SubtitleSet, it's a copy of the cached one.
+    """
+    if version.pk is None:
+        return None
+    subtitles = parsed_subtitles_cache.get(_parsed_subtitles_key(version))
+    if subtitles is None:
+        Meter('subtitles.parsed-cache.miss').inc()
+        return None
+    Meter('subtitles.parsed-cache.hit').inc()
+    return copy.deepcopy(subtitles)
+
+def set_parsed_subtitles(version, subtitles):
+    """Store a copy of a version's SubtitleSet in the process-local cache."""
+    if version.pk is None:
+        return
+    size = len(version.serialized_subtitles) * PARSED_SIZE_RATIO
+    parsed_subtitles_cache.set(_parsed_subtitles_key(version),
+                               copy.deepcopy(subtitles), size)
+
+def invalidate_parsed_subtitles(version):
+    if version.pk is not None:
+        parsed_subtitles_cache.delete(_parsed_subtitles_key(version))
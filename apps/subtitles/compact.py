@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""subtitles.compact -- Binary storage format for SubtitleVersion subtitles.
+
+Historically SubtitleVersion.serialized_subtitles held DFXP XML, zipped and
+base64'ed.  Reading that back means parsing XML every time, which is slow.
+
+The compact format stores the same data as a packed binary blob:
+
+    header   -- format version, subtitle count, string count
+    strings  -- (offset, length) pairs pointing into the string data
+    records  -- one per subtitle: start time, end time, flags, text string
+                index, region string index
+    data     -- UTF-8 encoded strings, concatenated
+
+Text and regions are stored in a string table, so repeated lines ("[Music]",
+"bottom") are only stored once.  The text is the inner DFXP markup of the
+subtitle's <p> element, so styling survives a round trip.
+
+The blob is zipped/base64'ed with utils.compress, then prefixed with PREFIX so
+we can tell it apart from legacy rows.  CompactSubtitles reads it lazily: the
+timing data can be used without decoding any strings, and a SubtitleSet is only
+built when someone actually needs one.
+"""
+
+import struct
+from collections import namedtuple
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from utils.compress import compress, decompress
+from utils.subtitles import create_new_subtitles
+
+PREFIX = 'compact:'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('>HII')
+STRING_ENTRY = struct.Struct('>II')
+RECORD = struct.Struct('>iiBII')
+
+# Sentinel values for missing times/strings.
+NO_TIME = -0x80000000
+NO_STRING = 0xFFFFFFFF
+
+FLAG_NEW_PARAGRAPH = 0x01
+
+SubtitleItem = namedtuple('SubtitleItem', 'start_time end_time text meta')
+
+class CompactFormatError(ValueError):
+    pass
+
+def is_compact(serialized):
+    """Check if a serialized_subtitles value uses the compact format."""
+    return bool(serialized) and serialized.startswith(PREFIX)
+
+def _inner_markup(el):
+    parts = []
+    if el.text:
+        parts.append(escape(el.text))
+    for child in el:
+        # tostring() includes the tail text for us
+        parts.append(etree.tostring(child, encoding=unicode))
+    return u''.join(parts)
+
+def _pack_time(value):
+    return NO_TIME if value is None else value
+
+def _unpack_time(value):
+    return None if value == NO_TIME else value
+
+def pack(subtitles):
+    """Convert a SubtitleSet to the binary compact format."""
+    strings = []
+    string_indexes = {}
+    def string_index(value):
+        if value is None:
+            return NO_STRING
+        if value not in string_indexes:
+            string_indexes[value] = len(strings)
+            strings.append(value)
+        return string_indexes[value]
+
+    records = []
+    items = subtitles.subtitle_items()
+    for item, el in zip(items, subtitles.get_subtitles()):
+        flags = 0
+        if item.meta.get('new_paragraph'):
+            flags |= FLAG_NEW_PARAGRAPH
+        records.append(RECORD.pack(_pack_time(item.start_time),
+                                   _pack_time(item.end_time),
+                                   flags,
+                                   string_index(_inner_markup(el)),
+                                   string_index(el.get('region'))))
+
+    string_entries = []
+    string_data = []
+    offset = 0
+    for value in strings:
+        encoded = value.encode('utf-8')
+        string_entries.append(STRING_ENTRY.pack(offset, len(encoded)))
+        string_data.append(encoded)
+        offset += len(encoded)
+
+    return ''.join([HEADER.pack(FORMAT_VERSION, len(records), len(strings))] +
+                   string_entries + records + string_data)
+
+def dumps(subtitles):
+    """Serialize a SubtitleSet for storage in serialized_subtitles."""
+    return PREFIX + compress(pack(subtitles))
+
+def loads(serialized):
+    """Get a CompactSubtitles object from a serialized_subtitles value."""
+    if not is_compact(serialized):
+        raise CompactFormatError("Not in compact format")
+    return CompactSubtitles(decompress(serialized[len(PREFIX):]))
+
+def time_bounds(times):
+    """Find the start/end time for a list of (start_time, end_time) tuples.
+
+    The start time is the first time set on the first subtitle that has one and
+    the end time is the last time set on the last subtitle that has one.
+
+    Returns (start_time, end_time) or None if no subtitles have times set.
+    """
+    for start_time, end_time in times:
+        if start_time is not None:
+            first = start_time
+            break
+        # we shouldn't have an end time set without a start time, but handle
+        # it just in case
+        if end_time is not None:
+            first = end_time
+            break
+    else:
+        return None
+
+    for start_time, end_time in reversed(times):
+        if end_time is not None:
+            last = end_time
+            break
+        # we shouldn't have an end time not set, but check for that just in
+        # case
+        if start_time is not None:
+            last = start_time
+            break
+    else:
+        return None
+    return (first, last)
+
+class CompactSubtitles(object):
+    """Lazy reader for the compact format.
+
+    Nothing gets decoded until it's asked for.  len(), get_times(), and
+    time_bounds() only unpack the fixed-size records.  subtitle_items() also
+    decodes the text strings.  to_subtitle_set() builds a full babelsubs
+    SubtitleSet, which is what you need to generate DFXP or other formats.
+    """
+    def __init__(self, payload):
+        try:
+            version, count, string_count = HEADER.unpack_from(payload, 0)
+        except struct.error:
+            raise CompactFormatError("Truncated header")
+        if version != FORMAT_VERSION:
+            raise CompactFormatError("Unknown format version: %s" % version)
+        self._payload = payload
+        self._count = count
+        self._strings_offset = HEADER.size
+        self._records_offset = (self._strings_offset +
+                                string_count * STRING_ENTRY.size)
+        self._data_offset = self._records_offset + count * RECORD.size
+        self._string_cache = {}
+        self._times = None
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, index):
+        return RECORD.unpack_from(self._payload,
+                                  self._records_offset + index * RECORD.size)
+
+    def _string(self, index):
+        if index == NO_STRING:
+            return None
+        if index not in self._string_cache:
+            offset, length = STRING_ENTRY.unpack_from(
+                self._payload, self._strings_offset + index * STRING_ENTRY.size)
+            start = self._data_offset + offset
+            self._string_cache[index] = self._payload[
+                start:start+length].decode('utf-8')
+        return self._string_cache[index]
+
+    def get_times(self):
+        """Get a list of (start_time, end_time) tuples."""
+        if self._times is None:
+            self._times = []
+            for i in xrange(self._count):
+                start_time, end_time = self._record(i)[:2]
+                self._times.append((_unpack_time(start_time),
+                                    _unpack_time(end_time)))
+        return self._times
+
+    def time_bounds(self):
+        return time_bounds(self.get_times())
+
+    @property
+    def fully_synced(self):
+        return all(start_time is not None and end_time is not None
+                   for start_time, end_time in self.get_times())
+
+    def subtitle_items(self):
+        """Iterate through SubtitleItems for our subtitles.
+
+        The text will be the DFXP markup for the subtitle.
+        """
+        for i in xrange(self._count):
+            start_time, end_time, flags, text, region = self._record(i)
+            yield SubtitleItem(_unpack_time(start_time),
+                               _unpack_time(end_time),
+                               self._string(text), {
+                                   'new_paragraph': bool(
+                                       flags & FLAG_NEW_PARAGRAPH),
+                                   'region': self._string(region),
+                               })
+
+    def to_subtitle_set(self, language_code):
+        subtitles = create_new_subtitles(language_code)
+        regions = []
+        for i, item in enumerate(self.subtitle_items()):
+            # The first subtitle always starts a paragraph, don't make
+            # append_subtitle() create an extra one.
+            new_paragraph = item.meta['new_paragraph'] and i > 0
+            subtitles.append_subtitle(item.start_time, item.end_time,
+                                      item.text, escape=False,
+                                      new_paragraph=new_paragraph)
+            regions.append(item.meta['region'])
+        if any(regions):
+            for el, region in zip(subtitles.get_subtitles(), regions):
+                if region:
+                    el.set('region', region)
+        return subtitles
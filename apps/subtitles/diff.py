@@ -0,0 +1,229 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""subtitles.diff -- Compare two SubtitleVersions.
+
+babelsubs.storage.diff() pairs up subtitles by position, so inserting one
+line near the start of a transcript marks every line after it as changed.
+Here we align the subtitles by text first:
+
+    - Strip off the common prefix and suffix.
+    - In what's left, lines whose text appears exactly once on each side are
+      used as anchors.  We keep the longest run of anchors that appear in
+      the same order on both sides.
+    - Repeat for the gaps between the anchors.  If a gap has no anchors, its
+      lines are paired up by position.
+
+Each step is linear except for finding the ordered anchors, which is
+O(n log n), so this stays fast on long transcripts.
+
+Versions are immutable, so diff_versions() caches the result for each pair
+of versions.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+
+from babelsubs.generators.html import HTMLGenerator
+from django.core.cache import cache
+
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+EMPTY_SUBTITLE = {
+    'text': '',
+    'start_time': None,
+    'end_time': None,
+}
+
+def diff_versions(version1, version2):
+    """Diff two SubtitleVersions.
+
+    Returns a dict with the same format as babelsubs.storage.diff():
+
+        - changed: True if anything changed
+        - text_changed: fraction of subtitles whose text changed
+        - time_changed: fraction of subtitles whose timing changed
+        - subtitle_data: list of dicts, one for each aligned pair of
+          subtitles.  Each has time_changed, text_changed, and subtitles,
+          which is a list of the 2 subtitle dicts (text, start_time,
+          end_time).  If a subtitle was added/removed, the other side is
+          empty.
+    """
+    cache_key = 'subtitle-diff:%s:%s' % (version1.pk, version2.pk)
+    rv = cache.get(cache_key)
+    if rv is None:
+        rv = diff(subtitle_dicts(version1), subtitle_dicts(version2))
+        cache.set(cache_key, rv, CACHE_TIMEOUT)
+    return rv
+
+def subtitle_dicts(version):
+    return [
+        {
+            'text': item.text,
+            'start_time': item.start_time,
+            'end_time': item.end_time,
+        }
+        for item in version.get_subtitles().subtitle_items(
+            HTMLGenerator.MAPPINGS)
+    ]
+
+def diff(subtitles1, subtitles2):
+    """Diff 2 lists of subtitle dicts.
+
+    See diff_versions() for the return value.
+    """
+    subtitle_data = []
+    text_changes = time_changes = 0
+    texts1 = [s['text'] for s in subtitles1]
+    texts2 = [s['text'] for s in subtitles2]
+    for i, j in align(texts1, texts2):
+        sub1 = subtitles1[i] if i is not None else EMPTY_SUBTITLE
+        sub2 = subtitles2[j] if j is not None else EMPTY_SUBTITLE
+        text_changed = sub1['text'] != sub2['text']
+        time_changed = (sub1['start_time'] != sub2['start_time'] or
+                        sub1['end_time'] != sub2['end_time'])
+        text_changes += text_changed
+        time_changes += time_changed
+        subtitle_data.append({
+            'text_changed': text_changed,
+            'time_changed': time_changed,
+            'subtitles': [sub1, sub2],
+        })
+    count = len(subtitle_data)
+    return {
+        'changed': bool(text_changes or time_changes),
+        'text_changed': float(text_changes) / count if count else 0.0,
+        'time_changed': float(time_changes) / count if count else 0.0,
+        'subtitle_data': subtitle_data,
+    }
+
+def align(texts1, texts2):
+    """Align 2 lists of subtitle texts.
+
+    Returns: list of (index1, index2) tuples.  index1 or index2 will be None
+    for subtitles that only appear in one list.
+    """
+    pairs = []
+    _align_range(texts1, 0, len(texts1), texts2, 0, len(texts2), pairs)
+    return pairs
+
+def _align_range(texts1, start1, end1, texts2, start2, end2, pairs):
+    # common prefix
+    while (start1 < end1 and start2 < end2 and
+           texts1[start1] == texts2[start2]):
+        pairs.append((start1, start2))
+        start1 += 1
+        start2 += 1
+    # common suffix
+    suffix_len = 0
+    while (start1 < end1 - suffix_len and start2 < end2 - suffix_len and
+           texts1[end1 - suffix_len - 1] == texts2[end2 - suffix_len - 1]):
+        suffix_len += 1
+    end1 -= suffix_len
+    end2 -= suffix_len
+
+    anchors = _find_anchors(texts1, start1, end1, texts2, start2, end2)
+    if anchors:
+        for i, j in anchors:
+            _align_range(texts1, start1, i, texts2, start2, j, pairs)
+            pairs.append((i, j))
+            start1, start2 = i + 1, j + 1
+        _align_range(texts1, start1, end1, texts2, start2, end2, pairs)
+    else:
+        _pair_by_position(start1, end1, start2, end2, pairs)
+
+    pairs.extend((end1 + k, end2 + k) for k in xrange(suffix_len))
+
+def _pair_by_position(start1, end1, start2, end2, pairs):
+    count = min(end1 - start1, end2 - start2)
+    pairs.extend((start1 + k, start2 + k) for k in xrange(count))
+    pairs.extend((i, None) for i in xrange(start1 + count, end1))
+    pairs.extend((None, j) for j in xrange(start2 + count, end2))
+
+def _find_anchors(texts1, start1, end1, texts2, start2, end2):
+    """Find lines that are unique on both sides and in the same order.
+
+    Returns: list of (index1, index2) tuples, sorted by both indexes.
+    """
+    positions1 = defaultdict(list)
+    for i in xrange(start1, end1):
+        positions1[texts1[i]].append(i)
+    positions2 = defaultdict(list)
+    for j in xrange(start2, end2):
+        positions2[texts2[j]].append(j)
+    candidates = sorted(
+        (positions1[text][0], indexes[0])
+        for text, indexes in positions2.iteritems()
+        if len(indexes) == 1 and len(positions1.get(text, ())) == 1
+    )
+    return _longest_increasing_run(candidates)
+
+def _longest_increasing_run(candidates):
+    """Find the longest subsequence of candidates where index2 increases.
+
+    candidates must be sorted by index1.  This is the patience sorting
+    algorithm.
+    """
+    if not candidates:
+        return []
+    # tails[k] is the index of the candidate that ends the best subsequence
+    # of length k + 1.  tail_values is the index2 for those candidates.
+    tails = []
+    tail_values = []
+    back_links = [None] * len(candidates)
+    for pos, (i, j) in enumerate(candidates):
+        k = bisect_left(tail_values, j)
+        if k > 0:
+            back_links[pos] = tails[k - 1]
+        if k == len(tails):
+            tails.append(pos)
+            tail_values.append(j)
+        else:
+            tails[k] = pos
+            tail_values[k] = j
+    rv = []
+    pos = tails[-1]
+    while pos is not None:
+        rv.append(candidates[pos])
+        pos = back_links[pos]
+    rv.reverse()
+    return rv
+
+def find_neighbors(language, versions):
+    """Find the previous/next extant versions for several versions.
+
+    This uses a single query that fetches the pk and version number for the
+    language's versions.
+
+    Returns: dict mapping version pks to (previous_pk, next_pk) tuples.
+        Either can be None.
+    """
+    rows = list(language.subtitleversion_set.extant()
+                .order_by('version_number')
+                .values_list('pk', 'version_number'))
+    rv = {}
+    for version in versions:
+        previous_pk = next_pk = None
+        for pk, version_number in rows:
+            if version_number < version.version_number:
+                previous_pk = pk
+            elif version_number > version.version_number:
+                next_pk = pk
+                break
+        rv[version.pk] = (previous_pk, next_pk)
+    return rv
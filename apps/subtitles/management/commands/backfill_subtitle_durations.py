@@ -0,0 +1,109 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import logging
+from optparse import make_option
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from subtitles.models import SubtitleVersion
+from utils.commands import ErrorHandlingCommand, reset_connections
+
+logger = logging.getLogger(__name__)
+
+def backfill_range(pk_range):
+    """Fill in the time fields for versions with start <= pk < end.
+
+    Returns the number of versions updated.
+    """
+    start, end = pk_range
+    versions = (SubtitleVersion.objects.full().missing_durations()
+                .filter(pk__gte=start, pk__lt=end)
+                .only('pk', 'language_code', 'serialized_subtitles'))
+    count = 0
+    with transaction.commit_on_success():
+        for version in versions:
+            try:
+                version.update_time_fields()
+            except Exception:
+                logger.warn("Error calculating time bounds for %s",
+                            version.pk, exc_info=True)
+                continue
+            # Use update() so that we don't trigger any of the version
+            # side-effects.  Filter on duration_ms in case another process
+            # has already filled it in.
+            count += SubtitleVersion.objects.filter(
+                pk=version.pk, duration_ms__isnull=True
+            ).update(start_ms=version.start_ms, end_ms=version.end_ms,
+                     duration_ms=version.duration_ms)
+    return count
+
+def worker(pk_range):
+    reset_connections()
+    return backfill_range(pk_range)
+
+class Command(ErrorHandlingCommand):
+    help = ('Fill in start_ms, end_ms, and duration_ms for SubtitleVersions '
+            'created before we started storing them.')
+
+    option_list = ErrorHandlingCommand.option_list + (
+        make_option('--batch-size', action='store', dest='batch_size',
+                    type='int', default=1000,
+                    help='Size of the pk range each batch handles'),
+        make_option('--workers', action='store', dest='workers',
+                    type='int', default=0,
+                    help='Number of worker processes to use.  0 means handle '
+                    'everything in this process.'),
+    )
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        pk_ranges = self.calc_pk_ranges(options['batch_size'])
+        if options['workers'] > 0:
+            import multiprocessing
+            pool = multiprocessing.Pool(options['workers'])
+            try:
+                total = self.report_progress(
+                    pool.imap_unordered(worker, pk_ranges), len(pk_ranges))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            total = self.report_progress(
+                (backfill_range(r) for r in pk_ranges), len(pk_ranges))
+        self.print_to_console('done: %s versions updated' % total)
+
+    def report_progress(self, results, batch_count):
+        total = 0
+        for i, count in enumerate(results):
+            total += count
+            self.print_to_console('batch %s/%s done (%s versions updated)' %
+                                  (i + 1, batch_count, total))
+        return total
+
+    def calc_pk_ranges(self, batch_size):
+        result = (SubtitleVersion.objects.full().missing_durations()
+                  .aggregate(min_pk=Min('pk'), max_pk=Max('pk')))
+        if result['min_pk'] is None:
+            return []
+        return [
+            (start, start + batch_size)
+            for start in xrange(result['min_pk'], result['max_pk'] + 1,
+                                batch_size)
+        ]
@@ -0,0 +1,97 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import logging
+import sys
+import time
+from optparse import make_option
+
+from django.db import transaction
+
+from subtitles import compact
+from subtitles.models import SubtitleVersion
+from utils.commands import ErrorHandlingCommand
+
+logger = logging.getLogger(__name__)
+
+class Command(ErrorHandlingCommand):
+    help = ('Rewrite legacy DFXP serialized_subtitles in the compact format.  '
+            'Safe to run on a live site and to restart with --start-pk.')
+
+    option_list = ErrorHandlingCommand.option_list + (
+        make_option('--batch-size', action='store', dest='batch_size',
+                    type='int', default=200,
+                    help='Number of versions to convert per transaction'),
+        make_option('--start-pk', action='store', dest='start_pk',
+                    type='int', default=0,
+                    help='Only convert versions with a pk above this one'),
+        make_option('--sleep', action='store', dest='sleep',
+                    type='float', default=0.1,
+                    help='Seconds to sleep between batches'),
+    )
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        last_pk = options['start_pk']
+        converted = errors = skipped = 0
+        while True:
+            batch = list(SubtitleVersion.objects.full()
+                         .filter(pk__gt=last_pk)
+                         .order_by('pk')
+                         .only('pk', 'language_code', 'serialized_subtitles')
+                         [:options['batch_size']])
+            if not batch:
+                break
+            with transaction.commit_on_success():
+                for version in batch:
+                    if version.has_compact_subtitles():
+                        continue
+                    try:
+                        subtitles = version.get_subtitles()
+                        serialized = compact.dumps(subtitles)
+                        rebuilt = compact.loads(serialized).to_subtitle_set(
+                            version.language_code)
+                    except Exception:
+                        self.handle_error(sys.exc_info())
+                        errors += 1
+                        continue
+                    # The compact format doesn't store everything that DFXP
+                    # can (extra <p> attributes, custom styling/regions).
+                    # Leave those versions in the legacy format rather than
+                    # losing data.
+                    if rebuilt.to_xml() != subtitles.to_xml():
+                        logger.warn("migrate_subtitle_storage: version %s "
+                                    "doesn't round trip, skipping",
+                                    version.pk)
+                        skipped += 1
+                        continue
+                    # Use update() rather than save() so that we don't
+                    # trigger any of the version side-effects.  Filter on the
+                    # old value in case another process rewrote the row since
+                    # we read it.
+                    SubtitleVersion.objects.filter(
+                        pk=version.pk,
+                        serialized_subtitles=version.serialized_subtitles,
+                    ).update(serialized_subtitles=serialized)
+                    converted += 1
+            last_pk = batch[-1].pk
+            self.print_to_console('converted %s versions (last pk: %s)' %
+                                  (converted, last_pk))
+            time.sleep(options['sleep'])
+        self.print_to_console('done: %s converted, %s skipped, %s errors' %
+                              (converted, skipped, errors))
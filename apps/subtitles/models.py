@@ -20,6 +20,7 @@
 
 import itertools
 import json
+import logging
 from datetime import datetime, date, timedelta
 
 from django.core.exceptions import ValidationError
@@ -30,6 +31,7 @@ from django.utils.translation import ugettext
 from django.utils.translation import ugettext_lazy as _
 
 from subtitles import cache
+from subtitles import compact
 from subtitles import shims
 from auth.models import CustomUser as User
 from videos import metadata
@@ -39,11 +41,13 @@ from babelsubs.storage import calc_changes
 from babelsubs.generators.html import HTMLGenerator
 from babelsubs import load_from
 from subtitles import signals
-from utils.compress import compress, decompress
+from utils.compress import decompress
 from utils.subtitles import create_new_subtitles
 from utils import translation
 from videos.behaviors import make_video_title
 
+logger = logging.getLogger(__name__)
+
 WRITELOCK_EXPIRATION = 30 # 30 seconds
 
 # Utility functions -----------------------------------------------------------
@@ -136,7 +140,7 @@ def get_lineage(parents):
 
 class SubtitleLanguagageQuerySet(query.QuerySet):
     def fetch_and_join(self, public_tips=False, private_tips=False,
-                       video=None):
+                       video=None, video_map=None):
         """Fetch languages and join them to related models.
 
         This method is an efficient way to fetch languages under a couple
@@ -150,12 +154,17 @@ class SubtitleLanguagageQuerySet(query.QuerySet):
         :param public_tips: set the public tip cache for fetched languages
         :param private_tips: set the private tip cache for fetched languages
         :param video: set the cached video for all languages/versions fetched
+        :param video_map: dict mapping video ids to videos.  Use this to set
+            the cached video when the languages are for multiple videos.
         :returns: list of SubtitleLanguage objects
         """
         langs = list(self)
         if video is not None:
             for lang in langs:
                 lang.video = video
+        elif video_map is not None:
+            for lang in langs:
+                lang.video = video_map[lang.video_id]
 
         def join_tips(base_qs, cache_name):
             qs = base_qs.filter(subtitle_language__in=langs)
@@ -391,6 +400,10 @@ class SubtitleLanguage(models.Model):
         super(SubtitleLanguage, self).__init__(*args, **kwargs)
         self._tip_cache = {}
         self._translation_source_version_cache = {}
+        # Remember subtitles_complete so that save() can tell if it changed.
+        # Use __dict__ so that we don't load the field if it's deferred.
+        self._saved_subtitles_complete = self.__dict__.get(
+            'subtitles_complete')
 
     # Writelocking
     @property
@@ -486,7 +499,15 @@ class SubtitleLanguage(models.Model):
         if creating and not self.created:
             self.created = datetime.now()
 
+        complete_changed = (
+            not creating and
+            self._saved_subtitles_complete is not None and
+            self._saved_subtitles_complete != self.subtitles_complete)
+
         super(SubtitleLanguage, self).save(*args, **kwargs)
+        self._saved_subtitles_complete = self.subtitles_complete
+        if complete_changed:
+            signals.subtitles_complete_changed.send(self)
 
     def title_display(self):
         tip = self.get_tip()
@@ -671,9 +692,7 @@ EXISTS(
         if not version:
             return False
 
-        subtitles = version.get_subtitles()
-
-        return subtitles.fully_synced
+        return version.is_synced()
 
     def _sanity_check_parents(self, version, parents):
         r"""Check that the given parents are sane for an SV about to be created.
@@ -795,6 +814,26 @@ EXISTS(
             cache.set_is_synced(self, public, value)
         return value
 
+    @classmethod
+    def bulk_is_synced(cls, languages, public=True):
+        """Check if the tips for a list of languages are synced
+
+        This works like is_synced(), but uses a single cache request for all
+        of the languages.
+
+        Returns: dict mapping language ids to is_synced values
+        """
+        rv = cache.get_many_is_synced(languages, public)
+        to_store = []
+        for language in languages:
+            if language.pk not in rv:
+                value = language.get_tip(public=public).is_synced()
+                rv[language.pk] = value
+                to_store.append((language, value))
+        if to_store:
+            cache.set_many_is_synced(to_store, public)
+        return rv
+
     def nuke_language(self):
         """Delete all SubtitleVersions for this language, as well as all
         SubtitleVersions for dependent languages.
@@ -1110,6 +1149,33 @@ LIMIT 1;""", (self.id, self.id))
 
 
 # SubtitleVersions ------------------------------------------------------------
+class SubtitleVersionQuerySet(query.QuerySet):
+    def missing_durations(self):
+        """Filter for versions that don't have their timing data stored yet.
+        """
+        return self.filter(duration_ms__isnull=True)
+
+    def missing_changes(self):
+        """Filter for versions that don't have their change ratios stored
+        yet.
+        """
+        return self.filter(time_change_ratio__isnull=True)
+
+    def minutes_by(self, *fields):
+        """Sum the durations in minutes, grouped by fields.
+
+        Returns a dict mapping values for fields to the total minutes.  If
+        only 1 field is given, the keys are the values of that field,
+        otherwise they are tuples.
+        """
+        qs = (self.order_by().values_list(*fields)
+              .annotate(total=models.Sum('duration_ms')))
+        rv = {}
+        for row in qs:
+            key = row[0] if len(fields) == 1 else tuple(row[:-1])
+            rv[key] = (row[-1] or 0) / 60000.0
+        return rv
+
 class SubtitleVersionManager(models.Manager):
     use_for_related_fields = True
 
@@ -1133,6 +1199,9 @@ class SubtitleVersionManager(models.Manager):
     # these proxy methods instead of going through get_query_set(), so we're out
     # of luck.
 
+    def get_query_set(self):
+        return SubtitleVersionQuerySet(self.model)
+
     # These three methods are your main entry point into SubtitleVersion querysets.
     def full(self):
         """Return a queryset of ALL versions (including deleted ones)."""
@@ -1345,6 +1414,19 @@ class SubtitleVersion(models.Model):
     # Denormalized count of the number of subtitles this version contains, for
     # easier filtering later.
     subtitle_count = models.PositiveIntegerField(default=0)
+    # Denormalized timing data, in milliseconds.  start_ms is the start of the
+    # first synced subtitle, end_ms is the end of the last one, and
+    # duration_ms is the difference between them (0 if there are no synced
+    # subtitles).  These are all NULL for versions that haven't been
+    # backfilled by the backfill_subtitle_durations command.
+    start_ms = models.IntegerField(null=True, blank=True)
+    end_ms = models.IntegerField(null=True, blank=True)
+    duration_ms = models.IntegerField(null=True, blank=True)
+    # Denormalized change ratios (0.0 - 1.0) against the previous extant
+    # version, see get_changes().  These are NULL for versions that haven't
+    # been backfilled by the backfill_subtitle_changes command.
+    time_change_ratio = models.FloatField(null=True, blank=True)
+    text_change_ratio = models.FloatField(null=True, blank=True)
 
     created = models.DateTimeField(editable=False)
 
@@ -1352,9 +1434,10 @@ class SubtitleVersion(models.Model):
     meta_2_content = metadata.MetadataContentField()
     meta_3_content = metadata.MetadataContentField()
 
-    # Subtitles are stored in a text blob, serialized as base64'ed zipped XML
-    # (oh the joys of Django).  Use the subtitles property to get and set them.
-    # You shouldn't be touching this field.
+    # Subtitles are stored in a text blob.  New versions use the binary format
+    # from subtitles.compact, older ones are base64'ed zipped XML (oh the joys
+    # of Django).  Use the subtitles property to get and set them.  You
+    # shouldn't be touching this field.
     serialized_subtitles = models.TextField()
 
     # Lineage is stored as a blob of JSON to save on DB rows.  You shouldn't
@@ -1382,16 +1465,96 @@ class SubtitleVersion(models.Model):
         subtitles.
 
         """
-        # We cache the parsed subs for speed.
+        # We cache the parsed subs for speed, both on the instance and in
+        # a process-wide LRU cache.
+        if self._subtitles == None:
+            self._subtitles = cache.get_parsed_subtitles(self)
         if self._subtitles == None:
-            self._subtitles = load_from(decompress(self.serialized_subtitles),
+            if self.has_compact_subtitles():
+                self._subtitles = self.get_compact_subtitles().to_subtitle_set(
+                    self.language_code)
+            else:
+                self._subtitles = load_from(
+                    decompress(self.serialized_subtitles),
                     type='dfxp').to_internal()
-            # force the subtitles to have the correct language code.  For a
-            # while we had a bug where we always set to to "en"
-            self._subtitles.set_language(self.language_code)
+                # force the subtitles to have the correct language code.  For
+                # a while we had a bug where we always set to to "en"
+                self._subtitles.set_language(self.language_code)
+            cache.set_parsed_subtitles(self, self._subtitles)
 
         return self._subtitles
 
+    def has_compact_subtitles(self):
+        """Check if our subtitles are stored in the compact format.
+
+        Versions created before the compact format was added store DFXP until
+        the migrate_subtitle_storage command rewrites them.
+        """
+        return compact.is_compact(self.serialized_subtitles)
+
+    def get_compact_subtitles(self):
+        """Return a compact.CompactSubtitles reader for this version.
+
+        This is much cheaper than get_subtitles() if you only need the timing
+        data or the subtitle text.  For legacy rows we need to parse the DFXP
+        and convert it, so only use this if has_compact_subtitles() is True or
+        you need the reader API anyways.
+        """
+        if self._compact_subtitles is None:
+            if self.has_compact_subtitles():
+                self._compact_subtitles = compact.loads(
+                    self.serialized_subtitles)
+            else:
+                self._compact_subtitles = compact.CompactSubtitles(
+                    compact.pack(self.get_subtitles()))
+        return self._compact_subtitles
+
+    def get_time_bounds(self):
+        """Get the (start_time, end_time) of our subtitles in milliseconds.
+
+        Returns None if there are no synced subtitles.
+        """
+        if self.duration_ms is not None:
+            if self.start_ms is None:
+                return None
+            return (self.start_ms, self.end_ms)
+        return self.calc_time_bounds()
+
+    def calc_time_bounds(self):
+        """Calculate the time bounds from the subtitle data.
+
+        This ignores the start_ms/end_ms fields.  Normally you want to use
+        get_time_bounds() instead.
+        """
+        if self.has_compact_subtitles():
+            return self.get_compact_subtitles().time_bounds()
+        return compact.time_bounds([
+            (item.start_time, item.end_time)
+            for item in self.get_subtitles().subtitle_items()
+        ])
+
+    def get_duration_ms(self):
+        """Get the length of time our subtitles cover in milliseconds."""
+        if self.duration_ms is not None:
+            return self.duration_ms
+        bounds = self.get_time_bounds()
+        if bounds is None:
+            return 0
+        return bounds[1] - bounds[0]
+
+    def update_time_fields(self):
+        """Set start_ms, end_ms, and duration_ms from our subtitle data.
+
+        This doesn't save the version.
+        """
+        bounds = self.calc_time_bounds()
+        if bounds is None:
+            self.start_ms = self.end_ms = None
+            self.duration_ms = 0
+        else:
+            self.start_ms, self.end_ms = bounds
+            self.duration_ms = self.end_ms - self.start_ms
+
     def set_subtitles(self, subtitles):
         """Set the SubtitleSet for this version.
 
@@ -1420,10 +1583,13 @@ class SubtitleVersion(models.Model):
                                 % str(type(subtitles)))
 
         self.subtitle_count = len(subtitles)
-        self.serialized_subtitles = compress(subtitles.to_xml())
+        self.serialized_subtitles = compact.dumps(subtitles)
 
         # We cache the parsed subs for speed.
         self._subtitles = subtitles
+        self._compact_subtitles = None
+        cache.invalidate_parsed_subtitles(self)
+        self.update_time_fields()
 
 
     def get_lineage(self):
@@ -1473,6 +1639,7 @@ class SubtitleVersion(models.Model):
         super(SubtitleVersion, self).__init__(*args, **kwargs)
 
         self._subtitles = None
+        self._compact_subtitles = None
         if has_subtitles:
             self.set_subtitles(subtitles)
 
@@ -1519,6 +1686,9 @@ class SubtitleVersion(models.Model):
 
         super(SubtitleVersion, self).save(*args, **kwargs)
 
+        if not creating and self.visibility_override == 'deleted':
+            self._update_next_version_changes()
+
         if self.is_public() and self.is_for_primary_audio_language():
             self._set_video_data()
         elif video_needs_save:
@@ -1550,6 +1720,8 @@ class SubtitleVersion(models.Model):
         return set(mapcat(_ancestors, self.parents.full()))
 
     def get_subtitle_count(self):
+        if self._subtitles is None and self.has_compact_subtitles():
+            return len(self.get_compact_subtitles())
         # TODO: babelsubs now supports len() on SubtitleSet instances
         return len([s for s in self.get_subtitles().subtitle_items()])
 
@@ -1571,16 +1743,63 @@ class SubtitleVersion(models.Model):
         if hasattr(self, '_time_change') and hasattr(self, '_text_change'):
             return (self._time_change, self._text_change)
 
+        if (self.time_change_ratio is not None and
+            self.text_change_ratio is not None):
+            self._time_change = self.time_change_ratio
+            self._text_change = self.text_change_ratio
+        else:
+            self._time_change, self._text_change = self.calc_changes()
+
+        return self._time_change, self._text_change
+
+    def calc_changes(self):
+        """Calculate (time_change, text_change) from the subtitle data.
+
+        This ignores the time_change_ratio/text_change_ratio fields.
+        Normally you want to use get_changes() instead.
+        """
         parent = self.previous_version()
 
         if not parent:
             return (1.0, 1.0)
 
-        self._text_change, self._time_change = calc_changes(
+        text_change, time_change = calc_changes(
             parent.get_subtitles(), self.get_subtitles(),
             HTMLGenerator.MAPPINGS)
+        return time_change, text_change
 
-        return self._time_change, self._text_change
+    def update_change_fields(self):
+        """Calculate and store time_change_ratio and text_change_ratio.
+
+        This saves the fields with an update() query, so that we don't
+        trigger any of the side-effects of save().
+        """
+        self.time_change_ratio, self.text_change_ratio = self.calc_changes()
+        self._time_change = self.time_change_ratio
+        self._text_change = self.text_change_ratio
+        SubtitleVersion.objects.filter(pk=self.pk).update(
+            time_change_ratio=self.time_change_ratio,
+            text_change_ratio=self.text_change_ratio)
+
+    def _update_next_version_changes(self):
+        """Recalculate the change ratios for the version after this one.
+
+        Call this when we get deleted, since the next version will now be
+        compared against the version before us.
+        """
+        next_versions = (self.sibling_set.extant()
+                         .filter(version_number__gt=self.version_number)
+                         .order_by('version_number')[:1])
+        for version in next_versions:
+            try:
+                version.update_change_fields()
+            except Exception:
+                logger.warn("Error calculating changes for %s", version.pk,
+                            exc_info=True)
+                # Clear the old values, get_changes() will calculate them
+                # when they're needed.
+                SubtitleVersion.objects.filter(pk=version.pk).update(
+                    time_change_ratio=None, text_change_ratio=None)
 
     @property
     def time_change(self):
@@ -1825,6 +2044,8 @@ class SubtitleVersion(models.Model):
         return self.subtitle_count is not 0
 
     def is_synced(self):
+        if self._subtitles is None and self.has_compact_subtitles():
+            return self.get_compact_subtitles().fully_synced
         return self.get_subtitles().fully_synced
 
     def publish(self):
@@ -1833,10 +2054,13 @@ class SubtitleVersion(models.Model):
         was_public = self.is_public()
         self.visibility = 'public'
         self.save()
+        cache.invalidate_parsed_subtitles(self)
         if not was_public and self.is_tip():
             self.subtitle_language.set_tip_cache('public', self)
         if self.is_for_primary_audio_language():
             self._set_video_data()
+        if not was_public:
+            signals.version_published.send(self)
 
     def _set_video_data(self):
         if self.title:
@@ -1859,6 +2083,7 @@ class SubtitleVersion(models.Model):
 
         self.visibility_override = 'deleted' if delete else 'private'
         self.save()
+        cache.invalidate_parsed_subtitles(self)
         if signal and was_tip:
             self.subtitle_language.clear_tip_cache()
             new_tip = version=self.subtitle_language.get_tip(public=True)
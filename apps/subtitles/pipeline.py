@@ -54,6 +54,8 @@ a nutshell:
 
 """
 
+import logging
+
 from django.db import transaction
 
 from videos.models import Video
@@ -65,6 +67,8 @@ from subtitles import signals
 from subtitles import workflows
 from teams.signals import api_subtitles_edited
 
+logger = logging.getLogger(__name__)
+
 # Utility Functions -----------------------------------------------------------
 def _strip_nones(d):
     """Strip all entries in a dictionary that have a value of None."""
@@ -277,6 +281,7 @@ def _update_visibility_and_tasks(team_video, version, committer, complete):
     # done here.  God help you if you have a team that has some existing tasks
     # and switches to "no tasks allowed".
     if not team.workflow_enabled:
+        _update_team_stats(team_video, version)
         return
 
     workflow = team.get_workflow()
@@ -293,6 +298,9 @@ def _update_visibility_and_tasks(team_video, version, committer, complete):
             version.visibility = 'private'
             version.save()
 
+    # Record the version before handling the outstanding tasks.  If that
+    # publishes the version, the version_published signal will count it.
+    _update_team_stats(team_video, version)
     _set_language_for_subtitle_tasks(team_video, version)
 
     # Okay, so now we have an appropriately-visibile version.  Next we see if
@@ -314,6 +322,11 @@ def _update_visibility_and_tasks(team_video, version, committer, complete):
             _create_necessary_tasks(version, team_video, workflow, committer,
                                     complete)
 
+def _update_team_stats(team_video, version):
+    """Update the team statistics rollups for a new version."""
+    from teams import statistics
+    statistics.record_version_added(team_video, version)
+
 def _update_followers(subtitle_language, author):
     """Update language followers when adding a new version."""
     if author:
@@ -406,6 +419,7 @@ def _add_subtitles(video, language_code, subtitles, title, description, author,
     _strip_nones(data)
 
     version = sl.add_version(subtitles=subtitles, **data)
+    _update_changes(version)
     _perform_team_operations(version, committer, action)
     if action:
         action.validate(author, video, sl, version)
@@ -425,6 +439,21 @@ def _add_subtitles(video, language_code, subtitles, title, description, author,
 
     return version
 
+def _update_changes(version):
+    """Store the change ratios for a new version.
+
+    Calculating these means parsing the subtitles for both the version and
+    its parent, so we do it once here rather than each time they're
+    displayed.
+    """
+    try:
+        version.update_change_fields()
+    except Exception:
+        # Don't fail the whole pipeline for this, get_changes() will
+        # calculate them when they're needed.
+        logger.warn("Error calculating changes for %s", version.pk,
+                    exc_info=True)
+
 def _rollback_to(video, language_code, version_number, rollback_author):
     sl = SubtitleLanguage.objects.get(video=video, language_code=language_code)
 
@@ -471,6 +500,7 @@ def _rollback_to(video, language_code, version_number, rollback_author):
     if current.subtitle_count != target.subtitle_count:
         _fork_dependents(version.subtitle_language)
 
+    video.cache.invalidate()
     api_subtitles_edited.send(version)
 
     return version
@@ -0,0 +1,132 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""subtitles.rendercache -- Cache subtitles rendered to output formats.
+
+SubtitleVersions don't change once they're written, so the output of
+babelsubs.to() for a given version/format/options never changes either.  We
+store it zipped in memcached.  Output that's too big for memcached can
+optionally be spilled to a directory on local disk.
+
+Settings:
+    RENDERED_SUBTITLES_MAX_SIZE -- max size of a compressed entry stored in
+        memcached.  Bigger entries go to the disk cache if it's enabled.
+    RENDERED_SUBTITLES_DISK_CACHE_DIR -- directory for the disk cache.  If
+        unset, entries that are too big for memcached aren't cached.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+import babelsubs
+
+from utils.metrics import Meter
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 60 * 60 * 24 * 5 # 5 days
+
+def _max_size():
+    return getattr(settings, 'RENDERED_SUBTITLES_MAX_SIZE', 900 * 1024)
+
+def _disk_cache_dir():
+    return getattr(settings, 'RENDERED_SUBTITLES_DISK_CACHE_DIR', None)
+
+def _cache_key(version, format, options):
+    option_str = '&'.join('%s=%s' % (k, options[k]) for k in sorted(options))
+    return 'rendered-subtitles-%s-%s-%s' % (
+        version.pk, format, hashlib.md5(option_str).hexdigest())
+
+def _disk_cache_path(key):
+    return os.path.join(_disk_cache_dir(), hashlib.sha1(key).hexdigest())
+
+def _read_disk_cache(key):
+    if not _disk_cache_dir():
+        return None
+    try:
+        with open(_disk_cache_path(key), 'rb') as f:
+            return f.read()
+    except IOError:
+        return None
+
+def _write_disk_cache(key, data):
+    directory = _disk_cache_dir()
+    try:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # write to a temp file, then rename it so that readers never see a
+        # partially written file.
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(temp_path, _disk_cache_path(key))
+    except (IOError, OSError):
+        logger.warn("Error writing rendered subtitles to %s", directory,
+                    exc_info=True)
+
+def _store(key, data):
+    if len(data) <= _max_size():
+        cache.set(key, data, TIMEOUT)
+    elif _disk_cache_dir():
+        _write_disk_cache(key, data)
+
+def _fetch(key):
+    data = cache.get(key)
+    if data is None:
+        data = _read_disk_cache(key)
+    return data
+
+def render(version, format, **options):
+    """Render a version's subtitles in a format, using the cache if we can.
+
+    options are passed to babelsubs.to() and are part of the cache key.
+    """
+    key = _cache_key(version, format, options)
+    data = _fetch(key)
+    if data is not None:
+        Meter('subtitles.render-cache.hit').inc()
+        return zlib.decompress(data)
+    Meter('subtitles.render-cache.miss').inc()
+    output = babelsubs.to(version.get_subtitles(), format, **options)
+    if isinstance(output, unicode):
+        output = output.encode('utf-8')
+    _store(key, zlib.compress(output))
+    return output
+
+def etag(version, format):
+    """Calculate the ETag for a version rendered in a format."""
+    return '"%s-%s-%s"' % (version.pk, format,
+                           version.created.strftime('%Y%m%d%H%M%S'))
+
+def etag_matches(etag, if_none_match):
+    """Check if an ETag matches an If-None-Match header.
+
+    This uses the weak comparison, so W/"..." validators match too.
+    """
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag or tag == '*':
+            return True
+    return False
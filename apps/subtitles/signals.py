@@ -21,3 +21,8 @@ from django import dispatch
 
 language_deleted = dispatch.Signal()
 subtitles_published = dispatch.Signal(providing_args=['version'])
+# sent by SubtitleVersion.publish() when a private version is made public
+version_published = dispatch.Signal()
+# sent by SubtitleLanguage.save() when subtitles_complete changes for an
+# existing language
+subtitles_complete_changed = dispatch.Signal()
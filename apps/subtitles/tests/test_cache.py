@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from subtitles import pipeline
+from subtitles.models import SubtitleVersion
+from utils.factories import *
+
+class ParsedSubtitlesCacheTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+
+    def test_cache_is_shared_between_instances(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (100, 200, 'one'),
+        ])
+        SubtitleVersion.objects.get(pk=version.pk).get_subtitles()
+        with mock.patch('subtitles.models.load_from') as mock_load_from:
+            with mock.patch('subtitles.compact.CompactSubtitles.'
+                            'to_subtitle_set') as mock_to_subtitle_set:
+                subtitles = (SubtitleVersion.objects.get(pk=version.pk)
+                             .get_subtitles())
+        assert_false(mock_load_from.called)
+        assert_false(mock_to_subtitle_set.called)
+        assert_equal(len(subtitles), 1)
+
+    def test_returns_copies(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (100, 200, 'one'),
+        ])
+        subtitles = SubtitleVersion.objects.get(pk=version.pk).get_subtitles()
+        subtitles.append_subtitle(300, 400, 'two')
+        assert_equal(
+            len(SubtitleVersion.objects.get(pk=version.pk).get_subtitles()), 1)
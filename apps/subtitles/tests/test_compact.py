@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.core.management import call_command
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from babelsubs.storage import SubtitleSet
+
+from subtitles import compact, pipeline
+from subtitles.models import SubtitleVersion
+from utils.compress import compress
+from utils.factories import *
+
+class CompactFormatTest(TestCase):
+    def make_subtitles(self):
+        subtitles = SubtitleSet('en')
+        subtitles.append_subtitle(0, 1000, 'first')
+        subtitles.append_subtitle(1000, 2500, u'sëcond & <b>bold</b>',
+                                  escape=False)
+        subtitles.append_subtitle(None, None, 'first')
+        subtitles.append_subtitle(3000, 4000, 'new paragraph',
+                                  new_paragraph=True)
+        return subtitles
+
+    def test_round_trip(self):
+        subtitles = self.make_subtitles()
+        serialized = compact.dumps(subtitles)
+        assert_true(compact.is_compact(serialized))
+        reader = compact.loads(serialized)
+        assert_equal(len(reader), 4)
+        assert_equal(reader.get_times(), [
+            (0, 1000), (1000, 2500), (None, None), (3000, 4000),
+        ])
+        rebuilt = reader.to_subtitle_set('en')
+        assert_equal(rebuilt.to_xml(), subtitles.to_xml())
+
+    def test_string_table_dedupes(self):
+        payload = compact.pack(self.make_subtitles())
+        version, count, string_count = compact.HEADER.unpack_from(payload)
+        assert_equal(count, 4)
+        assert_equal(string_count, 3)
+
+    def test_time_bounds(self):
+        reader = compact.loads(compact.dumps(self.make_subtitles()))
+        assert_equal(reader.time_bounds(), (0, 4000))
+        assert_false(reader.fully_synced)
+        assert_equal(compact.time_bounds([]), None)
+        assert_equal(compact.time_bounds([(None, None)]), None)
+
+    def test_unknown_version(self):
+        payload = compact.HEADER.pack(compact.FORMAT_VERSION + 1, 0, 0)
+        assert_raises(compact.CompactFormatError, compact.CompactSubtitles,
+                      payload)
+
+class CompactStorageTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+
+    def test_new_versions_use_compact_format(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (100, 200, 'one'), (300, 400, 'two'),
+        ])
+        version = SubtitleVersion.objects.get(pk=version.pk)
+        assert_true(version.has_compact_subtitles())
+        assert_equal(version.get_subtitle_count(), 2)
+        assert_equal(version.get_time_bounds(), (100, 400))
+        assert_equal([item.text for item in
+                      version.get_subtitles().subtitle_items()],
+                     ['one', 'two'])
+
+    def test_migrate_legacy_rows(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (100, 200, 'one'), (300, 400, 'two'),
+        ])
+        subtitles = version.get_subtitles()
+        SubtitleVersion.objects.filter(pk=version.pk).update(
+            serialized_subtitles=compress(subtitles.to_xml()))
+        legacy = SubtitleVersion.objects.get(pk=version.pk)
+        assert_false(legacy.has_compact_subtitles())
+        assert_equal(legacy.get_time_bounds(), (100, 400))
+
+        call_command('migrate_subtitle_storage', sleep=0, verbosity=0)
+        migrated = SubtitleVersion.objects.get(pk=version.pk)
+        assert_true(migrated.has_compact_subtitles())
+        assert_equal(migrated.get_subtitles().to_xml(), subtitles.to_xml())
+
+    def test_migrate_skips_lossy_rows(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (100, 200, 'one'), (300, 400, 'two'),
+        ])
+        subtitles = version.get_subtitles()
+        SubtitleVersion.objects.filter(pk=version.pk).update(
+            serialized_subtitles=compress(subtitles.to_xml()))
+        # Simulate DFXP data that the compact format can't represent
+        lossy_subtitles = SubtitleSet('en')
+        lossy_subtitles.append_subtitle(100, 200, 'one')
+        with mock.patch('subtitles.compact.CompactSubtitles.'
+                        'to_subtitle_set') as mock_to_subtitle_set:
+            mock_to_subtitle_set.return_value = lossy_subtitles
+            call_command('migrate_subtitle_storage', sleep=0, verbosity=0)
+        legacy = SubtitleVersion.objects.get(pk=version.pk)
+        assert_false(legacy.has_compact_subtitles())
+        assert_equal(legacy.get_subtitles().to_xml(), subtitles.to_xml())
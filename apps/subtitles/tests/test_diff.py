@@ -0,0 +1,123 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.core.cache import cache
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from babelsubs.storage import SubtitleSet
+
+from subtitles import diff, pipeline
+from utils.factories import *
+
+class AlignTest(TestCase):
+    def test_same(self):
+        assert_equal(diff.align(['a', 'b', 'c'], ['a', 'b', 'c']),
+                     [(0, 0), (1, 1), (2, 2)])
+
+    def test_insert(self):
+        # inserting a line shouldn't mark the lines after it as changed
+        assert_equal(diff.align(['a', 'b', 'c', 'd'],
+                                ['a', 'new', 'b', 'c', 'd']),
+                     [(0, 0), (None, 1), (1, 2), (2, 3), (3, 4)])
+
+    def test_delete(self):
+        assert_equal(diff.align(['a', 'b', 'c', 'd'], ['a', 'c', 'd']),
+                     [(0, 0), (1, None), (2, 1), (3, 2)])
+
+    def test_edit(self):
+        # edited lines get paired up by position
+        assert_equal(diff.align(['a', 'b', 'c', 'd'],
+                                ['a', 'B', 'C', 'd']),
+                     [(0, 0), (1, 1), (2, 2), (3, 3)])
+
+    def test_anchors(self):
+        assert_equal(diff.align(['x', 'a', 'y', 'b', 'z'],
+                                ['X', 'a', 'Y', 'new', 'b', 'Z']),
+                     [(0, 0), (1, 1), (2, 2), (None, 3), (3, 4), (4, 5)])
+
+    def test_moved_line(self):
+        # "c" moved to the start, only 1 of the 2 positions can be used as
+        # an anchor
+        assert_equal(diff.align(['a', 'b', 'c'], ['c', 'a', 'b']),
+                     [(None, 0), (0, 1), (1, 2), (2, None)])
+
+    def test_empty(self):
+        assert_equal(diff.align([], []), [])
+        assert_equal(diff.align(['a'], []), [(0, None)])
+        assert_equal(diff.align([], ['a']), [(None, 0)])
+
+    def test_long_transcript(self):
+        texts1 = ['line %s' % i for i in xrange(5000)]
+        texts2 = texts1[:10] + ['new'] + texts1[10:]
+        pairs = diff.align(texts1, texts2)
+        assert_equal(len(pairs), 5001)
+        assert_equal(pairs[10], (None, 10))
+        assert_equal(pairs[-1], (4999, 5000))
+
+class DiffVersionsTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        cache.clear()
+
+    def make_version(self, *lines):
+        subtitles = SubtitleSet('en')
+        for start, end, text in lines:
+            subtitles.append_subtitle(start, end, text)
+        return pipeline.add_subtitles(self.video, 'en', subtitles)
+
+    def test_diff(self):
+        v1 = self.make_version((0, 1000, 'a'), (1000, 2000, 'b'))
+        v2 = self.make_version((0, 1000, 'a'), (1000, 1500, 'new'),
+                               (1500, 2000, 'b'))
+        result = diff.diff_versions(v2, v1)
+        assert_equal(result['changed'], True)
+        assert_equal(len(result['subtitle_data']), 3)
+        assert_equal(
+            [(d['text_changed'], d['time_changed'])
+             for d in result['subtitle_data']],
+            [(False, False), (True, True), (False, True)])
+        inserted = result['subtitle_data'][1]['subtitles']
+        assert_equal(inserted[0]['text'], 'new')
+        assert_equal(inserted[1], diff.EMPTY_SUBTITLE)
+        assert_almost_equal(result['text_changed'], 1.0 / 3)
+        assert_almost_equal(result['time_changed'], 2.0 / 3)
+
+    def test_cache(self):
+        v1 = self.make_version((0, 1000, 'a'))
+        v2 = self.make_version((0, 1000, 'b'))
+        result = diff.diff_versions(v2, v1)
+        with mock.patch.object(diff, 'subtitle_dicts') as mock_dicts:
+            assert_equal(diff.diff_versions(v2, v1), result)
+            assert_equal(mock_dicts.call_count, 0)
+
+    def test_find_neighbors(self):
+        versions = [self.make_version((0, 1000, str(i))) for i in xrange(4)]
+        language = versions[0].subtitle_language
+        versions[2].visibility_override = 'deleted'
+        versions[2].save()
+        with self.assertNumQueries(1):
+            neighbors = diff.find_neighbors(language,
+                                            [versions[1], versions[3]])
+        assert_equal(neighbors, {
+            versions[1].pk: (versions[0].pk, versions[3].pk),
+            versions[3].pk: (versions[1].pk, None),
+        })
@@ -22,9 +22,11 @@
 from __future__ import absolute_import 
 
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.test import TestCase
 from nose.tools import *
+import mock
 
 from babelsubs.storage import SubtitleSet
 
@@ -499,6 +501,42 @@ class TestSubtitleVersion(TestCase):
         self.assertAlmostEqual(1/3.0, sv3.get_changes()[0])
         self.assertEquals(1.0, sv3.get_changes()[1])
 
+    def test_changes_stored(self):
+        from subtitles.pipeline import add_subtitles
+
+        sv1 = add_subtitles(self.video, 'en', [(0, 1000, 'Hello there')])
+        sv2 = add_subtitles(self.video, 'en', [(0, 1000, 'Hello there.')])
+        sv1, sv2 = refresh(sv1), refresh(sv2)
+        self.assertEquals((sv1.time_change_ratio, sv1.text_change_ratio),
+                          (1.0, 1.0))
+        self.assertEquals((sv2.time_change_ratio, sv2.text_change_ratio),
+                          (0.0, 1.0))
+        # get_changes() should use the stored values rather than parsing
+        # the subtitles
+        sv2.time_change_ratio, sv2.text_change_ratio = (0.25, 0.75)
+        with mock.patch.object(SubtitleVersion, 'calc_changes') as calc:
+            self.assertEquals(sv2.get_changes(), (0.25, 0.75))
+        self.assertEquals(calc.call_count, 0)
+
+    def test_backfill_changes(self):
+        from subtitles.pipeline import add_subtitles
+
+        add_subtitles(self.video, 'en', [(0, 1000, 'Hello there')])
+        sv2 = add_subtitles(self.video, 'en', [
+            (0, 1000, 'Hello there'),
+            (2000, 3000, 'How are you?'),
+        ])
+        SubtitleVersion.objects.full().update(time_change_ratio=None,
+                                              text_change_ratio=None)
+        missing_changes = lambda: (SubtitleVersion.objects.extant()
+                                   .missing_changes())
+        self.assertEquals(missing_changes().count(), 2)
+        call_command('backfill_subtitle_changes', batch_size=1, verbosity=0)
+        self.assertEquals(missing_changes().count(), 0)
+        sv2 = refresh(sv2)
+        self.assertAlmostEqual(sv2.time_change_ratio, 1/3.0)
+        self.assertAlmostEqual(sv2.text_change_ratio, 1/3.0)
+
     def test_subtitle_count(self):
         s0 = (100, 200, "a")
         s1 = (300, 400, "b")
@@ -2263,3 +2301,46 @@ class TestSubtitleMetadata(TestCase):
 
         self.assertEqual(version.get_approved_by(), None,
             "Versions should not inherit approved_by metadata.")
+
+class DurationFieldsTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+
+    def test_set_on_new_versions(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (100, 200, 'one'), (None, None, 'unsynced'), (300, 1100, 'two'),
+        ])
+        version = SubtitleVersion.objects.get(pk=version.pk)
+        assert_equal(version.start_ms, 100)
+        assert_equal(version.end_ms, 1100)
+        assert_equal(version.duration_ms, 1000)
+
+    def test_no_synced_subtitles(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (None, None, 'unsynced'),
+        ])
+        version = SubtitleVersion.objects.get(pk=version.pk)
+        assert_equal(version.duration_ms, 0)
+        assert_equal(version.get_time_bounds(), None)
+
+    def test_aggregate_minutes(self):
+        pipeline.add_subtitles(self.video, 'en', [(0, 60000, 'one')])
+        pipeline.add_subtitles(self.video, 'fr', [(0, 30000, 'un')])
+        versions = SubtitleVersion.objects.full().filter(video=self.video)
+        assert_equal(versions.minutes_by('language_code'), {
+            'en': 1.0,
+            'fr': 0.5,
+        })
+
+    def test_backfill(self):
+        version = pipeline.add_subtitles(self.video, 'en', [
+            (100, 200, 'one'), (300, 400, 'two'),
+        ])
+        SubtitleVersion.objects.filter(pk=version.pk).update(
+            start_ms=None, end_ms=None, duration_ms=None)
+        assert_equal(SubtitleVersion.objects.full().missing_durations().count(), 1)
+        call_command('backfill_subtitle_durations', batch_size=1,
+                     verbosity=0)
+        version = SubtitleVersion.objects.get(pk=version.pk)
+        assert_equal((version.start_ms, version.end_ms, version.duration_ms),
+                     (100, 400, 300))
@@ -28,7 +28,8 @@ from messages.forms import TeamAdminPageMessageForm
 from teams.models import (
     Team, TeamMember, TeamVideo, Workflow, Task, Setting, MembershipNarrowing,
     Project, TeamLanguagePreference, TeamNotificationSetting, BillingReport,
-    Partner, Application, ApplicationInvalidException, Invite, BillingRecord
+    Partner, Application, ApplicationInvalidException, Invite, BillingRecord,
+    TeamVideoMoveJob,
 )
 from utils.text import fmt
 from videos.models import SubtitleLanguage
@@ -292,6 +293,18 @@ class BillingRecordAdmin(admin.ModelAdmin):
     )
 
 
+class TeamVideoMoveJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'to_team', 'to_project', 'user', 'started',
+                    'updated', 'progress')
+    raw_id_fields = ('to_team', 'to_project', 'user')
+    readonly_fields = ('total', 'processed', 'started', 'updated', 'finished')
+    ordering = ('-started',)
+
+    def progress(self, obj):
+        return obj.progress_display()
+    progress.short_description = _('Progress')
+
+
 admin.site.register(TeamMember, TeamMemberAdmin)
 admin.site.register(Team, TeamAdmin)
 admin.site.register(TeamVideo, TeamVideoAdmin)
@@ -307,3 +320,4 @@ admin.site.register(Partner)
 admin.site.register(Invite, InviteAdmin)
 admin.site.register(Application, ApplicationAdmin)
 admin.site.register(BillingRecord, BillingRecordAdmin)
+admin.site.register(TeamVideoMoveJob, TeamVideoMoveJobAdmin)
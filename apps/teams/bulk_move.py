@@ -0,0 +1,211 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""teams.bulk_move -- move many TeamVideos to another team
+
+TeamVideo.move_to() moves one video at a time, and each move runs a dozen
+queries, a couple celery tasks and signal handlers.  That's fine for the API,
+but moving thousands of videos from the move videos page would take hours.
+For that we do the work in batches:
+
+    - start() creates a TeamVideoMoveJob and schedules the first batch.
+    - run_batch() moves BULK_MOVE_BATCH_SIZE videos using a few UPDATE
+      queries and a bulk insert for the TeamVideoMigration rows.  Then it
+      stores the progress in the TeamVideoMoveJob and schedules the next
+      batch.
+    - For each batch we also schedule a single update_moved_team_videos
+      task.  That task updates the metadata and search indexes, creates any
+      new tasks and sends the notifications that move_to() would have.
+
+Admins can follow the progress of a job on its TeamVideoMoveJob.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from subtitles.models import SubtitleVersion
+from teams.models import (TeamVideo, TeamVideoMigration, TeamVideoMoveJob,
+                          Task, autocreate_tasks)
+from teams.signals import api_teamvideo_new, video_moved_from_team_to_team
+from utils.celery_search_index import queue_update
+from utils.metrics import Meter
+from videos import metadata_manager
+from videos.models import Video
+from widget import video_cache
+
+logger = logging.getLogger(__name__)
+
+def batch_size():
+    return getattr(settings, 'BULK_MOVE_BATCH_SIZE', 100)
+
+def now():
+    return TeamVideoMigration.now()
+
+def start(team_video_ids, new_team, project=None, user=None):
+    """Start moving TeamVideos to a new team/project.
+
+    This method expects you to have run the correct permissions checks.
+
+    Returns: TeamVideoMoveJob that tracks the move
+    """
+    from teams.tasks import move_team_videos_batch
+    if project is None:
+        project = new_team.default_project
+    job = TeamVideoMoveJob.objects.create(
+        to_team=new_team, to_project=project, user=user,
+        team_video_ids=json.dumps(list(team_video_ids)),
+        total=len(team_video_ids))
+    move_team_videos_batch.delay(job.id, 0)
+    return job
+
+def move_batch(team_video_ids, new_team, project):
+    """Move a batch of TeamVideos.
+
+    This does the DB work of TeamVideo.move_to() for all of the videos at
+    once.
+
+    Returns: (moved_ids, reprojected_ids) tuple.  moved_ids lists the
+        TeamVideos that moved to a new team.  reprojected_ids lists the
+        TeamVideos that stayed in the team, but moved to a new project.
+    """
+    team_videos = list(TeamVideo.objects
+                       .filter(id__in=team_video_ids)
+                       .values_list('id', 'video_id', 'team_id',
+                                    'project_id'))
+    within_team = [
+        (tv_id, video_id)
+        for tv_id, video_id, team_id, project_id in team_videos
+        if team_id == new_team.id and project_id != project.id
+    ]
+    other_team = [
+        (tv_id, video_id, team_id)
+        for tv_id, video_id, team_id, project_id in team_videos
+        if team_id != new_team.id
+    ]
+    if within_team:
+        TeamVideo.objects.filter(
+            id__in=[tv_id for tv_id, video_id in within_team]
+        ).update(project=project)
+
+    if other_team:
+        tv_ids = [tv_id for tv_id, video_id, team_id in other_team]
+        video_ids = [video_id for tv_id, video_id, team_id in other_team]
+        # For now, we'll just delete any tasks associated with the moved
+        # videos.
+        Task.objects.filter(team_video__id__in=tv_ids).update(deleted=True)
+        TeamVideo.objects.filter(id__in=tv_ids).update(team=new_team,
+                                                       project=project)
+        # We need to make any as-yet-unmoderated versions public.
+        (SubtitleVersion.objects.extant()
+         .filter(video__id__in=video_ids)
+         .update(visibility='public'))
+        moderated_by = new_team if new_team.moderates_videos() else None
+        Video.objects.filter(id__in=video_ids).update(
+            is_public=new_team.is_visible, moderated_by=moderated_by)
+        migration_time = now()
+        TeamVideoMigration.objects.bulk_create([
+            TeamVideoMigration(from_team_id=team_id, to_team=new_team,
+                               to_project=project, datetime=migration_time)
+            for tv_id, video_id, team_id in other_team
+        ])
+
+    for tv_id, video_id in within_team:
+        Video.cache.invalidate_by_pk(video_id)
+    for tv_id, video_id, team_id in other_team:
+        Video.cache.invalidate_by_pk(video_id)
+    return ([tv_id for tv_id, video_id, team_id in other_team],
+            [tv_id for tv_id, video_id in within_team])
+
+def run_batch(job_id, position):
+    """Move the next batch of videos for a TeamVideoMoveJob.
+
+    Args:
+        job_id: id of the TeamVideoMoveJob
+        position: index of the first TeamVideo id to move
+
+    Returns: position for the next batch, or None if we're done
+    """
+    from teams.tasks import update_moved_team_videos
+    try:
+        job = TeamVideoMoveJob.objects.get(id=job_id)
+    except TeamVideoMoveJob.DoesNotExist:
+        return None
+    if job.processed != position or job.finished is not None:
+        # Another task already did this batch
+        return None
+    team_video_ids = job.get_team_video_ids()[position:
+                                              position + batch_size()]
+    next_position = position + len(team_video_ids)
+    current_time = now()
+    updates = {
+        'processed': next_position,
+        'updated': current_time,
+    }
+    finished = next_position >= job.total
+    if finished:
+        updates['finished'] = current_time
+
+    with transaction.commit_on_success():
+        # Claim the batch before doing the work, so that if 2 tasks try to
+        # run it, only 1 will.
+        claimed = (TeamVideoMoveJob.objects
+                   .filter(id=job.id, processed=position)
+                   .update(**updates))
+        if not claimed:
+            return None
+        moved_ids, reprojected_ids = move_batch(team_video_ids, job.to_team,
+                                                job.to_project)
+    Meter('teams.bulk-move.videos-moved').inc(len(moved_ids))
+
+    # Dispatch the followup work now that the transaction is committed
+    if moved_ids:
+        update_moved_team_videos.delay(moved_ids)
+    # Videos that only changed projects just need a reindex, since
+    # TeamVideoIndex stores the project
+    for tv_id in reprojected_ids:
+        queue_update(TeamVideo, tv_id)
+    logger.info("bulk move %s: %s/%s videos handled%s", job.id,
+                next_position, job.total, " [finished]" if finished else "")
+    if finished:
+        return None
+    return next_position
+
+def update_moved_team_videos(team_video_ids):
+    """Handle the followup work for a batch of moved TeamVideos.
+
+    This is the non-DB part of TeamVideo.move_to(): updating metadata,
+    search indexes and caches, creating tasks for the new team and sending
+    notifications.
+    """
+    team_videos = list(TeamVideo.objects
+                       .filter(id__in=team_video_ids)
+                       .select_related('team', 'video'))
+    metadata_manager.update_metadata_for_videos(
+        [tv.video_id for tv in team_videos])
+    for team_video in team_videos:
+        queue_update(TeamVideo, team_video.pk)
+        team_video.video.update_search_index()
+        video_cache.invalidate_cache(team_video.video.video_id)
+        autocreate_tasks(team_video)
+        api_teamvideo_new.send(team_video)
+        video_moved_from_team_to_team.send(sender=team_video,
+                                           destination_team=team_video.team,
+                                           video=team_video.video)
@@ -0,0 +1,47 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import logging
+
+from teams import statistics
+from teams.models import Team
+from utils.commands import ErrorHandlingCommand
+
+logger = logging.getLogger(__name__)
+
+class Command(ErrorHandlingCommand):
+    args = '[team-slug ...]'
+    help = ('Recalculate the statistics rollups for teams from scratch.  '
+            'By default all teams are rebuilt.')
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        teams = Team.objects.all().order_by('id')
+        if args:
+            teams = teams.filter(slug__in=args)
+        team_ids = list(teams.values_list('id', flat=True))
+        for i, team_id in enumerate(team_ids):
+            team = Team.objects.get(id=team_id)
+            try:
+                statistics.rebuild(team)
+            except Exception:
+                logger.error("Error rebuilding stats for %s", team.slug,
+                             exc_info=True)
+                continue
+            self.print_to_console('%s/%s: rebuilt stats for %s' %
+                                  (i + 1, len(team_ids), team.slug))
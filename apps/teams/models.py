@@ -20,6 +20,7 @@ from itertools import groupby
 from math import ceil
 import csv
 import datetime
+import json
 import logging
 
 from django.conf import settings
@@ -28,8 +29,8 @@ from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.core.files import File
-from django.db import models
-from django.db.models import query, Q
+from django.db import models, transaction, IntegrityError
+from django.db.models import query, Q, F
 from django.db.models.signals import post_save, post_delete, pre_delete
 from django.http import Http404
 from django.template.loader import render_to_string
@@ -69,6 +70,7 @@ from subtitles.models import (
     ORIGIN_IMPORTED
 )
 from subtitles import pipeline
+from teams import notification_delivery
 
 from functools import partial
 
@@ -296,6 +298,8 @@ class Team(models.Model):
     def __init__(self, *args, **kwargs):
         models.Model.__init__(self, *args, **kwargs)
         self._member_cache = {}
+        # maps user ids to teams.permissions.PermissionContext objects
+        self._permission_context_cache = {}
 
     def save(self, *args, **kwargs):
         creating = self.pk is None
@@ -470,10 +474,8 @@ class Team(models.Model):
         return user.id in members
 
     def uncache_member(self, user):
-        try:
-            del self._member_cache[user.id]
-        except KeyError:
-            pass
+        self._member_cache.pop(user.id, None)
+        self._permission_context_cache.pop(user.id, None)
 
     def user_can_view_videos(self, user):
         return self.is_visible or self.user_is_member(user)
@@ -1127,6 +1129,35 @@ class TeamVideoMigration(models.Model):
         # Make now a function so we can patch it in the unittests
         return datetime.datetime.now()
 
+class TeamVideoMoveJob(models.Model):
+    """Tracks a bulk move of TeamVideos to a new team/project.
+
+    See teams.bulk_move for how the videos get moved.
+    """
+    to_team = models.ForeignKey(Team, related_name='+')
+    to_project = models.ForeignKey(Project, related_name='+')
+    user = models.ForeignKey(User, blank=True, null=True, related_name='+')
+    # JSON-encoded list of TeamVideo ids to move
+    team_video_ids = models.TextField()
+    total = models.PositiveIntegerField()
+    # number of TeamVideo ids that we've handled so far
+    processed = models.PositiveIntegerField(default=0)
+    started = models.DateTimeField(default=datetime.datetime.now)
+    updated = models.DateTimeField(default=datetime.datetime.now)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    def __unicode__(self):
+        return u'Move %s videos to %s (%s)' % (self.total, self.to_team,
+                                              self.progress_display())
+
+    def get_team_video_ids(self):
+        return json.loads(self.team_video_ids)
+
+    def progress_display(self):
+        if self.finished is not None:
+            return u'finished'
+        return u'%s/%s' % (self.processed, self.total)
+
 def _create_translation_tasks(team_video, subtitle_version=None):
     """Create any translation tasks that should be autocreated for this video.
 
@@ -2893,21 +2924,161 @@ class TeamNotificationSetting(models.Model):
                 event_name,  **kwargs)
 
         if self.request_url:
-            success, content = notification.send_http_request(
-                self.request_url,
-                self.basic_auth_username,
-                self.basic_auth_password
-            )
-            return success, content
+            if not notification_delivery.uses_outbox(notification):
+                # The notification class sends its requests its own way, so
+                # we can't queue them up.
+                success, content = notification.send_http_request(
+                    self.request_url,
+                    self.basic_auth_username,
+                    self.basic_auth_password
+                )
+                return success, content
+            return notification_delivery.enqueue(self, notification)
         # FIXME: spec and test this, for now just return
         return
 
+    def get_metric_name(self):
+        """Name to use for this setting in metrics."""
+        if self.partner:
+            return 'partner.%s' % self.partner.slug
+        return 'team.%s' % self.team.slug
+
     def __unicode__(self):
         if self.partner:
             return u'NotificationSettings for partner %s' % self.partner
         return u'NotificationSettings for team %s' % self.team
 
 
+class TeamNotificationDeliveryManager(models.Manager):
+    def pending(self):
+        return self.filter(status=TeamNotificationDelivery.STATUS_PENDING)
+
+    def due(self, setting, now=None):
+        """Get pending deliveries for a setting that are ready to be sent."""
+        if now is None:
+            now = datetime.datetime.now()
+        return (self.pending()
+                .filter(setting=setting, next_attempt__lte=now)
+                .order_by('next_attempt', 'id'))
+
+class TeamNotificationDelivery(models.Model):
+    """Outbox entry for an HTTP notification to a team/partner.
+
+    Notifications get stored here, then a celery task POSTs them to the
+    setting's request_url.  Keeping them in the DB means we don't lose them
+    if the partner's server is down, and lets us measure queue depth and
+    latency for each partner.
+
+    See teams.notification_delivery for the code that handles these.
+    """
+    STATUS_PENDING = 'P'
+    STATUS_SENT = 'S'
+    STATUS_FAILED = 'F'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    setting = models.ForeignKey(TeamNotificationSetting,
+                                related_name='deliveries')
+    event_name = models.CharField(max_length=50)
+    # JSON-encoded payload
+    data = models.TextField()
+    # Duplicate notifications have the same coalesce_key.  We only send one
+    # of them if they happen close together.
+    coalesce_key = models.CharField(max_length=40, db_index=True)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES,
+                              default=STATUS_PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # number of duplicate notifications merged into this one
+    coalesced = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=datetime.datetime.now)
+    next_attempt = models.DateTimeField(default=datetime.datetime.now,
+                                        db_index=True)
+    sent = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    objects = TeamNotificationDeliveryManager()
+
+    def __unicode__(self):
+        return u'%s notification for %s' % (self.event_name, self.setting)
+
+    def get_payload(self):
+        return json.loads(self.data)
+
+class TeamStatsManager(models.Manager):
+    def increment(self, keys, **counts):
+        """Add to the counters for a row, creating it if needed.
+
+        Args:
+            keys: dict of field values that identify the row
+            counts: amount to add to each counter field
+        """
+        updates = dict((name, F(name) + value)
+                       for name, value in counts.items())
+        if self.filter(**keys).update(**updates):
+            return
+        values = dict(keys)
+        values.update(counts)
+        sid = transaction.savepoint()
+        try:
+            self.create(**values)
+        except IntegrityError:
+            # Another process created the row after our update() call
+            transaction.savepoint_rollback(sid)
+            self.filter(**keys).update(**updates)
+        else:
+            transaction.savepoint_commit(sid)
+
+class TeamLanguageStats(models.Model):
+    """Per-team, per-language, per-day counters for the statistics tabs.
+
+    These are updated as subtitles get added and members join/leave (see
+    teams.statistics).  They can be recalculated from scratch with the
+    rebuild_team_stats command.
+    """
+    team = models.ForeignKey(Team, related_name='language_stats')
+    language_code = models.CharField(max_length=16,
+                                     choices=translation.ALL_LANGUAGE_CHOICES)
+    date = models.DateField()
+    # languages of team videos whose first version was added on this day
+    languages_added = models.IntegerField(default=0)
+    # languages from languages_added that are currently complete
+    languages_published = models.IntegerField(default=0)
+    # current members who joined on this day and speak the language
+    members_joined = models.IntegerField(default=0)
+
+    objects = TeamStatsManager()
+
+    class Meta:
+        unique_together = ('team', 'language_code', 'date')
+
+    def __unicode__(self):
+        return u'%s stats for %s (%s)' % (self.team, self.language_code,
+                                          self.date)
+
+class TeamContributorStats(models.Model):
+    """Per-team, per-user, per-day count of languages contributed to.
+
+    This is used for the top contributors graphs.  Each (user, language) pair
+    is counted once, on the day of the user's first public version for the
+    language.  Like TeamLanguageStats it's updated incrementally and can be
+    rebuilt with rebuild_team_stats.
+    """
+    team = models.ForeignKey(Team, related_name='contributor_stats')
+    user = models.ForeignKey(User, related_name='team_contributor_stats')
+    date = models.DateField()
+    languages = models.IntegerField(default=0)
+
+    objects = TeamStatsManager()
+
+    class Meta:
+        unique_together = ('team', 'user', 'date')
+
+    def __unicode__(self):
+        return u'%s stats for %s (%s)' % (self.team, self.user, self.date)
+
 class BillingReport(models.Model):
     # use BillingRecords to signify completed work
     TYPE_BILLING_RECORD = 2
@@ -2948,8 +3119,77 @@ class BillingReport(models.Model):
     def _report_date(self, datetime):
         return datetime.strftime('%Y-%m-%d %H:%M:%S')
 
-    def generate_rows_type_approval(self):
-        header = (
+    # Number of approve tasks to process per batch of queries
+    APPROVAL_CHUNK_SIZE = 500
+
+    def _iter_approval_data(self):
+        """Iterate through data for the approval reports
+
+        This method fetches approved tasks in chunks and for each chunk it
+        fetches the related subtitle/translate and review tasks in bulk.
+
+        Yields (approve_task, version, subtitle_task, review_task, minutes)
+        tuples.  subtitle_task and review_task may be None if there wasn't
+        one.
+        """
+        task_ids = list(self._get_approved_tasks()
+                        .order_by('id').values_list('id', flat=True))
+        for i in xrange(0, len(task_ids), self.APPROVAL_CHUNK_SIZE):
+            approve_tasks = list(
+                Task.objects.filter(
+                    id__in=task_ids[i:i+self.APPROVAL_CHUNK_SIZE])
+                .select_related('team', 'team_video__video',
+                                'team_video__project', 'assignee',
+                                'new_subtitle_version')
+                .order_by('id'))
+            subtitle_tasks = self._latest_tasks_by_language(
+                Task.objects.complete_subtitle_or_translate(), approve_tasks)
+            review_tasks = self._latest_tasks_by_language(
+                Task.objects.complete_review(), approve_tasks)
+            versions = [approve_task.get_subtitle_version()
+                        for approve_task in approve_tasks]
+            minutes = self._minutes_for_versions(versions)
+            for approve_task, version in zip(approve_tasks, versions):
+                key = (approve_task.team_video_id, approve_task.language)
+                yield (approve_task, version, subtitle_tasks.get(key),
+                       review_tasks.get(key), minutes[version.pk])
+
+    def _latest_tasks_by_language(self, qs, approve_tasks):
+        """Find the latest task for each team video/language in a list of
+        approve tasks.
+
+        Returns a dict mapping (team_video_id, language) to tasks.
+        """
+        qs = (qs.filter(team_video__in=set(t.team_video_id
+                                           for t in approve_tasks),
+                        language__in=set(t.language for t in approve_tasks))
+              .select_related('assignee')
+              .order_by('completed'))
+        # later tasks overwrite earlier ones, so we end up with the most
+        # recently completed task for each key.
+        return dict(((task.team_video_id, task.language), task)
+                    for task in qs)
+
+    def _minutes_for_versions(self, versions):
+        """Get the minutes for a list of versions
+
+        This sums the stored durations with a single aggregate query.
+        Versions that haven't had their durations backfilled are calculated
+        one-by-one.
+
+        Returns a dict mapping version ids to minutes.
+        """
+        minutes = (NewSubtitleVersion.objects.full()
+                   .filter(id__in=[v.pk for v in versions],
+                           duration_ms__isnull=False)
+                   .minutes_by('id'))
+        for version in versions:
+            if version.pk not in minutes:
+                minutes[version.pk] = get_minutes_for_version(version, False)
+        return minutes
+
+    def iter_rows_type_approval(self):
+        yield (
             'Team',
             'Video Title',
             'Video ID',
@@ -2961,31 +3201,29 @@ class BillingReport(models.Model):
             'Approver',
             'Date',
         )
-        rows = [header]
-        for approve_task in self._get_approved_tasks():
-            video = approve_task.team_video.video
-            project = approve_task.team_video.project.name if approve_task.team_video.project else 'none'
-            version = approve_task.new_subtitle_version
-            language = version.subtitle_language
-            subtitle_task = (Task.objects.complete_subtitle_or_translate()
-                             .filter(team_video=approve_task.team_video,
-                                     language=approve_task.language)
-                             .order_by('-completed'))[0]
-            rows.append((
+        for (approve_task, version, subtitle_task, review_task,
+             minutes) in self._iter_approval_data():
+            team_video = approve_task.team_video
+            video = team_video.video
+            project = team_video.project.name if team_video.project else 'none'
+            yield (
                 approve_task.team.name,
                 video.title_display(),
                 video.video_id,
                 project,
                 approve_task.language,
-                get_minutes_for_version(version, False),
-                language.is_primary_audio_language(),
-                subtitle_task.type==Task.TYPE_IDS['Translate'],
+                minutes,
+                version.language_code == video.primary_audio_language_code,
+                (subtitle_task is not None and
+                 subtitle_task.type==Task.TYPE_IDS['Translate']),
                 unicode(approve_task.assignee),
                 self._report_date(approve_task.completed),
-            ))
-        return rows
+            )
 
-    def generate_rows_type_approval_for_users(self):
+    def generate_rows_type_approval(self):
+        return list(self.iter_rows_type_approval())
+
+    def iter_rows_type_approval_for_users(self):
         header = (
             'User',
             'Task Type',
@@ -3001,31 +3239,25 @@ class BillingReport(models.Model):
             'Date',
             'Pay Rate',
         )
+        # The rows are sorted by user, so we can't stream them as we generate
+        # them.  They're just tuples of strings though, it's the subtitle data
+        # and the per-task queries that made this expensive.
         data_rows = []
-        for approve_task in self._get_approved_tasks():
-            video = approve_task.team_video.video
-            project = approve_task.team_video.project.name if approve_task.team_video.project else 'none'
-            version = approve_task.get_subtitle_version()
-            language = version.subtitle_language
+        for (approve_task, version, subtitle_task, review_task,
+             minutes) in self._iter_approval_data():
+            team_video = approve_task.team_video
+            video = team_video.video
+            project = team_video.project.name if team_video.project else 'none'
+            is_original = (version.language_code ==
+                           video.primary_audio_language_code)
 
             all_tasks = [approve_task]
-            try:
-                all_tasks.append((Task.objects.complete_subtitle_or_translate()
-                                  .filter(team_video=approve_task.team_video,
-                                          language=approve_task.language)
-                                  .order_by('-completed'))[0])
-            except IndexError:
-                # no subtitling task, probably the review task was manually
-                # created.
-                pass
-            try:
-                all_tasks.append((Task.objects.complete_review()
-                                  .filter(team_video=approve_task.team_video,
-                                          language=approve_task.language)
-                                  .order_by('-completed'))[0])
-            except IndexError:
-                # review not enabled
-                pass
+            # subtitle_task can be None if the review task was manually
+            # created.  review_task will be None if review is not enabled.
+            if subtitle_task is not None:
+                all_tasks.append(subtitle_task)
+            if review_task is not None:
+                all_tasks.append(review_task)
 
             for task in all_tasks:
                 data_rows.append((
@@ -3035,9 +3267,9 @@ class BillingReport(models.Model):
                     video.title_display(),
                     video.video_id,
                     project,
-                    language.language_code,
-                    get_minutes_for_version(version, False),
-                    language.is_primary_audio_language(),
+                    version.language_code,
+                    minutes,
+                    is_original,
                     unicode(approve_task.assignee),
                     unicode(task.body),
                     self._report_date(task.completed),
@@ -3045,7 +3277,12 @@ class BillingReport(models.Model):
                 ))
 
         data_rows.sort(key=lambda row: row[0])
-        return [header] + data_rows
+        yield header
+        for row in data_rows:
+            yield row
+
+    def generate_rows_type_approval_for_users(self):
+        return list(self.iter_rows_type_approval_for_users())
 
     def generate_rows_type_billing_record(self):
         rows = []
@@ -3054,16 +3291,19 @@ class BillingReport(models.Model):
                 self.start_date, self.end_date, add_header=i == 0)
         return rows
 
-    def generate_rows(self):
+    def iter_rows(self):
+        """Iterate through the rows for this report (including headers)."""
         if self.type == BillingReport.TYPE_BILLING_RECORD:
-            rows = self.generate_rows_type_billing_record()
+            return iter(self.generate_rows_type_billing_record())
         elif self.type == BillingReport.TYPE_APPROVAL:
-            rows = self.generate_rows_type_approval()
+            return self.iter_rows_type_approval()
         elif self.type == BillingReport.TYPE_APPROVAL_FOR_USERS:
-            rows = self.generate_rows_type_approval_for_users()
+            return self.iter_rows_type_approval_for_users()
         else:
             raise ValueError("Unknown type: %s" % self.type)
-        return rows
+
+    def generate_rows(self):
+        return list(self.iter_rows())
 
     def convert_unicode_to_utf8(self, rows):
         def _convert(value):
@@ -3071,21 +3311,20 @@ class BillingReport(models.Model):
                 return value.encode("utf-8")
             else:
                 return value
-        return [tuple(_convert(v) for v in row) for row in rows]
+        return (tuple(_convert(v) for v in row) for row in rows)
 
     def process(self):
         """
-        Generate the correct rows (including headers), saves it to a tempo file,
-        then set's that file to the csv_file property, which if , using the S3
-        storage will take care of exporting it to s3.
+        Generate the correct rows (including headers), writing them to a temp
+        file as they're generated, then set's that file to the csv_file
+        property, which if , using the S3 storage will take care of exporting
+        it to s3.
         """
         try:
-            rows = self.generate_rows()
+            self.csv_file = self.make_csv_file(self.iter_rows())
         except StandardError:
             logger.error("Error generating billing report: (id: %s)", self.id)
             self.csv_file = None
-        else:
-            self.csv_file = self.make_csv_file(rows)
         self.processed = datetime.datetime.utcnow()
         self.save()
 
@@ -3097,7 +3336,8 @@ class BillingReport(models.Model):
             self.get_type_display(), self.pk)
         with open(fn, 'w') as f:
             writer = csv.writer(f)
-            writer.writerows(rows)
+            for row in rows:
+                writer.writerow(row)
 
         return File(open(fn, 'r'))
 
@@ -3298,36 +3538,7 @@ def get_minutes_for_version(version, round_up_to_integer):
     """
     Return the number of minutes the subtitles specified in version
     """
-    subs = version.get_subtitles()
-
-    if len(subs) == 0:
-        return 0
-
-    for sub in subs:
-        if sub.start_time is not None:
-            start_time = sub.start_time
-            break
-        # we shouldn't have an end time set without a start time, but handle
-        # it just in case
-        if sub.end_time is not None:
-            start_time = sub.end_time
-            break
-    else:
-        return 0
-
-    for sub in reversed(subs):
-        if sub.end_time is not None:
-            end_time = sub.end_time
-            break
-        # we shouldn't have an end time not set, but check for that just in
-        # case
-        if sub.start_time is not None:
-            end_time = sub.start_time
-            break
-    else:
-        return 0
-
-    duration_seconds =  (end_time - start_time) / 1000.0
+    duration_seconds = version.get_duration_ms() / 1000.0
     minutes = duration_seconds/60.0
     if round_up_to_integer:
         minutes = int(ceil(minutes))
@@ -0,0 +1,327 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""teams.notification_delivery -- Send HTTP notifications to partners.
+
+Notifications used to be POSTed to the partner's callback url right away, from
+inside whatever task noticed the event.  During bulk approvals that meant
+thousands of blocking requests and a slow partner server could tie up all of
+our workers.  Instead, we store notifications in the TeamNotificationDelivery
+outbox and send them from the deliver_team_notifications task:
+
+    - Notifications with the same payload that happen within
+      TEAM_NOTIFICATION_COALESCE_WINDOW seconds of each other only get sent
+      once.
+    - At most TEAM_NOTIFICATION_MAX_CONCURRENCY tasks send notifications for a
+      TeamNotificationSetting at once.
+    - Each worker process keeps an httplib2.Http object per setting, so that
+      connections to the partner's server get reused.
+    - Failed deliveries get retried with exponential backoff, up to
+      TEAM_NOTIFICATION_MAX_ATTEMPTS times.
+
+Settings:
+    TEAM_NOTIFICATION_COALESCE_WINDOW -- seconds to wait for duplicate
+        notifications before sending one
+    TEAM_NOTIFICATION_MAX_CONCURRENCY -- max tasks sending to a single
+        partner/team at once
+    TEAM_NOTIFICATION_BATCH_SIZE -- notifications sent per task
+    TEAM_NOTIFICATION_MAX_ATTEMPTS -- give up after this many tries
+    TEAM_NOTIFICATION_RETRY_DELAY -- seconds to wait before the first retry,
+        it doubles for each retry after that
+    TEAM_NOTIFICATION_HTTP_TIMEOUT -- socket timeout for the requests
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Min
+from httplib2 import Http
+
+from teams.notifications import BaseNotification, post_payload
+from utils.metrics import Gauge, Histogram, Meter
+
+logger = logging.getLogger('team-notifier')
+
+# Never wait longer than this between retries
+MAX_RETRY_DELAY = 60 * 60
+# Sent deliveries get deleted after this many days
+KEEP_SENT_DAYS = 7
+
+def _coalesce_window():
+    return getattr(settings, 'TEAM_NOTIFICATION_COALESCE_WINDOW', 5)
+
+def _max_concurrency():
+    return getattr(settings, 'TEAM_NOTIFICATION_MAX_CONCURRENCY', 2)
+
+def _batch_size():
+    return getattr(settings, 'TEAM_NOTIFICATION_BATCH_SIZE', 50)
+
+def _max_attempts():
+    return getattr(settings, 'TEAM_NOTIFICATION_MAX_ATTEMPTS', 8)
+
+def _retry_delay():
+    return getattr(settings, 'TEAM_NOTIFICATION_RETRY_DELAY', 30)
+
+def _http_timeout():
+    return getattr(settings, 'TEAM_NOTIFICATION_HTTP_TIMEOUT', 30)
+
+def uses_outbox(notification):
+    """Should a notification be sent using the outbox?
+
+    Notification classes that override send_http_request() to customize the
+    request still get sent right away.
+    """
+    return (type(notification).send_http_request.im_func is
+            BaseNotification.send_http_request.im_func)
+
+def calc_coalesce_key(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True)).hexdigest()
+
+def enqueue(setting, notification):
+    """Add a notification to the outbox.
+
+    If there's already a matching notification waiting to be sent, then we
+    merge the two and return None.  Otherwise we return the new
+    TeamNotificationDelivery.
+    """
+    from teams.models import TeamNotificationDelivery
+
+    data = notification.get_payload()
+    key = calc_coalesce_key(data)
+    now = datetime.datetime.now()
+    window = datetime.timedelta(seconds=_coalesce_window())
+    # attempts=0 ensures we don't merge with a delivery that's being sent
+    # right now.
+    merged = (TeamNotificationDelivery.objects.pending()
+              .filter(setting=setting, coalesce_key=key, attempts=0,
+                      created__gte=now - window)
+              .update(coalesced=F('coalesced') + 1))
+    if merged:
+        Meter('teams.notification-delivery.coalesced').inc()
+        return None
+    delivery = TeamNotificationDelivery.objects.create(
+        setting=setting, event_name=notification.event_name,
+        data=json.dumps(data), coalesce_key=key, created=now,
+        next_attempt=now + window)
+    schedule_delivery(setting.pk, _coalesce_window())
+    return delivery
+
+def schedule_delivery(setting_id, countdown=0):
+    """Schedule a deliver_team_notifications task for a setting.
+
+    We only schedule 1 task per setting for each second, so that a burst of
+    notifications doesn't create a burst of tasks.
+    """
+    from teams.tasks import deliver_team_notifications
+
+    eta = int(time.time() + countdown)
+    key = 'teams:notification-delivery-scheduled:%s:%s' % (setting_id, eta)
+    if cache.add(key, 1, countdown + 60):
+        deliver_team_notifications.apply_async(args=(setting_id,),
+                                               countdown=countdown)
+
+# Maps setting ids to (config, Http) tuples.  Reusing the Http objects lets
+# httplib2 keep connections to the partner's server open.
+_http_pool = {}
+
+def get_http(setting):
+    config = (setting.request_url, setting.basic_auth_username,
+              setting.basic_auth_password)
+    if setting.pk in _http_pool:
+        pooled_config, http = _http_pool[setting.pk]
+        if pooled_config == config:
+            return http
+    http = Http(timeout=_http_timeout(),
+                disable_ssl_certificate_validation=True)
+    if setting.basic_auth_username and setting.basic_auth_password:
+        http.add_credentials(setting.basic_auth_username,
+                             setting.basic_auth_password)
+    _http_pool[setting.pk] = (config, http)
+    return http
+
+def _slot_timeout():
+    # Long enough for a task to send a full batch, in case a worker dies
+    # without releasing its slot.
+    return _http_timeout() * _batch_size()
+
+def _acquire_slot(setting_id):
+    """Try to get one of the concurrency slots for a setting.
+
+    Returns the cache key for the slot, or None if they're all taken.
+    """
+    for i in xrange(_max_concurrency()):
+        key = 'teams:notification-delivery-slot:%s:%s' % (setting_id, i)
+        if cache.add(key, 1, _slot_timeout()):
+            return key
+    return None
+
+def _release_slot(key):
+    cache.delete(key)
+
+def deliver(setting_id, now=None):
+    """Send a batch of due notifications for a setting.
+
+    This is run by the deliver_team_notifications task.
+    """
+    from teams.models import TeamNotificationDelivery, TeamNotificationSetting
+
+    try:
+        setting = (TeamNotificationSetting.objects
+                   .select_related('team', 'partner').get(pk=setting_id))
+    except TeamNotificationSetting.DoesNotExist:
+        return
+    slot = _acquire_slot(setting_id)
+    if slot is None:
+        # Try again in a bit.  Meanwhile, the tasks running now will handle
+        # the due deliveries.
+        Meter('teams.notification-delivery.concurrency-limited').inc()
+        schedule_delivery(setting_id, 5)
+        return
+    try:
+        deliveries = list(TeamNotificationDelivery.objects
+                          .due(setting, now)[:_batch_size()])
+        for delivery in deliveries:
+            if _claim(delivery):
+                _send(setting, delivery)
+    finally:
+        _release_slot(slot)
+    _schedule_remaining(setting)
+
+def _claim(delivery):
+    """Start an attempt at sending a delivery.
+
+    Returns False if another process got to the delivery first.
+    """
+    from teams.models import TeamNotificationDelivery
+
+    # Push next_attempt back, so if our process dies while sending another
+    # will try later on.
+    lease_end = (datetime.datetime.now() +
+                 datetime.timedelta(seconds=_http_timeout() * 2))
+    claimed = TeamNotificationDelivery.objects.filter(
+        pk=delivery.pk, status=TeamNotificationDelivery.STATUS_PENDING,
+        attempts=delivery.attempts
+    ).update(attempts=F('attempts') + 1, next_attempt=lease_end)
+    delivery.attempts += 1
+    return bool(claimed)
+
+def _send(setting, delivery):
+    http = get_http(setting)
+    try:
+        resp, content = post_payload(http, setting.request_url,
+                                     delivery.get_payload())
+    except Exception, e:
+        # Start with fresh connections next time
+        _http_pool.pop(setting.pk, None)
+        _record_failure(setting, delivery, repr(e))
+        return
+    if 200 <= resp.status < 400:
+        _record_success(setting, delivery)
+    else:
+        _record_failure(setting, delivery,
+                        'HTTP %s: %s' % (resp.status, content[:1000]))
+
+def _record_success(setting, delivery):
+    from teams.models import TeamNotificationDelivery
+
+    now = datetime.datetime.now()
+    TeamNotificationDelivery.objects.filter(pk=delivery.pk).update(
+        status=TeamNotificationDelivery.STATUS_SENT, sent=now,
+        last_error='')
+    latency = now - delivery.created
+    Histogram('teams.notification-delivery.latency.%s' %
+              setting.get_metric_name()).record(
+                  latency.days * 86400 + latency.seconds)
+    Meter('http-callback-notification-success').inc()
+
+def _record_failure(setting, delivery, error):
+    from teams.models import TeamNotificationDelivery
+
+    Meter('http-callback-notification-error').inc()
+    if delivery.attempts >= _max_attempts():
+        logger.error("Failed to notify %s" % setting, extra={
+            'url': setting.request_url,
+            'data_sent': delivery.data,
+            'error': error,
+        })
+        TeamNotificationDelivery.objects.filter(pk=delivery.pk).update(
+            status=TeamNotificationDelivery.STATUS_FAILED, last_error=error)
+        return
+    delay = min(_retry_delay() * 2 ** (delivery.attempts - 1),
+                MAX_RETRY_DELAY)
+    TeamNotificationDelivery.objects.filter(pk=delivery.pk).update(
+        next_attempt=(datetime.datetime.now() +
+                      datetime.timedelta(seconds=delay)),
+        last_error=error)
+
+def _schedule_remaining(setting):
+    """Schedule a task for the next pending delivery for a setting."""
+    from teams.models import TeamNotificationDelivery
+
+    next_attempt = (TeamNotificationDelivery.objects.pending()
+                    .filter(setting=setting)
+                    .aggregate(next_attempt=Min('next_attempt'))
+                    ['next_attempt'])
+    if next_attempt is None:
+        return
+    wait = next_attempt - datetime.datetime.now()
+    schedule_delivery(setting.pk,
+                      max(0, wait.days * 86400 + wait.seconds + 1))
+
+def check_outbox():
+    """Schedule tasks for overdue deliveries and report metrics.
+
+    Normally deliver() schedules a task for the next delivery, but this is a
+    safety net for when that doesn't happen (for example if a worker dies).
+    It's run periodically by celerybeat.
+    """
+    from teams.models import TeamNotificationDelivery, TeamNotificationSetting
+
+    now = datetime.datetime.now()
+    rows = list(TeamNotificationDelivery.objects.pending()
+                .values('setting')
+                .annotate(count=Count('id'), oldest=Min('created'),
+                          next_attempt=Min('next_attempt')))
+    setting_map = (TeamNotificationSetting.objects
+                   .select_related('team', 'partner')
+                   .in_bulk([row['setting'] for row in rows]))
+    for row in rows:
+        setting = setting_map.get(row['setting'])
+        if setting is None:
+            continue
+        name = setting.get_metric_name()
+        age = now - row['oldest']
+        Gauge('teams.notification-queue.%s' % name).report(row['count'])
+        Gauge('teams.notification-queue-age.%s' % name).report(
+            age.days * 86400 + age.seconds)
+        if row['next_attempt'] <= now:
+            schedule_delivery(setting.pk)
+
+def purge_sent():
+    """Delete deliveries that were sent more than KEEP_SENT_DAYS ago."""
+    from teams.models import TeamNotificationDelivery
+
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=KEEP_SENT_DAYS)
+    TeamNotificationDelivery.objects.filter(
+        status=TeamNotificationDelivery.STATUS_SENT,
+        sent__lt=cutoff).delete()
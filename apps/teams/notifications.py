@@ -33,6 +33,20 @@ from videos.models import Video
 import logging
 logger = logging.getLogger("team-notifier")
 
+def post_payload(http, url, data):
+    """POST a notification payload to a partner's callback url.
+
+    The payload gets sent both in the query string and the request body.
+
+    Returns the (response, content) tuple from httplib2.
+    """
+    data = urlencode(data)
+    url = "%s?%s" % (url , data)
+    return http.request(url, method="POST", body=data, headers={
+        'referer': '%s://%s' % (DEFAULT_PROTOCOL,
+                                Site.objects.get_current().domain)
+    })
+
 class BaseNotification(object):
     """
     Holds the data needed to prepare a notification.
@@ -139,11 +153,8 @@ class BaseNotification(object):
         if self.language:
             return  self.from_internal_lang(self.language.language_code)
 
-    def send_http_request(self, url, basic_auth_username, basic_auth_password):
-        h = Http(disable_ssl_certificate_validation=True)
-        if basic_auth_username and basic_auth_password:
-            h.add_credentials(basic_auth_username, basic_auth_password)
-
+    def get_payload(self):
+        """Get the data to send to the partner for this notification."""
         project = self.video.get_team_video().project.slug if self.video else None
         data = {
             'event': self.event_name,
@@ -164,13 +175,16 @@ class BaseNotification(object):
                 "language_code": self.language_code,
                 "language_id": self.language.pk,
             })
-        data_sent = data
-        data = urlencode(data)
-        url = "%s?%s" % (url , data)
+        return data
+
+    def send_http_request(self, url, basic_auth_username, basic_auth_password):
+        h = Http(disable_ssl_certificate_validation=True)
+        if basic_auth_username and basic_auth_password:
+            h.add_credentials(basic_auth_username, basic_auth_password)
+
+        data_sent = self.get_payload()
         try:
-            resp, content = h.request(url, method="POST", body=data, headers={
-                'referer': '%s://%s' % (DEFAULT_PROTOCOL, Site.objects.get_current().domain)
-            })
+            resp, content = post_payload(h, url, data_sent)
             success = 200 <= resp.status < 400
             if success is False:
                 logger.error("Failed to notify team %s " % (self.team),
@@ -86,35 +86,93 @@ def get_role(member):
     else:
         return member.role
 
-def get_role_for_target(user, team, project=None, lang=None):
+def get_role_for_target(user, team, project=None, lang=None, context=None):
     """Return the role the given user effectively has for the given target.
 
     `lang` should be a string (the language code).
 
     """
-    member = get_member(user, team)
-    role = get_role(member)
-    narrowings = get_narrowings(member)
+    context = get_permission_context(user, team, context)
+    return context.role_for_target(project, lang)
 
-    # If the user has no narrowings, just return their overall role.
-    if not narrowings:
-        return role
+class PermissionContext(object):
+    """Team membership data needed to check a user's permissions.
 
-    # Otherwise the narrowings must match the target.
-    project_narrowings = [n.project for n in narrowings if n.project]
-    lang_narrowings = [n.language for n in narrowings if n.language]
+    Most of the functions in this module need the user's TeamMember, role
+    and narrowings.  PermissionContext looks them up once, so that we can
+    check many permissions without going back to the DB.
 
-    # The default project is the same as "no project".
-    if project and project.is_default_project:
-        project = None
-
-    if project_narrowings and project not in project_narrowings:
-        return ROLE_CONTRIBUTOR
-
-    if lang_narrowings and lang not in lang_narrowings:
-        return ROLE_CONTRIBUTOR
+    Attributes:
+        user: User that we're checking permissions for
+        team: Team that we're checking permissions for
+        member: TeamMember for the user, or None
+        role: the member's general role (without narrowings)
+        project_narrowings: set of project ids the member is narrowed to
+        lang_narrowings: set of language codes the member is narrowed to
+        workflows: list of all Workflows for the team, or None to look them
+            up for each team video
+    """
+    def __init__(self, user, team, workflows=None):
+        self.user = user
+        self.team = team
+        self.member = get_member(user, team)
+        narrowings = get_narrowings(self.member)
+        self.has_narrowings = bool(narrowings)
+        self.project_narrowings = set(n.project_id for n in narrowings
+                                      if n.project_id)
+        self.lang_narrowings = set(n.language for n in narrowings
+                                   if n.language)
+        self.workflows = workflows
+
+    @property
+    def role(self):
+        # Read this from the member each time, since code sometimes changes
+        # the role of a cached member
+        return get_role(self.member)
+
+    def matches(self, user, team):
+        return self.user.id == user.id and self.team.id == team.id
+
+    def role_for_target(self, project=None, lang=None):
+        # If the user has no narrowings, just return their overall role.
+        if not self.has_narrowings:
+            return self.role
+
+        # The default project is the same as "no project".
+        if project and project.is_default_project:
+            project = None
+
+        # Otherwise the narrowings must match the target.
+        if self.project_narrowings and (
+            project is None or project.id not in self.project_narrowings):
+            return ROLE_CONTRIBUTOR
+
+        if self.lang_narrowings and lang not in self.lang_narrowings:
+            return ROLE_CONTRIBUTOR
+
+        return self.role
+
+    def workflow_for(self, team_video):
+        return Workflow.get_for_team_video(team_video, self.workflows)
+
+def get_permission_context(user, team, context=None):
+    """Get a PermissionContext for a user and team.
+
+    If context is for the same user and team, it will be returned.
+    Otherwise we use a context cached on the team object, the same way that
+    Team.get_member() caches TeamMembers.  Team.uncache_member() clears it.
+    """
+    if context is not None and context.matches(user, team):
+        return context
+    if user.id not in team._permission_context_cache:
+        team._permission_context_cache[user.id] = PermissionContext(user,
+                                                                    team)
+    return team._permission_context_cache[user.id]
 
-    return role
+def _get_workflow(team_video, context=None):
+    if context is not None and context.team.id == team_video.team_id:
+        return context.workflow_for(team_video)
+    return Workflow.get_for_team_video(team_video)
 
 
 def roles_user_can_assign(team, user, to_user=None):
@@ -509,9 +567,10 @@ def can_review_own_subtitles(role, team_video):
 
     return False
 
-def can_review(team_video, user, lang=None, allow_own=False):
-    workflow = Workflow.get_for_team_video(team_video)
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
+def can_review(team_video, user, lang=None, allow_own=False, context=None):
+    workflow = _get_workflow(team_video, context)
+    role = get_role_for_target(user, team_video.team, team_video.project, lang,
+                               context)
 
     if not workflow.review_allowed:
         return False
@@ -546,9 +605,10 @@ def can_review(team_video, user, lang=None, allow_own=False):
 
     return True
 
-def can_approve(team_video, user, lang=None):
-    workflow = Workflow.get_for_team_video(team_video)
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
+def can_approve(team_video, user, lang=None, context=None):
+    workflow = _get_workflow(team_video, context)
+    role = get_role_for_target(user, team_video.team, team_video.project, lang,
+                               context)
 
     if not workflow.approve_allowed:
         return False
@@ -575,8 +635,9 @@ def can_edit_project(team, user, project):
     role = get_role_for_target(user, team, project, None)
     return role in [ROLE_ADMIN, ROLE_OWNER]
 
-def can_create_and_edit_subtitles(user, team_video, lang=None):
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
+def can_create_and_edit_subtitles(user, team_video, lang=None, context=None):
+    role = get_role_for_target(user, team_video.team, team_video.project, lang,
+                               context)
 
     role_req = {
         10: ROLE_OUTSIDER,
@@ -587,8 +648,9 @@ def can_create_and_edit_subtitles(user, team_video, lang=None):
 
     return role in _perms_equal_or_greater(role_req, include_outsiders=True)
 
-def can_create_and_edit_translations(user, team_video, lang=None):
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
+def can_create_and_edit_translations(user, team_video, lang=None, context=None):
+    role = get_role_for_target(user, team_video.team, team_video.project, lang,
+                               context)
 
     role_req = {
         10: ROLE_OUTSIDER,
@@ -726,18 +788,18 @@ def can_create_tasks(team, user, project=None):
     # for now, use the same logic as assignment
     return can_assign_tasks(team, user, project)
 
-def can_delete_tasks(team, user, project=None, lang=None):
+def can_delete_tasks(team, user, project=None, lang=None, context=None):
     """Return whether the given user has permission to delete tasks at all."""
 
-    role = get_role_for_target(user, team, project, lang)
+    role = get_role_for_target(user, team, project, lang, context)
     if role == ROLE_CONTRIBUTOR:
         return False
-    return can_assign_tasks(team, user, project, lang)
+    return can_assign_tasks(team, user, project, lang, context)
 
-def can_assign_tasks(team, user, project=None, lang=None):
+def can_assign_tasks(team, user, project=None, lang=None, context=None):
     """Return whether the given user has permission to assign tasks at all."""
 
-    role = get_role_for_target(user, team, project, lang)
+    role = get_role_for_target(user, team, project, lang, context)
 
     role_required = {
         10: ROLE_CONTRIBUTOR,
@@ -751,22 +813,26 @@ def can_resync(team, user):
     role = get_role_for_target(user, team)
     return user.is_staff or role in [ROLE_ADMIN, ROLE_OWNER]
 
-def can_perform_task_for(user, type, team_video, language, allow_own=False):
+def can_perform_task_for(user, type, team_video, language, allow_own=False,
+                         context=None):
     """Return whether the given user can perform the given type of task."""
 
     if type:
         type = int(type)
 
     if type == Task.TYPE_IDS['Subtitle']:
-        return can_create_and_edit_subtitles(user, team_video)
+        return can_create_and_edit_subtitles(user, team_video,
+                                             context=context)
     elif type == Task.TYPE_IDS['Translate']:
-        return can_create_and_edit_translations(user, team_video, language)
+        return can_create_and_edit_translations(user, team_video, language,
+                                                context)
     elif type == Task.TYPE_IDS['Review']:
-        return can_review(team_video, user, language, allow_own=allow_own)
+        return can_review(team_video, user, language, allow_own=allow_own,
+                          context=context)
     elif type == Task.TYPE_IDS['Approve']:
-        return can_approve(team_video, user, language)
+        return can_approve(team_video, user, language, context)
 
-def can_perform_task(user, task, allow_own=False):
+def can_perform_task(user, task, allow_own=False, context=None):
     """Return whether the given user can perform the given task."""
 
     # Hacky check to account for the following case:
@@ -788,9 +854,9 @@ def can_perform_task(user, task, allow_own=False):
             return True
 
     return can_perform_task_for(user, task.type, task.team_video,
-                                task.language, allow_own)
+                                task.language, allow_own, context)
 
-def can_assign_task(task, user):
+def can_assign_task(task, user, context=None):
     """Return whether the given user can assign the given task.
 
     Users can assign tasks iff:
@@ -801,8 +867,8 @@ def can_assign_task(task, user):
     """
     team, project, lang = task.team, task.team_video.project, task.language
 
-    return (can_assign_tasks(team, user, project, lang)
-            and can_perform_task(user, task, allow_own=True))
+    return (can_assign_tasks(team, user, project, lang, context)
+            and can_perform_task(user, task, allow_own=True, context=context))
 
 def can_decline_task(task, user):
     """Return whether the given user can decline the given task.
@@ -814,29 +880,58 @@ def can_decline_task(task, user):
     """
     return task.assignee_id == user.id
 
-def can_delete_task(task, user):
+def can_delete_task(task, user, context=None):
     """Return whether the given user can delete the given task."""
 
     team, project, lang = task.team, task.team_video.project, task.language
 
-    can_delete = can_delete_tasks(team, user, project, lang)
+    can_delete = can_delete_tasks(team, user, project, lang, context)
 
     # Allow stray review tasks to be deleted.
     if task.type == Task.TYPE_IDS['Review']:
-        workflow = Workflow.get_for_team_video(task.team_video)
+        workflow = _get_workflow(task.team_video, context)
         if not workflow.review_allowed:
             return can_delete
 
     # Allow stray approve tasks to be deleted.
     if task.type == Task.TYPE_IDS['Approve']:
-        workflow = Workflow.get_for_team_video(task.team_video)
+        workflow = _get_workflow(task.team_video, context)
         if not workflow.approve_allowed:
             return can_delete
 
-    return can_delete and can_perform_task(user, task)
+    return can_delete and can_perform_task(user, task, context=context)
 
-def _user_can_create_task_subtitle(user, team_video):
-    role = get_role_for_target(user, team_video.team, team_video.project, None)
+def add_task_permissions(user, tasks):
+    """Check the permissions for a list of tasks in one pass.
+
+    Sets user_can_perform, user_can_assign, user_can_decline and
+    user_can_delete on each task.
+
+    We build a PermissionContext for each team with the team's workflows
+    preloaded, so we only need a couple queries per team instead of several
+    per task.
+    """
+    contexts = {}
+    for task in tasks:
+        if task.team_id not in contexts:
+            workflows = list(Workflow.objects.filter(team=task.team_id)
+                             .select_related('project', 'team',
+                                             'team_video'))
+            contexts[task.team_id] = PermissionContext(user, task.team,
+                                                       workflows or None)
+        context = contexts[task.team_id]
+        # Share the context with any other permission checks for this
+        # request
+        for team in (task.team, task.team_video.team):
+            team._permission_context_cache.setdefault(user.id, context)
+        task.user_can_perform = can_perform_task(user, task, context=context)
+        task.user_can_assign = can_assign_task(task, user, context)
+        task.user_can_decline = can_decline_task(task, user)
+        task.user_can_delete = can_delete_task(task, user, context)
+
+def _user_can_create_task_subtitle(user, team_video, context=None):
+    role = get_role_for_target(user, team_video.team, team_video.project, None,
+                               context)
 
     role_req = {
         10: ROLE_CONTRIBUTOR,
@@ -846,9 +941,10 @@ def _user_can_create_task_subtitle(user, team_video):
 
     return role in _perms_equal_or_greater(role_req)
 
-def _user_can_create_task_translate(user, team_video):
+def _user_can_create_task_translate(user, team_video, context=None):
     # TODO: Take language into account here
-    role = get_role_for_target(user, team_video.team, team_video.project, None)
+    role = get_role_for_target(user, team_video.team, team_video.project, None,
+                               context)
 
     role_req = {
         10: ROLE_CONTRIBUTOR,
@@ -859,7 +955,8 @@ def _user_can_create_task_translate(user, team_video):
     return role in _perms_equal_or_greater(role_req)
 
 
-def can_create_task_subtitle(team_video, user=None, workflows=None):
+def can_create_task_subtitle(team_video, user=None, workflows=None,
+                             context=None):
     """Return whether the given video can have a subtitle task created for it.
 
     If a user is given, return whether *that user* can create the task.
@@ -873,7 +970,8 @@ def can_create_task_subtitle(team_video, user=None, workflows=None):
     """
     from subtitles.models import SubtitleLanguage
 
-    if user and not _user_can_create_task_subtitle(user, team_video):
+    if user and not _user_can_create_task_subtitle(user, team_video,
+                                                   context):
         return False
 
     if (SubtitleLanguage.objects.having_public_versions()
@@ -886,7 +984,8 @@ def can_create_task_subtitle(team_video, user=None, workflows=None):
 
     return True
 
-def can_create_task_translate(team_video, user=None, workflows=None):
+def can_create_task_translate(team_video, user=None, workflows=None,
+                              context=None):
     """Return a list of languages for which a translate task can be created for the given video.
 
     If a user is given, filter that list to contain only languages the user can
@@ -906,7 +1005,8 @@ def can_create_task_translate(team_video, user=None, workflows=None):
     Languages are returned as strings (language codes like 'en').
 
     """
-    if user and not _user_can_create_task_translate(user, team_video):
+    if user and not _user_can_create_task_translate(user, team_video,
+                                                    context):
         return []
 
     if hasattr(team_video, 'completed_langs'):
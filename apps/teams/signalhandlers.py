@@ -17,9 +17,11 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 
 from auth.models import CustomUser as User
+from subtitles.signals import subtitles_complete_changed, version_published
+from teams import statistics
 from teams.models import TeamVideo, TeamMember, MembershipNarrowing
 from teams.signals import api_teamvideo_new
 from videos.signals import feed_imported
@@ -39,6 +41,25 @@ def on_feed_imported(signal, sender, new_videos, **kwargs):
 def on_team_member_change(sender, instance, **kwargs):
     User.cache.invalidate_by_pk(instance.user_id)
 
+@receiver(post_save, sender=TeamMember)
+def on_team_member_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        statistics.record_member_joined(instance)
+
+# Use pre_delete so that we can still see the user's languages if the member
+# is getting deleted along with the user.
+@receiver(pre_delete, sender=TeamMember)
+def on_team_member_deleted(sender, instance, **kwargs):
+    statistics.record_member_left(instance)
+
+@receiver(version_published)
+def on_version_published(sender, **kwargs):
+    statistics.record_version_published(sender)
+
+@receiver(subtitles_complete_changed)
+def on_subtitles_complete_changed(sender, **kwargs):
+    statistics.record_subtitles_complete_changed(sender)
+
 @receiver(post_save, sender=MembershipNarrowing)
 @receiver(post_delete, sender=MembershipNarrowing)
 def on_membership_narrowing_change(sender, instance, **kwargs):
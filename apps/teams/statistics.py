@@ -1,16 +1,235 @@
+from collections import defaultdict
+from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
-from auth.models import CustomUser as User
+from django.db import transaction
+from django.db.models import F, Min, Sum
+from auth.models import CustomUser as User, UserLanguage
+from subtitles.models import SubtitleLanguage, SubtitleVersion
+from teams.models import TeamLanguageStats, TeamContributorStats
 from utils.graphing import plot
 from utils import DEFAULT_PROTOCOL
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.utils.timezone import utc
 
+# The statistics tabs read from the TeamLanguageStats and
+# TeamContributorStats rollup tables, so that they only need to look at
+# O(days x languages) rows.  They count the same things that we used to
+# calculate from the SubtitleLanguages:
+#
+#   - languages_added counts each team video language once, on the day its
+#     first version was added.  languages_published counts the ones that are
+#     complete.
+#   - TeamContributorStats counts distinct (user, language) pairs, on the day
+#     of the user's first public version for the language.
+#   - members_joined counts the languages of current members, on the day
+#     they joined.
+#
+# The functions below keep those tables up to date:
+#
+#   - The subtitle pipeline calls record_version_added() for each new version
+#     of a team video.
+#   - record_version_published() is called when a private version gets
+#     published.
+#   - record_subtitles_complete_changed() is called when a language's
+#     subtitles_complete flag changes.
+#   - The TeamMember signal handlers call record_member_joined() and
+#     record_member_left().
+#
+# Some changes aren't tracked (videos moving between teams, members editing
+# their languages, versions getting deleted).  rebuild() recalculates
+# everything for a team.  The rebuild_all_team_stats task runs it nightly and
+# compute_statistics() runs it for teams that don't have any rows yet.
+
+def _is_contributor(user_id):
+    return user_id is not None and user_id != settings.ANONYMOUS_USER_ID
+
+def _member_date(member):
+    return (member.created or datetime.now()).date()
+
+def _member_languages(member):
+    return set(UserLanguage.objects.filter(user=member.user_id)
+               .values_list('language', flat=True))
+
+def _record_contribution(team_id, version):
+    """Count a public version in TeamContributorStats.
+
+    We only count the first public version for each user/language.
+    """
+    if not _is_contributor(version.author_id):
+        return
+    already_counted = (SubtitleVersion.objects.public()
+                       .filter(subtitle_language=version.subtitle_language_id,
+                               author=version.author_id)
+                       .exclude(pk=version.pk)
+                       .exists())
+    if already_counted:
+        return
+    TeamContributorStats.objects.increment({
+        'team_id': team_id,
+        'user_id': version.author_id,
+        'date': version.created.date(),
+    }, languages=1)
+
+def record_version_added(team_video, version):
+    if version.version_number == 1:
+        complete = version.subtitle_language.subtitles_complete
+        TeamLanguageStats.objects.increment({
+            'team_id': team_video.team_id,
+            'language_code': version.language_code,
+            'date': version.created.date(),
+        }, languages_added=1, languages_published=int(complete))
+    if version.is_public():
+        _record_contribution(team_video.team_id, version)
+
+def record_version_published(version):
+    team_video = version.video.get_team_video()
+    if team_video is None:
+        return
+    _record_contribution(team_video.team_id, version)
+
+def record_subtitles_complete_changed(language):
+    team_video = language.video.get_team_video()
+    if team_video is None:
+        return
+    first_created = list(language.subtitleversion_set.full()
+                         .order_by('version_number')
+                         .values_list('created', flat=True)[:1])
+    if not first_created:
+        # record_version_added() will count the language once it has a
+        # version
+        return
+    keys = {
+        'team_id': team_video.team_id,
+        'language_code': language.language_code,
+        'date': first_created[0].date(),
+    }
+    if language.subtitles_complete:
+        TeamLanguageStats.objects.increment(keys, languages_published=1)
+    else:
+        # Like record_member_left(), don't create rows for languages that
+        # were counted before the rollups existed.
+        TeamLanguageStats.objects.filter(
+            languages_published__gt=0, **keys
+        ).update(languages_published=F('languages_published') - 1)
+
+def record_member_joined(member):
+    date = _member_date(member)
+    for language_code in _member_languages(member):
+        TeamLanguageStats.objects.increment({
+            'team_id': member.team_id,
+            'language_code': language_code,
+            'date': date,
+        }, members_joined=1)
+
+def record_member_left(member):
+    # members_joined only counts current members, so we subtract from the
+    # day that they joined.  Only update existing rows: members who joined
+    # before the rollups existed were never counted, and creating rows
+    # while a team is being deleted would fail the foreign key check.
+    TeamLanguageStats.objects.filter(
+        team=member.team_id, date=_member_date(member),
+        language_code__in=_member_languages(member), members_joined__gt=0,
+    ).update(members_joined=F('members_joined') - 1)
+
+@transaction.commit_on_success
+def rebuild(team):
+    """Recalculate the statistics rollups for a team from scratch."""
+    language_counts = defaultdict(lambda: defaultdict(int))
+    contributor_counts = defaultdict(int)
+
+    languages = (SubtitleLanguage.objects
+                 .filter(video__teamvideo__team=team)
+                 .annotate(first_created=Min('subtitleversion__created'))
+                 .filter(first_created__isnull=False)
+                 .values_list('language_code', 'subtitles_complete',
+                              'first_created'))
+    for language_code, complete, first_created in languages.iterator():
+        counts = language_counts[language_code, first_created.date()]
+        counts['languages_added'] += 1
+        if complete:
+            counts['languages_published'] += 1
+
+    contributions = (SubtitleVersion.objects.public()
+                     .filter(video__teamvideo__team=team)
+                     .values('author', 'subtitle_language')
+                     .annotate(first_created=Min('created'))
+                     .order_by())
+    for row in contributions.iterator():
+        if _is_contributor(row['author']):
+            contributor_counts[row['author'],
+                               row['first_created'].date()] += 1
+
+    member_dates = {}
+    for user_id, created in team.members.values_list('user', 'created'):
+        member_dates[user_id] = (created or datetime.now()).date()
+    user_languages = (UserLanguage.objects
+                      .filter(user__in=member_dates.keys())
+                      .values_list('user', 'language').distinct())
+    for user_id, language_code in user_languages:
+        language_counts[language_code,
+                        member_dates[user_id]]['members_joined'] += 1
+
+    TeamLanguageStats.objects.filter(team=team).delete()
+    TeamLanguageStats.objects.bulk_create([
+        TeamLanguageStats(team=team, language_code=language_code, date=date,
+                          **counts)
+        for (language_code, date), counts in language_counts.items()
+    ])
+    TeamContributorStats.objects.filter(team=team).delete()
+    TeamContributorStats.objects.bulk_create([
+        TeamContributorStats(team=team, user_id=user_id, date=date,
+                             languages=count)
+        for (user_id, date), count in contributor_counts.items()
+    ])
+
+def _since_date(days):
+    return (datetime.now() - timedelta(days=days)).date()
+
+def language_totals(team, since=None):
+    """Sum the TeamLanguageStats counters for each language
+
+    Args:
+        team: Team to get totals for
+        since: only count the last n days
+
+    Returns: dict mapping language codes to dicts with the languages_added,
+        languages_published and members_joined totals
+    """
+    qs = TeamLanguageStats.objects.filter(team=team)
+    if since:
+        qs = qs.filter(date__gt=_since_date(since))
+    qs = (qs.values('language_code')
+          .annotate(languages_added=Sum('languages_added'),
+                    languages_published=Sum('languages_published'),
+                    members_joined=Sum('members_joined'))
+          .order_by())
+    return dict((row.pop('language_code'), row) for row in qs)
+
+def top_contributors(team, since=None, limit=20):
+    """Get the users who contributed to the most languages
+
+    Returns: list of (user_id, count) tuples
+    """
+    qs = TeamContributorStats.objects.filter(team=team)
+    if since:
+        qs = qs.filter(date__gt=_since_date(since))
+    qs = (qs.values('user')
+          .annotate(count=Sum('languages'))
+          .filter(count__gt=0)
+          .order_by('-count')[:limit])
+    return [(row['user'], row['count']) for row in qs]
+
 def compute_statistics(team, stats_type):
     """computes a bunch of statistics for the team, either at
     the video or member levels.
     """
     from views import TableCell, ALL_LANGUAGES_DICT
+    if not TeamLanguageStats.objects.filter(team=team).exists():
+        # Teams that existed before the rollups were added won't have any
+        # rows until rebuild_all_team_stats runs.  Build them now rather than
+        # showing empty graphs.
+        rebuild(team)
     # Workaround for issues in the graphing library
     # displaying long strings.
     def strip_strings_chrome(s):
@@ -28,58 +247,48 @@ def compute_statistics(team, stats_type):
     summary_additional_recent = ''
     summary_table = ''
     if stats_type == 'videosstats':
-        (complete_languages, incomplete_languages) = team.get_team_languages()
-        languages = complete_languages + incomplete_languages
-        unique_languages = set(languages)
-        total = 0
-        numbers = []
+        def language_numbers(totals):
+            numbers = []
+            total = 0
+            for l, counts in totals.items():
+                if counts['languages_added'] <= 0:
+                    continue
+                numbers.append((strip_strings_chrome(ALL_LANGUAGES_DICT[l]), counts['languages_added'], "%s - Published: %s" % (ALL_LANGUAGES_DICT[l], counts['languages_published'])))
+                total += counts['languages_added']
+            return numbers, total
         y_title = "Number of edited subtitles"
-        for l in unique_languages:
-            count_complete = complete_languages.count(l)
-            count_incomplete = incomplete_languages.count(l)
-            numbers.append((strip_strings_chrome(ALL_LANGUAGES_DICT[l]), count_complete + count_incomplete, "%s - Published: %s" % (ALL_LANGUAGES_DICT[l], count_complete)))
-            total += count_complete + count_incomplete
+        numbers, total = language_numbers(language_totals(team))
         summary = 'Top languages (all time)'
         title = ""
         graph = plot(numbers, title=title, graph_type='HorizontalBar', labels=True, max_entries=20, y_title=y_title)
 
-        (complete_languages_recent, incomplete_languages_recent, new_languages) = team.get_team_languages(since=30)
-        languages_recent = complete_languages_recent + incomplete_languages_recent
-        unique_languages_recent = set(languages_recent)
+        numbers_recent, total_recent = language_numbers(language_totals(team, since=30))
         summary_recent = "Top languages (past 30 days)"
-        numbers_recent = []
-        total_recent = 0
-        for l in unique_languages_recent:
-            count_complete_recent = complete_languages_recent.count(l)
-            count_incomplete_recent = incomplete_languages_recent.count(l)
-            numbers_recent.append((strip_strings_chrome(ALL_LANGUAGES_DICT[l]), count_complete_recent + count_incomplete_recent, "%s - Published: %s" % (ALL_LANGUAGES_DICT[l], count_complete_recent)))
-            total_recent += count_complete_recent + count_incomplete_recent
         title_recent = ""
         graph_recent = plot(numbers_recent, title=title_recent, graph_type='HorizontalBar', labels=True, max_entries=20, y_title=y_title)
 
         summary_table = []
         summary_table.append([TableCell("", header=True), TableCell("all time", header=True), TableCell("past 30 days", header=True)])
         summary_table.append([TableCell("videos added", header=True), TableCell(str(team.videos_count)), TableCell(str(team.videos_count_since(30)))])
-        summary_table.append([TableCell("languages edited", header=True), TableCell(str(len(unique_languages))), TableCell(str(len(unique_languages_recent)))])
+        summary_table.append([TableCell("languages edited", header=True), TableCell(str(len(numbers))), TableCell(str(len(numbers_recent)))])
         summary_table.append([TableCell("subtitles edited", header=True), TableCell(str(total)), TableCell(str(total_recent))])
 
     elif stats_type == 'teamstats':
-        languages = list(team.languages())
-        unique_languages = set(languages)
         summary = u'Members by language (all time)'
         numbers = []
-        for l in unique_languages:
-            numbers.append((strip_strings_chrome(ALL_LANGUAGES_DICT[l]), languages.count(l), ALL_LANGUAGES_DICT[l]))
+        for l, counts in language_totals(team).items():
+            if counts['members_joined'] > 0:
+                numbers.append((strip_strings_chrome(ALL_LANGUAGES_DICT[l]), counts['members_joined'], ALL_LANGUAGES_DICT[l]))
         title = ''
         graph = plot(numbers, graph_type='HorizontalBar', title=title, max_entries=25, labels=True, total_label="Members: ")
-        languages_recent = list(team.languages(members_joined_since=30))
-        unique_languages_recent = set(languages_recent)
         summary_recent = u'New members by language (past 30 days)'
         numbers_recent = []
-        for l in unique_languages_recent:
+        for l, counts in language_totals(team, since=30).items():
+            if counts['members_joined'] <= 0:
+                continue
             numbers_recent.append(
                 (strip_strings_chrome(ALL_LANGUAGES_DICT[l]),
-                 languages_recent.count(l),
+                 counts['members_joined'],
                  ALL_LANGUAGES_DICT[l],
                  "%s://%s%s" % (DEFAULT_PROTOCOL, Site.objects.get_current().domain, reverse('teams:detail_members', args=[], kwargs={'slug': team.slug}) + "?sort=-joined&lang=%s" % l))
                 )
@@ -89,36 +298,15 @@ def compute_statistics(team, stats_type):
         summary_table = []
         summary_table.append([TableCell("", header=True), TableCell("all time", header=True), TableCell("past 30 days", header=True)])
         summary_table.append([TableCell("members joined", header=True), TableCell(str(team.members_count)), TableCell(str(team.members_count_since(30)))])
-        summary_table.append([TableCell("member languages", header=True), TableCell(str(len(unique_languages))), TableCell(str(len(unique_languages_recent)))])
-
-        active_users = {}
-        for sv in team.active_users():
-            if sv[0] in active_users:
-                active_users[sv[0]].add(sv[1])
-            else:
-                active_users[sv[0]] = set([sv[1]])
-
-        most_active_users = active_users.items()
-        most_active_users.sort(reverse=True, key=lambda x: len(x[1]))
-        if len(most_active_users) > 20:
-            most_active_users = most_active_users[:20]
-
-        active_users_recent = {}
-        for sv in team.active_users(since=30):
-            if sv[0] in active_users_recent:
-                active_users_recent[sv[0]].add(sv[1])
-            else:
-                active_users_recent[sv[0]] = set([sv[1]])
-
-        most_active_users_recent = active_users_recent.items()
-        most_active_users_recent.sort(reverse=True, key=lambda x: len(x[1]))
-        if len(most_active_users_recent) > 20:
-            most_active_users_recent = most_active_users_recent[:20]
+        summary_table.append([TableCell("member languages", header=True), TableCell(str(len(numbers))), TableCell(str(len(numbers_recent)))])
+
+        most_active_users = top_contributors(team)
+        most_active_users_recent = top_contributors(team, since=30)
 
         def displayable_user(user, users_details):
             user_details = users_details[user[0]]
             return (strip_strings_chrome("%s %s (%s)" % (user_details[1], user_details[2], user_details[3])),
-                    len(user[1]),
+                    user[1],
                     "%s %s (%s)" % (user_details[1], user_details[2], user_details[3]),
                     "%s://%s%s" % (DEFAULT_PROTOCOL, Site.objects.get_current().domain, reverse("profiles:profile", kwargs={'user_id': str(user[0])}))
             )
@@ -11,8 +11,7 @@ from django.db.models import F
 from django.utils.translation import ugettext_lazy as _
 from haystack import site
 
-from utils import send_templated_email
-from utils.metrics import Gauge, Meter
+from utils.metrics import Gauge
 from widget.video_cache import (
     invalidate_cache as invalidate_video_cache,
     invalidate_video_moderation,
@@ -103,39 +102,39 @@ def add_videos_notification_hourly(*args, **kwargs):
     _notify_teams_of_new_videos(team_qs)
 
 def _notify_teams_of_new_videos(team_qs):
-    from messages.tasks import _team_sends_notification
+    from messages import fanout
+    from messages.tasks import _team_sends_notification, send_notification
     from teams.models import TeamVideo
     domain = Site.objects.get_current().domain
 
     for team in team_qs:
         if not _team_sends_notification(team, 'block_new_video_message'):
             continue
-        team_videos = TeamVideo.objects.filter(team=team, created__gt=team.last_notification_time)
+        team_videos = list(TeamVideo.objects.filter(
+            team=team, created__gt=team.last_notification_time))
 
         team.last_notification_time = datetime.now()
         team.save()
-        members = team.users.filter( notify_by_email=True, is_active=True) \
-            .distinct()
+        member_ids = team.users.filter( notify_by_email=True, is_active=True) \
+            .distinct().values_list('id', flat=True)
 
         subject = fmt(_(u'New %(team)s videos ready for subtitling!'),
                       team=team)
 
-        for user in members:
-            if not user.email:
-                continue
-
-            context = {
+        # The email is the same for every member, so we can render it once
+        notification = fanout.Notification(
+            subject,
+            context={
                 'domain': domain,
-                'user': user,
                 'team': team,
                 'team_videos': team_videos,
                 "STATIC_URL": settings.STATIC_URL,
-            }
-
-            Meter('templated-emails-sent-by-type.team.new-videos-ready').inc()
-            send_templated_email(user, subject,
-                                 'teams/email_new_videos.html',
-                                 context, fail_silently=not settings.DEBUG)
+            },
+            email_template='teams/email_new_videos.html',
+            per_user=False,
+            meter_name='templated-emails-sent-by-type.team.new-videos-ready',
+            fail_silently=not settings.DEBUG)
+        send_notification(notification, member_ids)
 
 
 @task()
@@ -180,6 +179,59 @@ def api_notify_on_application_activity(team_pk, event_name, application_pk):
     TeamNotificationSetting.objects.notify_team(
         team_pk, event_name, application_pk=application_pk)
 
+@task()
+def deliver_team_notifications(setting_id):
+    """Send due notifications from the TeamNotificationDelivery outbox."""
+    from teams import notification_delivery
+    notification_delivery.deliver(setting_id)
+
+@task()
+def check_team_notification_outbox():
+    from teams import notification_delivery
+    notification_delivery.check_outbox()
+
+@task()
+def purge_sent_team_notifications():
+    from teams import notification_delivery
+    notification_delivery.purge_sent()
+
+@task()
+def move_team_videos_batch(job_id, position):
+    """Move the next batch of videos for a bulk move.
+
+    See teams.bulk_move for details.
+    """
+    from teams import bulk_move
+    next_position = bulk_move.run_batch(job_id, position)
+    if next_position is not None:
+        move_team_videos_batch.delay(job_id, next_position)
+
+@task()
+def update_moved_team_videos(team_video_ids):
+    from teams import bulk_move
+    bulk_move.update_moved_team_videos(team_video_ids)
+
+@task()
+def rebuild_team_stats(team_id):
+    from teams import statistics
+    from teams.models import Team
+    try:
+        team = Team.objects.get(id=team_id)
+    except Team.DoesNotExist:
+        return
+    statistics.rebuild(team)
+
+@task()
+def rebuild_all_team_stats():
+    """Rebuild the statistics rollups for every team.
+
+    This fixes up the changes that the rollups don't track as they happen
+    (see teams.statistics).
+    """
+    from teams.models import Team
+    for team_id in Team.objects.values_list('id', flat=True):
+        rebuild_team_stats.delay(team_id)
+
 
 @task
 def gauge_teams():
@@ -0,0 +1,141 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+import datetime
+
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from teams import notification_delivery
+from teams.models import TeamNotificationSetting, TeamNotificationDelivery
+from teams.notifications import BaseNotification
+from utils.factories import *
+
+class CustomRequestNotification(BaseNotification):
+    def send_http_request(self, url, basic_auth_username,
+                          basic_auth_password):
+        return True, 'custom'
+
+class NotificationDeliveryTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.setting = TeamNotificationSetting.objects.create(
+            team=self.team, request_url='http://example.com/callback')
+        self.notification_class = BaseNotification
+        patcher = mock.patch.object(TeamNotificationSetting,
+                                    'get_notification_class',
+                                    lambda setting: self.notification_class)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # get_api_url() depends on the apiv2 app, which may not be installed
+        patcher = mock.patch.object(BaseNotification, 'get_api_url',
+                                    lambda notification: '/api/test/')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('teams.notification_delivery.post_payload')
+        self.post_payload = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.set_response_status(200)
+
+    def set_response_status(self, status):
+        self.post_payload.return_value = (mock.Mock(status=status), '')
+
+    def notify(self, event_name='video-new'):
+        return TeamNotificationSetting.objects.notify_team(self.team.pk,
+                                                           event_name)
+
+    def deliver(self):
+        # Pretend that we're running after the coalesce window has passed
+        now = datetime.datetime.now() + datetime.timedelta(hours=1)
+        notification_delivery.deliver(self.setting.pk, now=now)
+
+    def get_delivery(self):
+        return TeamNotificationDelivery.objects.get(setting=self.setting)
+
+    def test_deliver(self):
+        self.notify()
+        assert_equal(self.post_payload.call_count, 0)
+        self.deliver()
+        assert_equal(self.post_payload.call_count, 1)
+        url, data = self.post_payload.call_args[0][1:]
+        assert_equal(url, 'http://example.com/callback')
+        assert_equal(data['event'], 'video-new')
+        assert_equal(data['team'], self.team.slug)
+        assert_equal(data['api_url'], '/api/test/')
+        delivery = self.get_delivery()
+        assert_equal(delivery.status, TeamNotificationDelivery.STATUS_SENT)
+        assert_not_equal(delivery.sent, None)
+
+    def test_coalesce(self):
+        self.notify()
+        self.notify()
+        self.notify('video-edited')
+        assert_equal(TeamNotificationDelivery.objects.count(), 2)
+        delivery = TeamNotificationDelivery.objects.get(
+            event_name='video-new')
+        assert_equal(delivery.coalesced, 1)
+        self.deliver()
+        assert_equal(self.post_payload.call_count, 2)
+
+    def test_retry(self):
+        self.set_response_status(500)
+        self.notify()
+        self.deliver()
+        delivery = self.get_delivery()
+        assert_equal(delivery.status, TeamNotificationDelivery.STATUS_PENDING)
+        assert_equal(delivery.attempts, 1)
+        assert_true(delivery.last_error.startswith('HTTP 500'))
+        assert_true(delivery.next_attempt > datetime.datetime.now())
+        # once the delivery is due again, we should retry it
+        self.set_response_status(200)
+        self.deliver()
+        delivery = self.get_delivery()
+        assert_equal(delivery.status, TeamNotificationDelivery.STATUS_SENT)
+        assert_equal(delivery.attempts, 2)
+
+    def test_give_up(self):
+        self.set_response_status(500)
+        self.notify()
+        with self.settings(TEAM_NOTIFICATION_MAX_ATTEMPTS=2):
+            self.deliver()
+            self.deliver()
+        delivery = self.get_delivery()
+        assert_equal(delivery.status, TeamNotificationDelivery.STATUS_FAILED)
+        self.deliver()
+        assert_equal(self.post_payload.call_count, 2)
+
+    def test_concurrency_limit(self):
+        self.notify()
+        with self.settings(TEAM_NOTIFICATION_MAX_CONCURRENCY=1):
+            slot = notification_delivery._acquire_slot(self.setting.pk)
+            self.deliver()
+            assert_equal(self.post_payload.call_count, 0)
+            notification_delivery._release_slot(slot)
+            self.deliver()
+            assert_equal(self.post_payload.call_count, 1)
+
+    def test_custom_send_http_request(self):
+        # Notification classes that override send_http_request() get sent
+        # right away
+        self.notification_class = CustomRequestNotification
+        assert_equal(self.notify(), None)
+        setting = TeamNotificationSetting.objects.get(pk=self.setting.pk)
+        assert_equal(setting.notify('video-new'), (True, 'custom'))
+        assert_equal(TeamNotificationDelivery.objects.count(), 0)
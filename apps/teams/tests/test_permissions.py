@@ -38,7 +38,9 @@ from teams.permissions import (
     can_create_task_translate, can_join_team, can_edit_video, can_approve,
     roles_user_can_invite, can_add_video_somewhere, can_assign_tasks,
     can_create_and_edit_translations, save_role, can_remove_video,
-    can_delete_team, can_delete_video, can_post_edit_subtitles
+    can_delete_team, can_delete_video, can_post_edit_subtitles,
+    add_narrowing_to_member, get_permission_context, add_task_permissions,
+    can_perform_task, can_assign_task, can_decline_task, can_delete_task
 )
 
 
@@ -1175,3 +1177,68 @@ class TestViews(BaseTestPermission):
         save_role(self.team, member, role, [], [], owner.user)
         self.team.uncache_member(member.user)
         self.assertEquals(self.team.get_member(member.user).role, role)
+
+class PermissionContextTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.team = TeamFactory(manager=self.user)
+        self.project = ProjectFactory(team=self.team)
+        self.other_project = ProjectFactory(team=self.team)
+        self.member = self.team.get_member(self.user)
+
+    def test_role_for_target(self):
+        add_narrowing_to_member(self.member, project=self.project)
+        add_narrowing_to_member(self.member, language='en')
+        self.team.uncache_member(self.user)
+        context = get_permission_context(self.user, self.team)
+        self.assertEquals(context.role_for_target(self.project, 'en'),
+                          ROLE_MANAGER)
+        self.assertEquals(context.role_for_target(self.other_project, 'en'),
+                          ROLE_CONTRIBUTOR)
+        self.assertEquals(context.role_for_target(self.project, 'fr'),
+                          ROLE_CONTRIBUTOR)
+        self.assertEquals(context.role_for_target(None, 'en'),
+                          ROLE_CONTRIBUTOR)
+
+    def test_cached(self):
+        context = get_permission_context(self.user, self.team)
+        self.assertTrue(get_permission_context(self.user, self.team)
+                        is context)
+        self.team.uncache_member(self.user)
+        self.assertFalse(get_permission_context(self.user, self.team)
+                         is context)
+
+    def test_context_for_other_user(self):
+        # If we're passed a context for a different user, we should ignore
+        # it
+        other_user = UserFactory()
+        context = get_permission_context(self.user, self.team)
+        other_context = get_permission_context(other_user, self.team,
+                                               context)
+        self.assertEquals(other_context.user, other_user)
+        self.assertEquals(other_context.role, ROLE_OUTSIDER)
+
+    def test_add_task_permissions(self):
+        self.team.workflow_enabled = True
+        self.team.save()
+        WorkflowFactory(team=self.team)
+        tasks = []
+        for i in xrange(3):
+            team_video = TeamVideoFactory(team=self.team)
+            tasks.append(TaskFactory(team=self.team, team_video=team_video,
+                                     assignee=self.user if i == 0 else None))
+        tasks.append(TaskFactory(team=self.team, team_video=team_video,
+                                 type=Task.TYPE_IDS['Translate'],
+                                 language='fr'))
+        tasks = list(Task.objects.filter(id__in=[t.id for t in tasks])
+                     .select_related('team', 'team_video__team'))
+        add_task_permissions(self.user, tasks)
+        for task in tasks:
+            self.assertEquals(task.user_can_perform,
+                              can_perform_task(self.user, task))
+            self.assertEquals(task.user_can_assign,
+                              can_assign_task(task, self.user))
+            self.assertEquals(task.user_can_decline,
+                              can_decline_task(task, self.user))
+            self.assertEquals(task.user_can_delete,
+                              can_delete_task(task, self.user))
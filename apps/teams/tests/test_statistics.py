@@ -0,0 +1,177 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.core.management import call_command
+from django.test import TestCase
+from nose.tools import *
+
+from subtitles import pipeline
+from teams import statistics, tasks
+from teams.models import TeamLanguageStats, TeamContributorStats
+from utils.factories import *
+
+class TeamStatisticsTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.video = TeamVideoFactory(team=self.team).video
+        self.user = UserFactory()
+
+    def stats_rows(self):
+        # Rows where all counters went back to 0 are the same as missing rows
+        language_rows = [
+            row for row in TeamLanguageStats.objects
+            .filter(team=self.team)
+            .values_list('language_code', 'date', 'languages_added',
+                         'languages_published', 'members_joined')
+            if any(row[2:])
+        ]
+        contributor_rows = [
+            row for row in TeamContributorStats.objects
+            .filter(team=self.team)
+            .values_list('user', 'date', 'languages')
+            if row[2]
+        ]
+        return sorted(language_rows), sorted(contributor_rows)
+
+    def test_languages(self):
+        pipeline.add_subtitles(self.video, 'en', None, author=self.user)
+        pipeline.add_subtitles(self.video, 'en', None, author=self.user)
+        pipeline.add_subtitles(self.video, 'fr', None, author=self.user,
+                               visibility='private')
+        totals = statistics.language_totals(self.team)
+        # Each language only counts once, no matter how many versions it has
+        assert_equal(totals['en']['languages_added'], 1)
+        assert_equal(totals['en']['languages_published'], 0)
+        assert_equal(totals['fr']['languages_added'], 1)
+        assert_equal(totals['fr']['languages_published'], 0)
+        assert_equal(statistics.top_contributors(self.team),
+                     [(self.user.id, 1)])
+
+    def test_complete(self):
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               author=self.user, complete=True)
+        totals = statistics.language_totals(self.team)
+        assert_equal(totals['en']['languages_added'], 1)
+        assert_equal(totals['en']['languages_published'], 1)
+        # Adding another complete version shouldn't count it again
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               author=self.user, complete=True)
+        totals = statistics.language_totals(self.team)
+        assert_equal(totals['en']['languages_published'], 1)
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               author=self.user, complete=False)
+        totals = statistics.language_totals(self.team)
+        assert_equal(totals['en']['languages_added'], 1)
+        assert_equal(totals['en']['languages_published'], 0)
+
+    def test_uncomplete_before_rollups(self):
+        # Languages that were completed before we tracked the rollups
+        # shouldn't result in negative counts.
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               author=self.user, complete=True)
+        TeamLanguageStats.objects.all().delete()
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               author=self.user, complete=False)
+        assert_equal(TeamLanguageStats.objects.count(), 0)
+
+    def test_contributors(self):
+        other_user = UserFactory()
+        pipeline.add_subtitles(self.video, 'en', None, author=self.user)
+        pipeline.add_subtitles(self.video, 'en', None, author=self.user)
+        pipeline.add_subtitles(self.video, 'fr', None, author=self.user)
+        pipeline.add_subtitles(self.video, 'fr', None, author=other_user)
+        # Contributors are counted once per language
+        assert_equal(statistics.top_contributors(self.team),
+                     [(self.user.id, 2), (other_user.id, 1)])
+
+    def test_publish(self):
+        version = pipeline.add_subtitles(self.video, 'fr', None,
+                                         author=self.user,
+                                         visibility='private')
+        assert_equal(statistics.top_contributors(self.team), [])
+        version.publish()
+        assert_equal(statistics.top_contributors(self.team),
+                     [(self.user.id, 1)])
+        # publishing a public version shouldn't count it again
+        version.publish()
+        assert_equal(statistics.top_contributors(self.team),
+                     [(self.user.id, 1)])
+
+    def test_non_team_video(self):
+        pipeline.add_subtitles(VideoFactory(), 'en', SubtitleSetFactory(),
+                               author=self.user, complete=True)
+        assert_equal(TeamLanguageStats.objects.count(), 0)
+        assert_equal(TeamContributorStats.objects.count(), 0)
+
+    def test_members(self):
+        member = TeamMemberFactory(team=self.team,
+                                   user=UserFactory(languages=['en', 'fr']))
+        TeamMemberFactory(team=self.team, user=UserFactory(languages=['en']))
+        totals = statistics.language_totals(self.team)
+        assert_equal(totals['en']['members_joined'], 2)
+        assert_equal(totals['fr']['members_joined'], 1)
+        member.delete()
+        totals = statistics.language_totals(self.team, since=30)
+        assert_equal(totals['en']['members_joined'], 1)
+        assert_equal(totals['fr']['members_joined'], 0)
+
+    def test_member_left_before_rollups(self):
+        # Members who joined before we tracked the rollups shouldn't result in
+        # negative counts when they leave.
+        member = TeamMemberFactory(team=self.team,
+                                   user=UserFactory(languages=['en']))
+        TeamLanguageStats.objects.all().delete()
+        member.delete()
+        assert_equal(TeamLanguageStats.objects.count(), 0)
+
+    def make_rebuild_data(self):
+        pipeline.add_subtitles(self.video, 'en', None, author=self.user)
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               author=self.user, complete=True)
+        version = pipeline.add_subtitles(self.video, 'fr', None,
+                                         author=self.user,
+                                         visibility='private')
+        version.publish()
+        pipeline.add_subtitles(self.video, 'de', None, author=self.user,
+                               visibility='private')
+        pipeline.add_subtitles(self.video, 'es', SubtitleSetFactory(),
+                               author=self.user, complete=True)
+        pipeline.add_subtitles(self.video, 'es', SubtitleSetFactory(),
+                               author=UserFactory(), complete=False)
+        member = TeamMemberFactory(team=self.team,
+                                   user=UserFactory(languages=['en', 'fr']))
+        TeamMemberFactory(team=self.team, user=UserFactory(languages=['en']))
+        member.delete()
+
+    def test_rebuild(self):
+        self.make_rebuild_data()
+        incremental_rows = self.stats_rows()
+        TeamLanguageStats.objects.all().update(languages_added=100)
+        TeamContributorStats.objects.all().delete()
+        call_command('rebuild_team_stats', self.team.slug)
+        assert_equal(self.stats_rows(), incremental_rows)
+
+    def test_rebuild_task(self):
+        self.make_rebuild_data()
+        incremental_rows = self.stats_rows()
+        TeamLanguageStats.objects.all().delete()
+        TeamContributorStats.objects.all().delete()
+        tasks.rebuild_all_team_stats.delay()
+        assert_equal(self.stats_rows(), incremental_rows)
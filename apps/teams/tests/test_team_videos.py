@@ -24,7 +24,9 @@ from django.test import TestCase
 import mock
 
 from caching.tests.utils import assert_invalidates_model_cache
-from teams.models import Project, TeamVideoMigration
+from teams import bulk_move
+from teams.models import (Project, Task, TeamVideo, TeamVideoMigration,
+                          TeamVideoMoveJob)
 from utils import test_utils
 from utils.factories import *
 
@@ -83,3 +85,74 @@ class TeamMoveTest(TestCase):
         self.check_migration(migrations[2], datetime(2013, 01, 03),
                              self.team, self.team2, self.project2)
 
+class BulkMoveTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.project = Project.objects.create(team=self.team, name='project1')
+        self.team2 = TeamFactory()
+        self.project2 = Project.objects.create(team=self.team2,
+                                               name='project2')
+        self.team_videos = [TeamVideoFactory(team=self.team)
+                            for i in xrange(3)]
+
+    def team_video_ids(self):
+        return [tv.id for tv in self.team_videos]
+
+    def reload_team_videos(self):
+        return list(TeamVideo.objects.filter(id__in=self.team_video_ids())
+                    .order_by('id'))
+
+    def test_move(self):
+        task = TaskFactory(team=self.team, team_video=self.team_videos[0])
+        with self.settings(BULK_MOVE_BATCH_SIZE=2):
+            job = bulk_move.start(self.team_video_ids(), self.team2,
+                                  project=self.project2)
+        for team_video in self.reload_team_videos():
+            self.assertEquals(team_video.team, self.team2)
+            self.assertEquals(team_video.project, self.project2)
+        self.assertEquals(TeamVideoMigration.objects.count(), 3)
+        self.assertTrue(Task.objects.get(id=task.id).deleted)
+        job = TeamVideoMoveJob.objects.get(id=job.id)
+        self.assertEquals(job.processed, 3)
+        self.assertNotEquals(job.finished, None)
+
+    def test_default_project(self):
+        bulk_move.start(self.team_video_ids(), self.team2)
+        for team_video in self.reload_team_videos():
+            self.assertEquals(team_video.project, self.team2.default_project)
+
+    @test_utils.patch_for_test('teams.bulk_move.queue_update')
+    def test_move_within_team(self, mock_queue_update):
+        bulk_move.start(self.team_video_ids(), self.team,
+                        project=self.project)
+        for team_video in self.reload_team_videos():
+            self.assertEquals(team_video.team, self.team)
+            self.assertEquals(team_video.project, self.project)
+        self.assertEquals(TeamVideoMigration.objects.count(), 0)
+        # the search index stores the project, so the videos should get
+        # reindexed
+        self.assertEquals(
+            sorted(args[1] for args, kwargs in
+                   mock_queue_update.call_args_list),
+            self.team_video_ids())
+
+    @test_utils.patch_for_test('teams.tasks.move_team_videos_batch.delay')
+    def test_progress(self, mock_delay):
+        with self.settings(BULK_MOVE_BATCH_SIZE=1):
+            job = bulk_move.start(self.team_video_ids(), self.team2)
+            self.assertEquals(bulk_move.run_batch(job.id, 0), 1)
+            job = TeamVideoMoveJob.objects.get(id=job.id)
+            self.assertEquals(job.progress_display(), u'1/3')
+            self.assertEquals(bulk_move.run_batch(job.id, 1), 2)
+            self.assertEquals(bulk_move.run_batch(job.id, 2), None)
+        job = TeamVideoMoveJob.objects.get(id=job.id)
+        self.assertEquals(job.progress_display(), u'finished')
+
+    @test_utils.patch_for_test('teams.tasks.move_team_videos_batch.delay')
+    def test_batch_already_done(self, mock_delay):
+        # If 2 tasks try to run the same batch, only 1 should move the videos
+        with self.settings(BULK_MOVE_BATCH_SIZE=1):
+            job = bulk_move.start(self.team_video_ids(), self.team2)
+            bulk_move.run_batch(job.id, 0)
+            self.assertEquals(bulk_move.run_batch(job.id, 0), None)
+        self.assertEquals(TeamVideoMigration.objects.count(), 1)
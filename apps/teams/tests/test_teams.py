@@ -65,17 +65,18 @@ class TestNotification(TestCase):
         self.assertEqual(self.team.users.count(), 1)
 
 
-        #mockup for send_templated_email to test context of email
-        import utils
+        #mockup for render_templated_email_body to test context of email
+        from messages import fanout
 
-        send_templated_email = utils.send_templated_email
+        render_templated_email_body = fanout.render_templated_email_body
 
-        def send_templated_email_mockup(to, subject, body_template, body_dict, *args, **kwargs):
+        def send_templated_email_mockup(body_template, body_dict):
             send_templated_email_mockup.context = body_dict
-            send_templated_email(to, subject, body_template, body_dict, *args, **kwargs)
+            return render_templated_email_body(body_template, body_dict)
 
-        utils.send_templated_email = send_templated_email_mockup
-        reload(tasks)
+        fanout.render_templated_email_body = send_templated_email_mockup
+        self.addCleanup(setattr, fanout, 'render_templated_email_body',
+                        render_templated_email_body)
 
         #test notification about two new videos
         TeamVideo.objects.filter(pk__in=[self.tv1.pk, self.tv2.pk]).update(created=datetime.today())
@@ -223,7 +224,7 @@ class TeamVideoTest(TestCase):
         }
 
         response = self.client.post(url, data, follow=True)
-        test_utils.update_search_index.run_original()
+        test_utils.queue_search_index_update.run_original()
         self.failUnlessEqual(response.status_code, 200)
         self.assertFalse(Team.objects.get(id=1).is_visible)
 
@@ -236,7 +237,7 @@ class TeamVideoTest(TestCase):
         data['is_visible'] = u'1'
 
         response = self.client.post(url, data, follow=True)
-        test_utils.update_search_index.run_original()
+        test_utils.queue_search_index_update.run_original()
         self.failUnlessEqual(response.status_code, 200)
         self.assertTrue(Team.objects.get(id=1).is_visible)
 
@@ -67,7 +67,8 @@ from teams.permissions import (
     roles_user_can_assign, can_join_team, can_edit_video, can_delete_tasks,
     can_perform_task, can_rename_team, can_change_team_settings,
     can_perform_task_for, can_delete_team, can_delete_video, can_remove_video,
-    can_delete_language, can_move_videos, can_view_stats_tab, can_sort_by_primary_language
+    can_delete_language, can_move_videos, can_view_stats_tab, can_sort_by_primary_language,
+    add_task_permissions
 )
 from teams.signals import api_teamvideo_new
 from teams.tasks import (
@@ -93,6 +94,7 @@ from videos.models import Action, VideoUrl, Video, VideoFeed
 from subtitles.models import SubtitleLanguage, SubtitleVersion
 from widget.rpc import add_general_settings
 from widget.views import base_widget_params
+from teams import bulk_move
 from teams import workflows
 from statistics import compute_statistics
 
@@ -592,17 +594,25 @@ def move_videos(request, slug, project_slug=None, languages=None):
                     return  HttpResponseBadRequest("Illegal Request")
                 except MultipleObjectsReturned:
                     return  HttpResponseServerError("Internal Error")
-            selected_videos = request.POST.getlist('selected_videos[]')
-            for video_id in selected_videos:
-                try:
-                    team_video = TeamVideo.objects.get(id=video_id)
-                    if team_video.team not in managed_teams:
-                        return  HttpResponseForbidden("Not allowed")
-                    team_video.move_to(target_team, project=target_project)
-                except Entry.DoesNotExist:
-                    return  HttpResponseBadRequest("Illegal Request")
-                except MultipleObjectsReturned:
-                    return  HttpResponseServerError("Internal Error")
+            try:
+                selected_videos = set(
+                    int(team_video_id) for team_video_id in
+                    request.POST.getlist('selected_videos[]'))
+            except ValueError:
+                return  HttpResponseBadRequest("Illegal Request")
+            team_videos = TeamVideo.objects.filter(id__in=selected_videos)
+            if team_videos.count() != len(selected_videos):
+                return  HttpResponseBadRequest("Illegal Request")
+            if team_videos.exclude(team__in=managed_teams).exists():
+                return  HttpResponseForbidden("Not allowed")
+            if selected_videos:
+                job = bulk_move.start(sorted(selected_videos), target_team,
+                                      project=target_project,
+                                      user=request.user)
+                messages.success(request, fmt(
+                    _(u'Moving %(count)s videos to %(team)s.  Large moves '
+                      u'may take a few minutes to complete.'),
+                    count=job.total, team=target_team.name))
     else:
         form = MoveVideosForm(request.user)
      
@@ -932,8 +942,10 @@ def statistics(request, slug, tab='teamstats'):
     if cached_context:
         context = pickle.loads(cached_context)
     else:
+        # compute_statistics() reads from the stats rollup tables, so it's
+        # fast enough that we only need to cache it for a short time.
         context = compute_statistics(team, stats_type=tab)
-        cache.set(cache_key, pickle.dumps(context), 60*60*24)
+        cache.set(cache_key, pickle.dumps(context), 60*10)
     context['activity_tab'] = tab
     context['team'] = team
     return render(request, 'teams/statistics.html', context)
@@ -1757,6 +1769,7 @@ def team_tasks(request, slug, project_slug=None):
     add_general_settings(request, widget_settings)
 
     Task.add_cached_video_urls(tasks)
+    add_task_permissions(request.user, tasks)
 
     context = {
         'team': team,
@@ -49,9 +49,15 @@ def get_cached_video_from_code(cache_pattern):
     """
     def decorator(func):
         def wrapper(request, video_id, *args, **kwargs):
+            # Fetch the user's cache data together with the video's
+            user_cache_group = request.get_user_cache_group()
+            if user_cache_group is not None:
+                extra_cache_groups = [user_cache_group]
+            else:
+                extra_cache_groups = None
             try:
-                video = Video.cache.get_instance_by_video_id(video_id,
-                                                             cache_pattern)
+                video = Video.cache.get_instance_by_video_id(
+                    video_id, cache_pattern, extra_cache_groups)
             except Video.DoesNotExist:
                 raise Http404
             request.use_cached_user()
@@ -16,36 +16,85 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
-"""videos.feed_parser.import -- Import videos from a feed."""
+"""videos.feed_parser.import -- Import videos from a feed.
+
+Importing works a page at a time.  While we create the videos for one page,
+we fetch the next page in a background thread.  The per-entry work that
+might hit the network (VideoType.set_values(), owner_username()) runs in a
+bounded thread pool, then the new Video/VideoUrl rows for the page get
+created with bulk inserts.  The size of the pool is controlled by the
+FEED_FETCH_CONCURRENCY setting.
+"""
+
+from multiprocessing.pool import ThreadPool
+import os
+
+from django.conf import settings
 
 from .parser import FeedParser
+from utils.metrics import Meter
+
+# Maps pid -> ThreadPool.  We store the pid so that we don't try to use the
+# parent's threads after a fork.
+_pools = {}
+
+def get_pool():
+    pid = os.getpid()
+    if pid not in _pools:
+        _pools.clear()
+        _pools[pid] = ThreadPool(getattr(settings, 'FEED_FETCH_CONCURRENCY',
+                                         4))
+    return _pools[pid]
+
+def prepare_video(args):
+    from videos.models import Video
+    video_type, info, user = args
+    return Video.prepare_for_video_type(video_type, user, set_values=info)
 
 class VideoImporter(object):
     """Import videos from a feed URL."""
-    def __init__(self, url, user):
+    def __init__(self, url, user, etag=None, modified=None):
         """Create a VideoImporter
 
         :param url: feed url
         :param user: User that creates videos for
+        :param etag: ETag from the last time we fetched the feed
+        :param modified: Last-Modified value from the last time we fetched
+        the feed
         """
         self.url = url
         self.user = user
+        self.etag = etag
+        self.modified = modified
+        self.not_modified = False
         self.checked_entries = 0
         self.last_link = ''
 
     def import_videos(self, import_next=False):
         self._created_videos = []
-        feed_parser = FeedParser(self.url)
+        self._seen_urls = set()
+        feed_parser = FeedParser(self.url, etag=self.etag,
+                                 modified=self.modified)
+        if getattr(feed_parser.feed, 'status', None) == 304:
+            # Feed hasn't changed since the last time we fetched it
+            self.not_modified = True
+            Meter('videos.feed-import.not-modified').inc()
+            return []
+        self.etag = getattr(feed_parser.feed, 'etag', None) or self.etag
+        self.modified = (getattr(feed_parser.feed, 'modified', None) or
+                         self.modified)
         # the link at the top of the feed should be the latest link
         try:
             self.last_link = feed_parser.feed.entries[0]['link']
         except (IndexError, KeyError):
             pass
-        self._create_videos(feed_parser)
         if import_next and 'youtube' in self.url:
-            self._import_extra_links_from_youtube(feed_parser)
+            self._import_pages(feed_parser)
+        else:
+            self._create_videos(feed_parser)
         rv = self._created_videos
         del self._created_videos
+        del self._seen_urls
         return rv
 
     def _next_urls(self, feed_parser):
@@ -54,20 +103,34 @@ class VideoImporter(object):
             if link.get('rel') == 'next'
         ]
 
-    def _import_extra_links_from_youtube(self, main_feed_parser):
-        next_urls = self._next_urls(main_feed_parser)
+    def _import_pages(self, feed_parser):
+        """Import a feed page and all pages linked with rel=next.
 
-        while next_urls:
-            url = next_urls[0]['href']
-            feed_parser = FeedParser(url)
-            last_created_video_count = len(self._created_videos)
-            self._create_videos(feed_parser)
+        We only know the URL of the next page after parsing the current one,
+        so we can't fetch them all at once.  Instead, we start fetching the
+        next page in the pool while we create the videos for the current
+        page.
+        """
+        pool = get_pool()
+        while feed_parser is not None:
             next_urls = self._next_urls(feed_parser)
+            if next_urls:
+                next_page = pool.apply_async(FeedParser,
+                                             (next_urls[0]['href'],))
+            else:
+                next_page = None
+            self._create_videos(feed_parser)
+            if next_page is not None:
+                feed_parser = next_page.get()
+                Meter('videos.feed-import.pages-fetched').inc()
+            else:
+                feed_parser = None
 
     def _create_videos(self, feed_parser):
-        from videos.models import VideoUrl
+        from videos.models import Video, VideoUrl
 
         items = list(feed_parser.items(ignore_error=True))
+        self.checked_entries += len(items)
 
         urls = [
             vt.convert_to_video_url()
@@ -77,21 +140,20 @@ class VideoImporter(object):
         existing_urls = set(VideoUrl.objects
                             .filter(url__in=urls)
                             .values_list('url', flat=True))
+        existing_urls.update(self._seen_urls)
 
+        to_create = []
         for vt, info, entry in items:
-            if vt and vt.convert_to_video_url() not in existing_urls:
-                self._create_video(vt, info, entry)
-            self.checked_entries += 1
-
-    def _create_video(self, video_type, info, entry):
-        from videos.models import Video
-        video, created = Video.get_or_create_for_url(
-            vt=video_type, user=self.user)
-        # created should always be True, since we filtered out existing items
-        # already, but check it anyways
-        if created:
-            if info:
-                for name, value in info.items():
-                    setattr(video, name, value)
-                video.save()
-            self._created_videos.append(video)
+            if vt is None:
+                continue
+            url = vt.convert_to_video_url()
+            if url not in existing_urls:
+                to_create.append((vt, info, self.user))
+                existing_urls.add(url)
+                self._seen_urls.add(url)
+        if not to_create:
+            return
+        prepared = get_pool().map(prepare_video, to_create)
+        self._created_videos.extend(
+            Video.bulk_create_prepared(prepared, self.user))
+        Meter('videos.feed-import.videos-created').inc(len(prepared))
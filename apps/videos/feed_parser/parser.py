@@ -41,9 +41,15 @@ class FeedParser(object):
     See videos.tests.TestFeedParser for details.
     """
 
-    def __init__(self, feed_url):
+    def __init__(self, feed_url, etag=None, modified=None):
+        """Fetch and parse a feed.
+
+        Pass etag/modified from a previous fetch to make a conditional GET.
+        If the feed hasn't changed, feed.status will be 304 and there won't
+        be any entries.
+        """
         self.feed_url = feed_url
-        self.feed = feedparser.parse(feed_url)
+        self.feed = feedparser.parse(feed_url, etag=etag, modified=modified)
         self.parser = None
 
     def items(self, reverse=False, until=False, since=False, ignore_error=False):
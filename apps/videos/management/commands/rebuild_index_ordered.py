@@ -1,10 +1,16 @@
-from django.db.models import get_app
+from optparse import make_option
+
+from django.db import reset_queries
+from django.db.models import get_app, Max, Min
 from django.conf import settings
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from haystack import site
 from haystack.management.commands.clear_index import Command as ClearCommand
 from haystack.management.commands.update_index import Command as UpdateCommand
+from utils.commands import reset_connections
 from utils.sets import OrderedSet
+from videos.models import Video
 
 def _get_app_labels(apps):
     app_labels = []
@@ -22,13 +28,41 @@ PRIORITY_APPS = list(OrderedSet(_get_app_labels(['teams'])))
 REMAINING_APPS = list(OrderedSet(a for a in _get_app_labels(settings.INSTALLED_APPS)
                             if a not in PRIORITY_APPS))
 
+def index_video_range(pk_range):
+    """Index the videos with start <= pk < end.
+
+    Returns the number of videos indexed.
+    """
+    start, end = pk_range
+    index = site.get_index(Video)
+    videos = list(index.index_queryset().filter(pk__gte=start, pk__lt=end))
+    if videos:
+        index.prepare_batch(videos)
+        index.backend.update(index, videos)
+    # Clear out the DB connections queries because it bloats up RAM.
+    reset_queries()
+    return len(videos)
+
+def worker(pk_range):
+    reset_connections()
+    return index_video_range(pk_range)
 
 class Command(BaseCommand):
     help = "Rebuilds the search index from scratch in a useful order."
-    option_list = BaseCommand.option_list + ClearCommand.base_options
+    option_list = BaseCommand.option_list + ClearCommand.base_options + (
+        make_option('--workers', action='store', dest='video_workers',
+                    type='int', default=0,
+                    help='Number of worker processes to index videos with.  '
+                    '0 means index them in this process.'),
+        make_option('--video-batch-size', action='store',
+                    dest='video_batch_size', type='int', default=500,
+                    help='Size of the pk range each video batch handles'),
+    )
 
     def handle(self, **options):
         verbose = options.get('verbosity', 1) >= 1
+        workers = options.pop('video_workers', 0)
+        batch_size = options.pop('video_batch_size', 500)
 
         call_command('clear_index', **options)
 
@@ -39,4 +73,44 @@ class Command(BaseCommand):
 
         if verbose:
             print "\nUpdating Remaining Apps", '-' * 39
-        call_command('update_index', *REMAINING_APPS, **options)
+        call_command('update_index',
+                     *[a for a in REMAINING_APPS if a != 'videos'],
+                     **options)
+
+        if verbose:
+            print "\nUpdating Videos", '-' * 47
+        self.index_videos(workers, batch_size, verbose)
+
+    def index_videos(self, workers, batch_size, verbose):
+        pk_ranges = self.calc_pk_ranges(batch_size)
+        if workers > 0:
+            import multiprocessing
+            pool = multiprocessing.Pool(workers)
+            try:
+                self.report_progress(pool.imap_unordered(worker, pk_ranges),
+                                     len(pk_ranges), verbose)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            self.report_progress(
+                (index_video_range(r) for r in pk_ranges), len(pk_ranges),
+                verbose)
+
+    def report_progress(self, results, batch_count, verbose):
+        total = 0
+        for i, count in enumerate(results):
+            total += count
+            if verbose:
+                print "  batch %s/%s done (%s videos indexed)" % (
+                    i + 1, batch_count, total)
+
+    def calc_pk_ranges(self, batch_size):
+        result = Video.objects.aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+        if result['min_pk'] is None:
+            return []
+        return [
+            (start, start + batch_size)
+            for start in xrange(result['min_pk'], result['max_pk'] + 1,
+                                batch_size)
+        ]
@@ -16,60 +16,108 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+"""Update the denormalized metadata fields on videos.
+
+Video has several fields that are calculated from its languages and team:
+is_public, is_subtitled, was_subtitled, languages_count, and complete_date.
+We calculate all of them from a single snapshot of the video's languages and
+their tips, then write the ones that changed using a single UPDATE.
+"""
+
 from datetime import datetime
 from utils.metrics import Timer
 
 def update_metadata(video_pk):
     from videos.models import Video
     with Timer('metadata-update-time'):
-        video = Video.objects.get(pk=video_pk)
-        video.edited = datetime.now()
-        video.save()
-        _update_is_public(video)
-        _update_is_was_subtitled(video)
-        _update_languages_count(video)
-        _update_complete_date(video)
-        _invalidate_cache(video)
-
-def _update_is_was_subtitled(video):
+        video = (Video.objects.select_related('teamvideo__team')
+                 .get(pk=video_pk))
+        languages = _fetch_languages([video])
+        _update_video(video, languages[video.id])
+
+def update_metadata_for_videos(video_pks, chunk_size=100):
+    """Update metadata for many videos at once.
+
+    This uses a fixed number of queries per chunk of videos to fetch the
+    data, plus 1 UPDATE for each video that changed.
+    """
+    from videos.models import Video
+    video_pks = list(video_pks)
+    for i in xrange(0, len(video_pks), chunk_size):
+        with Timer('metadata-update-time'):
+            videos = list(Video.objects.select_related('teamvideo__team')
+                          .filter(pk__in=video_pks[i:i+chunk_size]))
+            languages = _fetch_languages(videos)
+            for video in videos:
+                _update_video(video, languages[video.id])
+
+def _fetch_languages(videos):
+    """Fetch the languages for a list of videos
+
+    The extant tip of each language will be cached, so calling get_tip()
+    doesn't result in any extra queries.
+
+    Returns a dict mapping video ids to lists of languages.
+    """
     from subtitles.models import SubtitleLanguage
-    language_code = video.primary_audio_language_code
-    has_version = (SubtitleLanguage.objects.having_nonempty_tip()
-                                           .filter(video=video, 
-                                                   language_code=language_code)
-                                           .exists())
-
-    if not has_version:
-        if video.is_subtitled:
-            video.is_subtitled = False
-            video.save()
-    else:
-        if not video.is_subtitled or not video.was_subtitled:
-            video.is_subtitled = True
-            video.was_subtitled = True
-            video.save()
+    video_map = dict((video.id, video) for video in videos)
+    languages = dict((video.id, []) for video in videos)
+    qs = SubtitleLanguage.objects.filter(video__in=video_map.keys())
+    for language in qs.fetch_and_join(private_tips=True):
+        language.video = video_map[language.video_id]
+        languages[language.video_id].append(language)
+    return languages
+
+def _update_video(video, languages):
+    changes = _calc_changes(video, languages)
+    _save_changes(video, changes)
+    _invalidate_cache(video)
+
+def _has_nonempty_tip(language):
+    tip = language.get_tip()
+    return tip is not None and tip.subtitle_count > 0
 
-def _update_languages_count(video):
-    video.languages_count = video.newsubtitlelanguage_set.having_nonempty_tip().count()
-    video.save()
+def _calc_changes(video, languages):
+    """Calculate the changes to the metadata fields for a video.
 
-def _update_complete_date(video):
-    is_complete = video.is_complete
+    Returns a dict mapping field names to new values.  Only fields whose value
+    changed will be included.  edited is always included.
+    """
+    now = datetime.now()
+    nonempty_languages = [l for l in languages if _has_nonempty_tip(l)]
+    team_video = video.get_team_video()
+
+    new_values = {
+        'edited': now,
+        'is_public': team_video.team.is_visible if team_video else True,
+        'languages_count': len(nonempty_languages),
+    }
+
+    if any(l.language_code == video.primary_audio_language_code
+           for l in nonempty_languages):
+        new_values['is_subtitled'] = True
+        new_values['was_subtitled'] = True
+    else:
+        new_values['is_subtitled'] = False
+
+    is_complete = any(l.is_complete_and_synced() for l in languages)
     if is_complete and video.complete_date is None:
-        video.complete_date = datetime.now()
-        video.save()
-    elif not is_complete and video.complete_date is not None:
-        video.complete_date = None
-        video.save()
+        new_values['complete_date'] = now
+    elif not is_complete:
+        new_values['complete_date'] = None
+
+    return dict((name, value) for name, value in new_values.items()
+                if name == 'edited' or getattr(video, name) != value)
+
+def _save_changes(video, changes):
+    from videos.models import Video
+    for name, value in changes.items():
+        setattr(video, name, value)
+    Video.objects.filter(pk=video.pk).update(**changes)
+    # update() doesn't send post_save, so we need to invalidate the video's
+    # CacheGroup ourselves.
+    video.cache.invalidate()
 
 def _invalidate_cache(video):
     from widget import video_cache
     video_cache.invalidate_cache(video.video_id)
-
-def _update_is_public(video):
-    team_video = video.get_team_video()
-    if team_video:
-        video.is_public = team_video.team.is_visible
-    else:
-        video.is_public = True
-    video.save()
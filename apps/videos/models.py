@@ -42,7 +42,7 @@ from django.core.exceptions import ValidationError
 from django.forms.forms import NON_FIELD_ERRORS
 
 from auth.models import CustomUser as User, Awards
-from caching import ModelCacheManager
+from caching import ModelCacheManager, fetch_cache_groups
 from videos import behaviors
 from videos import metadata
 from videos import signals
@@ -148,8 +148,7 @@ EXISTS(
 class SubtitleLanguageFetcher(object):
     """Fetches/caches subtitle languages for videos."""
     def __init__(self):
-        self.cache = {}
-        self.all_languages_fetched = False
+        self.clear_cache()
 
     def fetch_one_language(self, video, language_code):
         if language_code in self.cache:
@@ -176,6 +175,11 @@ class SubtitleLanguageFetcher(object):
 
     def prefetch_languages(self, video, languages, with_public_tips,
                            with_private_tips):
+        if (languages is None and self.all_languages_fetched and
+            (self.public_tips_fetched or not with_public_tips) and
+            (self.private_tips_fetched or not with_private_tips)):
+            # Already fetched by prefetch_languages_for_videos()
+            return
         language_qs = video.newsubtitlelanguage_set.all()
         if languages is not None:
             language_qs = language_qs.filter(
@@ -186,19 +190,52 @@ class SubtitleLanguageFetcher(object):
         for lang in fetched_languages:
             self.cache[lang.language_code] = lang
         if languages is None:
-            self.all_languages_fetched = True
+            self.set_all_languages_fetched(with_public_tips,
+                                           with_private_tips)
+
+    def set_all_languages_fetched(self, with_public_tips, with_private_tips):
+        self.all_languages_fetched = True
+        self.public_tips_fetched = with_public_tips
+        self.private_tips_fetched = with_private_tips
 
     def clear_cache(self):
         self.cache = {}
         self.all_languages_fetched = False
+        self.public_tips_fetched = False
+        self.private_tips_fetched = False
+
+def prefetch_languages_for_videos(videos, with_public_tips=False,
+                                  with_private_tips=False):
+    """Prefetch and cache languages/versions for a list of videos
+
+    This works like Video.prefetch_languages(), but uses the same queries
+    for all of the videos.
+    """
+    from subtitles.models import SubtitleLanguage as NewSubtitleLanguage
+    if not videos:
+        return
+    video_map = dict((v.id, v) for v in videos)
+    languages = (NewSubtitleLanguage.objects
+                 .filter(video__in=video_map.keys())
+                 .fetch_and_join(public_tips=with_public_tips,
+                                 private_tips=with_private_tips,
+                                 video_map=video_map))
+    for video in videos:
+        video.clear_language_cache()
+    for lang in languages:
+        lang.video._language_fetcher.cache[lang.language_code] = lang
+    for video in videos:
+        video._language_fetcher.set_all_languages_fetched(with_public_tips,
+                                                          with_private_tips)
 
 class VideoCacheManager(ModelCacheManager):
     def __init__(self, cache_pattern=None):
         super(VideoCacheManager, self).__init__(cache_pattern)
         self._video_id_to_pk = {}
 
-    def get_instance(self, pk, cache_pattern=None):
-        video = super(VideoCacheManager, self).get_instance(pk, cache_pattern)
+    def get_instance(self, pk, cache_pattern=None, cache_group=None):
+        video = super(VideoCacheManager, self).get_instance(pk, cache_pattern,
+                                                            cache_group)
         # use a cached team_video as well
         video._cached_teamvideo = self._get_team_video_from_cache(video)
         return video
@@ -217,9 +254,22 @@ class VideoCacheManager(ModelCacheManager):
         video.cache.set_model('teamvideo', team_video)
         return team_video
 
-    def get_instance_by_video_id(self, video_id, cache_pattern=None):
-        return self.get_instance(self._pk_for_video_id(video_id),
-                                 cache_pattern)
+    def get_instance_by_video_id(self, video_id, cache_pattern=None,
+                                 extra_cache_groups=None):
+        """Get a cached video using its video_id
+
+        Args:
+            video_id: video_id of the video
+            cache_pattern: cache pattern to use for the video's CacheGroup
+            extra_cache_groups: other CacheGroups to fetch together with the
+                video's CacheGroup.  We will fetch all of them with one
+                get_many() call.
+        """
+        pk = self._pk_for_video_id(video_id)
+        cache_group = self.get_cache_group(pk, cache_pattern)
+        if extra_cache_groups:
+            fetch_cache_groups([cache_group] + list(extra_cache_groups))
+        return self.get_instance(pk, cache_pattern, cache_group)
 
     def _pk_for_video_id(self, video_id):
         # find the video PK using the video ID.  This should never take a long
@@ -308,9 +358,9 @@ class Video(models.Model):
         return title
 
     def update_search_index(self):
-        """Queue a Celery task that will update this video's Solr entry."""
-        from utils.celery_search_index import update_search_index
-        update_search_index.delay(self.__class__, self.pk)
+        """Queue an update to this video's Solr entry."""
+        from utils.celery_search_index import queue_update
+        queue_update(self.__class__, self.pk)
 
     def title_display(self, use_language_title=True):
         """
@@ -588,6 +638,105 @@ class Video(models.Model):
 
         return video, created
 
+    @classmethod
+    def prepare_for_video_type(cls, vt, user=None, set_values=None,
+                               fetch_subs_async=True):
+        """Build an unsaved Video and VideoUrl for a VideoType.
+
+        This does the part of get_or_create_for_url() that might need network
+        requests, but doesn't touch the DB.  Use bulk_create_prepared() to
+        save the results.
+
+        Returns: (video, video_url) tuple
+        """
+        video = cls()
+        kwargs = {}
+        if vt.CAN_IMPORT_SUBTITLES:
+            kwargs['fetch_subs_async'] = fetch_subs_async
+        vt.set_values(video, **kwargs)
+        if set_values:
+            for name, value in set_values.items():
+                setattr(video, name, value)
+        if not video.title:
+            video.title = make_title_from_url(vt.convert_to_video_url())
+        video.user = user
+
+        video_url = VideoUrl(url=vt.convert_to_video_url(),
+                             type=vt.abbreviation, original=True,
+                             primary=True, added_by=user,
+                             owner_username=vt.owner_username())
+        if vt.video_id:
+            video_url.videoid = vt.video_id
+        return video, video_url
+
+    @classmethod
+    def bulk_create_prepared(cls, prepared, user=None):
+        """Save the results of prepare_for_video_type() with bulk inserts.
+
+        This does the same work as get_or_create_for_url(), but uses a few
+        queries for the whole list rather than several per video.  The
+        post_save signals for the new objects are sent once everything is
+        saved.
+
+        Returns: list of the created videos
+        """
+        from videos.tasks import save_thumbnail_in_s3
+
+        if not prepared:
+            return []
+        current_time = datetime.now()
+        videos = [video for (video, video_url) in prepared]
+        for video in videos:
+            create_video_id(cls, video)
+        cls.objects.bulk_create(videos)
+        # bulk_create() doesn't set primary keys, so we need to fetch them
+        video_pks = dict(cls.objects
+                         .filter(video_id__in=[v.video_id for v in videos])
+                         .values_list('video_id', 'id'))
+        for video in videos:
+            video.id = video_pks[video.video_id]
+
+        video_urls = []
+        for video, video_url in prepared:
+            video_url.video = video
+            video_url.created = current_time
+            video_urls.append(video_url)
+        VideoUrl.objects.bulk_create(video_urls)
+        video_url_pks = dict(VideoUrl.objects
+                             .filter(video__in=videos)
+                             .values_list('video_id', 'id'))
+        for video_url in video_urls:
+            video_url.id = video_url_pks[video_url.video_id]
+
+        Action.objects.bulk_create([
+            Action(video=video, action_type=Action.ADD_VIDEO, user=user,
+                   created=video.created or current_time)
+            for video in videos
+        ])
+        if user and user.notify_by_message:
+            cls.followers.through.objects.bulk_create([
+                cls.followers.through(video_id=video.id,
+                                      customuser_id=user.id)
+                for video in videos
+            ])
+            # bulk_create() skips m2m_changed, so we also need to create the
+            # rows that CustomUser.video_followers_change_handler() would.
+            # The videos are new, so there can't be existing rows.
+            User.videos.through.objects.bulk_create([
+                User.videos.through(video_id=video.id, customuser_id=user.id)
+                for video in videos
+            ])
+
+        # Send the signals that bulk_create() skipped
+        for video, video_url in prepared:
+            post_save.send(sender=cls, instance=video, created=True,
+                           raw=False, using=cls.objects.db)
+            post_save.send(sender=VideoUrl, instance=video_url, created=True,
+                           raw=False, using=VideoUrl.objects.db)
+            save_thumbnail_in_s3.delay(video.pk)
+            video.update_search_index()
+        return videos
+
     @property
     def language(self):
         """Return the language code of this video's original language as a string.
@@ -2021,6 +2170,9 @@ class VideoFeed(models.Model):
     user = models.ForeignKey(User, blank=True, null=True)
     team = models.ForeignKey("teams.Team", blank=True, null=True)
     last_update = models.DateTimeField(null=True)
+    # Values from the last fetch, used for conditional GETs
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=255, blank=True, default='')
 
     YOUTUBE_PAGE_SIZE = 25
 
@@ -2035,10 +2187,14 @@ class VideoFeed(models.Model):
         return urlparse.urlparse(self.url).netloc
 
     def update(self):
-        importer = VideoImporter(self.url, self.user)
+        importer = VideoImporter(self.url, self.user,
+                                 etag=self.etag or None,
+                                 modified=self.last_modified or None)
         new_videos = importer.import_videos(
             import_next=self.last_update is None)
 
+        self.etag = importer.etag or ''
+        self.last_modified = importer.modified or ''
         self.last_update = VideoFeed.now()
         self.save()
         # create videos last-to-first so that the latest video is at the top
@@ -32,7 +32,8 @@ from videos.search_indexes import VideoIndex
 from videos.tasks import send_change_title_email
 from utils.celery_search_index import update_search_index
 from utils.multi_query_set import MultiQuerySet
-from utils.rpc import Error, Msg, RpcExceptionEvent, add_request_to_kwargs
+from utils.rpc import (Error, Msg, RpcExceptionEvent, add_request_to_kwargs,
+                       add_context_to_kwargs, readonly)
 from utils.translation import get_user_languages_from_request
 
 VIDEOS_ON_PAGE = VideoIndex.IN_ROW*5
@@ -79,8 +80,9 @@ class VideosApiClass(object):
 
         return {}
 
-    @add_request_to_kwargs
-    def load_video_languages(self, video_id, user, request):
+    @readonly
+    @add_context_to_kwargs
+    def load_video_languages(self, video_id, user, context):
         """
         Load langs for search pages. Will take into consideration
         the languages the user speaks.
@@ -95,7 +97,9 @@ class VideosApiClass(object):
         except Video.DoesNotExist:
             video = None
 
-        user_langs = get_user_languages_from_request(request)
+        user_langs = context.memoize('user-languages',
+                                     get_user_languages_from_request,
+                                     context.request)
 
         langs = list(video.newsubtitlelanguage_set.having_nonempty_tip())
 
@@ -1,6 +1,8 @@
 import datetime
 
 from django.conf import settings
+from django.db.models import Count
+from django.db.models.query import prefetch_related_objects
 from django.template import loader, Context
 from haystack import site
 from haystack.indexes import *
@@ -10,7 +12,7 @@ from haystack.exceptions import AlreadyRegistered
 
 from subtitles.models import SubtitleLanguage
 from utils.celery_search_index import CelerySearchIndex
-from videos.models import Video
+from videos.models import Video, Action, prefetch_languages_for_videos
 
 
 class VideoIndex(CelerySearchIndex):
@@ -52,15 +54,58 @@ class VideoIndex(CelerySearchIndex):
         return obj.title_display
 
     def prepare_activity_count(self, obj):
+        if hasattr(obj, '_index_activity_count'):
+            return obj._index_activity_count
         return obj.action_set.count()
 
+    def prepare_batch(self, objects):
+        """Fetch data for a batch of videos with a few grouped queries.
+
+        After this, prepare() doesn't need to run any queries for the videos.
+        """
+        prefetch_languages_for_videos(objects, with_public_tips=True,
+                                      with_private_tips=True)
+        prefetch_related_objects(objects, ['videourl_set'])
+        video_ids = [v.id for v in objects]
+        activity_counts = dict(
+            (row['video'], row['count']) for row in
+            Action.objects.filter(video__in=video_ids)
+            .values('video').annotate(count=Count('id')))
+        follower_counts = self._calc_follower_counts(video_ids)
+        for video in objects:
+            video._index_activity_count = activity_counts.get(video.id, 0)
+            video._index_follower_count = follower_counts.get(video.id, 0)
+
+    def _calc_follower_counts(self, video_ids):
+        """Calculate contributors_count for a list of videos
+
+        This matches the count that prepare() calculates for a single video.
+        That query counts languages without any followers as a NULL follower,
+        so we do the same.
+        """
+        Followers = SubtitleLanguage.followers.through
+        counts = dict(
+            (row['subtitlelanguage__video'], row['count']) for row in
+            Followers.objects.filter(subtitlelanguage__video__in=video_ids)
+            .values('subtitlelanguage__video')
+            .annotate(count=Count('customuser', distinct=True)))
+        no_followers = (SubtitleLanguage.objects
+                        .filter(video__in=video_ids, followers=None)
+                        .values_list('video', flat=True).distinct())
+        for video_id in no_followers:
+            counts[video_id] = counts.get(video_id, 0) + 1
+        return counts
+
     def prepare(self, obj):
         obj.prefetch_languages(with_public_tips=True, with_private_tips=True)
         self.prepared_data = super(VideoIndex, self).prepare(obj)
 
         languages = [l for l in obj.all_subtitle_languages()
                      if l.get_tip() is not None]
-        followers = obj.newsubtitlelanguage_set.all().values("followers").distinct().count()
+        if hasattr(obj, '_index_follower_count'):
+            followers = obj._index_follower_count
+        else:
+            followers = obj.newsubtitlelanguage_set.all().values("followers").distinct().count()
 
         self.prepared_data['languages_count'] = len(languages)
         self.prepared_data['video_language'] = obj.primary_audio_language_code
@@ -25,7 +25,6 @@ from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.files.base import ContentFile
 from django.db.models import ObjectDoesNotExist
-from haystack import site
 from raven.contrib.django.models import client
 import requests
 
@@ -143,6 +142,7 @@ def video_changed_tasks(video_pk, new_version_id=None):
     from videos.models import Video
 
     from teams.models import TeamVideo, BillingRecord
+    from utils.celery_search_index import queue_update
     metadata_manager.update_metadata(video_pk)
     if new_version_id is not None:
         send_new_version_notification(new_version_id)
@@ -159,8 +159,7 @@ def video_changed_tasks(video_pk, new_version_id=None):
     tv = video.get_team_video()
 
     if tv:
-        tv_search_index = site.get_index(TeamVideo)
-        tv_search_index.backend.update(tv_search_index, [tv])
+        queue_update(TeamVideo, tv.pk)
 
     video.update_search_index()
 
@@ -213,8 +213,6 @@ def language_list(video):
     cached = video.cache.get('language-list')
     if cached is not None:
         return cached
-    video.prefetch_languages(with_public_tips=True,
-                             with_private_tips=True)
     content = render_to_string('videos/_language-list.html', {
         'video': video,
         'language_list': LanguageList(video),
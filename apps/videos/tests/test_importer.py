@@ -25,7 +25,8 @@ import mock
 from utils import test_utils
 from utils.factories import *
 from videos import signals
-from videos.models import Video, VideoUrl, VideoFeed, ImportedVideo
+from videos.models import (Video, VideoUrl, VideoFeed, ImportedVideo,
+                           Action)
 from videos.feed_parser import importer
 from videos.types import HtmlFiveVideoType
 
@@ -58,6 +59,9 @@ class VideoImporterTestCase(TestCase):
         return.
         """
         self.feed_parser = mock.Mock()
+        self.feed_parser.feed.status = 200
+        self.feed_parser.feed.etag = None
+        self.feed_parser.feed.modified = None
         self.feed_parser.feed.entries = [self.entry(name)
                                     for (name, extra) in item_info]
         self.feed_parser.feed.feed = {}
@@ -71,9 +75,10 @@ class VideoImporterTestCase(TestCase):
             }
         self.mock_feedparser_class.return_value = self.feed_parser
 
-    def run_import_videos(self, import_next=False):
-        import_obj = importer.VideoImporter(self.feed_url(), self.user)
-        self.import_videos_rv = import_obj.import_videos(import_next)
+    def run_import_videos(self, import_next=False, **kwargs):
+        self.import_obj = importer.VideoImporter(self.feed_url(), self.user,
+                                                 **kwargs)
+        self.import_videos_rv = self.import_obj.import_videos(import_next)
 
     def check_videos(self, *feed_item_names):
         all_videos = list(Video.objects.all())
@@ -168,7 +173,7 @@ class VideoImporterTestCase(TestCase):
         ]
         links_iter = iter(links)
         urls_parsed = []
-        def make_feed_parser(url):
+        def make_feed_parser(url, **kwargs):
             urls_parsed.append(url)
             self.setup_feed_items([], links_iter.next())
             return self.feed_parser
@@ -186,12 +191,70 @@ class VideoImporterTestCase(TestCase):
         self.run_import_videos(import_next=False)
         self.assertEquals(urls_parsed, [self.feed_url()])
 
+    def test_duplicate_urls(self):
+        # If a feed lists a video twice, we should only create it once
+        self.setup_feed_items([
+            ('item-1', {}),
+            ('item-1', {}),
+            ('item-2', {}),
+        ])
+        self.run_import_videos()
+        self.check_videos('item-1', 'item-2')
+        self.assertEquals(self.import_obj.checked_entries, 3)
+
+    def test_bulk_create_follow_ups(self):
+        # Check that we do the same work that get_or_create_for_url() does
+        # for each video, even though we use bulk inserts
+        self.setup_feed_items([
+            ('item-1', {}),
+            ('item-2', {}),
+        ])
+        self.run_import_videos()
+        for video in self.import_videos_rv:
+            video_url = video.get_primary_videourl_obj()
+            self.assertEquals(video_url.added_by, self.user)
+            self.assertTrue(video_url.original)
+            self.assertEquals(video.user, self.user)
+            self.assertNotEquals(video.video_id, '')
+            self.assertEquals(list(video.followers.all()), [self.user])
+            self.assertEquals(list(self.user.videos.filter(id=video.id)),
+                              [video])
+            self.assertEquals(video.action_set.count(), 1)
+            self.assertEquals(video.action_set.get().action_type,
+                              Action.ADD_VIDEO)
+
+    def test_conditional_get(self):
+        self.setup_feed_items([
+            ('item-1', {}),
+        ])
+        self.feed_parser.feed.etag = 'etag-1'
+        self.feed_parser.feed.modified = 'Sat, 01 Jan 2000 00:00:00 GMT'
+        self.run_import_videos(etag='etag-0')
+        self.mock_feedparser_class.assert_called_with(
+            self.feed_url(), etag='etag-0', modified=None)
+        self.assertEquals(self.import_obj.etag, 'etag-1')
+        self.assertEquals(self.import_obj.modified,
+                          'Sat, 01 Jan 2000 00:00:00 GMT')
+
+    def test_not_modified(self):
+        self.setup_feed_items([
+            ('item-1', {}),
+        ])
+        self.feed_parser.feed.status = 304
+        self.run_import_videos(etag='etag-1')
+        self.assertEquals(self.import_videos_rv, [])
+        self.assertTrue(self.import_obj.not_modified)
+        self.assertEquals(self.import_obj.etag, 'etag-1')
+        self.assertEquals(Video.objects.count(), 0)
+
 class VideoFeedTest(TestCase):
     @test_utils.patch_for_test('videos.models.VideoImporter')
     def setUp(self, MockVideoImporter):
         self.MockVideoImporter = MockVideoImporter
         self.mock_video_importer = mock.Mock()
         self.mock_video_importer.last_link = None
+        self.mock_video_importer.etag = None
+        self.mock_video_importer.modified = None
         MockVideoImporter.return_value = self.mock_video_importer
 
     def test_video_feed(self):
@@ -208,7 +271,8 @@ class VideoFeedTest(TestCase):
 
         self.mock_video_importer.import_videos.return_value = feed_videos
         rv = feed.update()
-        self.MockVideoImporter.assert_called_with(url, user)
+        self.MockVideoImporter.assert_called_with(url, user, etag=None,
+                                                  modified=None)
         self.mock_video_importer.import_videos.assert_called_with(import_next=True)
         self.assertEquals(rv, feed_videos)
         mock_feed_imported_handler.assert_called_with(
@@ -217,12 +281,28 @@ class VideoFeedTest(TestCase):
         # import_next=False
         self.mock_video_importer.import_videos.return_value = []
         rv = feed.update()
-        self.MockVideoImporter.assert_called_with(url, user)
+        self.MockVideoImporter.assert_called_with(url, user, etag=None,
+                                                  modified=None)
         self.mock_video_importer.import_videos.assert_called_with(import_next=False)
         self.assertEquals(rv, [])
         mock_feed_imported_handler.assert_called_with(
             signal=signals.feed_imported, sender=feed, new_videos=[])
 
+    def test_conditional_get(self):
+        # We should store the ETag/Last-Modified values from the importer and
+        # pass them back on the next update
+        feed = VideoFeed.objects.create(url='http://example.com/feed.rss')
+        self.mock_video_importer.import_videos.return_value = []
+        self.mock_video_importer.etag = 'etag'
+        self.mock_video_importer.modified = 'Sat, 01 Jan 2000 00:00:00 GMT'
+        feed.update()
+        feed = VideoFeed.objects.get(id=feed.id)
+        self.assertEquals(feed.etag, 'etag')
+        feed.update()
+        self.MockVideoImporter.assert_called_with(
+            feed.url, None, etag='etag',
+            modified='Sat, 01 Jan 2000 00:00:00 GMT')
+
     def make_video(self, number):
         video_url = 'http://example.com/video-{0}.mp4'.format(number)
         return VideoFactory.create(video_url__url=video_url)
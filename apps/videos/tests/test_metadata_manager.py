@@ -0,0 +1,80 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from nose.tools import *
+
+from subtitles import pipeline
+from utils.factories import *
+from videos import metadata_manager
+from videos.models import Video
+
+class UpdateMetadataTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory(primary_audio_language_code='en')
+
+    def reload_video(self):
+        return Video.objects.get(pk=self.video.pk)
+
+    def test_update_metadata(self):
+        pipeline.add_subtitles(self.video, 'en', [(100, 200, 'one')],
+                               complete=True)
+        pipeline.add_subtitles(self.video, 'fr', [(100, 200, 'un')])
+        pipeline.add_subtitles(self.video, 'de', None)
+        metadata_manager.update_metadata(self.video.pk)
+        video = self.reload_video()
+        assert_true(video.is_subtitled)
+        assert_true(video.was_subtitled)
+        assert_equal(video.languages_count, 2)
+        assert_true(video.is_public)
+        assert_not_equal(video.complete_date, None)
+        assert_not_equal(video.edited, None)
+
+    def test_team_visibility(self):
+        TeamVideoFactory(video=self.video, team=TeamFactory(is_visible=False))
+        metadata_manager.update_metadata(self.video.pk)
+        assert_false(self.reload_video().is_public)
+
+    def test_only_changed_fields_are_written(self):
+        metadata_manager.update_metadata(self.video.pk)
+        video = (Video.objects.select_related('teamvideo__team')
+                 .get(pk=self.video.pk))
+        changes = metadata_manager._calc_changes(video, [])
+        assert_equal(changes.keys(), ['edited'])
+
+    def test_subtitled_cleared(self):
+        pipeline.add_subtitles(self.video, 'en', [(100, 200, 'one')])
+        metadata_manager.update_metadata(self.video.pk)
+        pipeline.add_subtitles(self.video, 'en', None)
+        metadata_manager.update_metadata(self.video.pk)
+        video = self.reload_video()
+        assert_false(video.is_subtitled)
+        assert_true(video.was_subtitled)
+        assert_equal(video.languages_count, 0)
+
+    def test_update_metadata_for_videos(self):
+        video2 = VideoFactory()
+        pipeline.add_subtitles(self.video, 'en', [(100, 200, 'one')])
+        pipeline.add_subtitles(video2, 'en', [(100, 200, 'one')])
+        pipeline.add_subtitles(video2, 'fr', [(100, 200, 'un')])
+        metadata_manager.update_metadata_for_videos(
+            [self.video.pk, video2.pk], chunk_size=1)
+        assert_equal(self.reload_video().languages_count, 1)
+        assert_equal(Video.objects.get(pk=video2.pk).languages_count, 2)
@@ -61,6 +61,45 @@ class TestVideoUrl(TestCase):
         with assert_raises(IntegrityError):
             self.primary_url.remove(self.user)
 
+class TestWidgetSnapshot(TestCase):
+    def setUp(self):
+        test_utils.invalidate_widget_video_cache.run_original_for_test()
+        self.video = VideoFactory()
+
+    def test_values(self):
+        snapshot = video_cache.VideoWidgetSnapshot(self.video.video_id)
+        assert_equal(snapshot.get_video_urls(),
+                     [vu.effective_url for vu in self.video.videourl_set.all()])
+        assert_equal(snapshot.get_visibility_policies(), {
+            'is_public': True,
+            'team_id': None,
+        })
+        assert_equal(snapshot.get_is_moderated(), False)
+        assert_equal(snapshot.get_download_filename(),
+                     self.video.get_download_filename())
+        assert_equal(snapshot.get_video_languages(), [])
+
+    def test_second_fetch_uses_cache(self):
+        video_cache.VideoWidgetSnapshot(self.video.video_id).get_video_urls()
+        snapshot = video_cache.VideoWidgetSnapshot(self.video.video_id)
+        with self.assertNumQueries(0):
+            snapshot.get_video_urls()
+            snapshot.get_download_filename()
+
+    def test_invalidate(self):
+        snapshot = video_cache.VideoWidgetSnapshot(self.video.video_id)
+        assert_equal(len(snapshot.get_video_urls()), 1)
+        VideoURLFactory(video=self.video)
+        video_cache.invalidate_cache(self.video.video_id)
+        snapshot = video_cache.VideoWidgetSnapshot(self.video.video_id)
+        assert_equal(len(snapshot.get_video_urls()), 2)
+
+    def test_missing_video(self):
+        snapshot = video_cache.VideoWidgetSnapshot('nonexistent')
+        assert_equal(snapshot.get_visibility_policies(), {})
+        with assert_raises(Video.DoesNotExist):
+            snapshot.get_video_urls()
+
 class TestVideo(TestCase):
     def setUp(self):
         self.user = UserFactory()
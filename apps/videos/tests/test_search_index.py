@@ -0,0 +1,53 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from haystack import site
+from nose.tools import *
+
+from subtitles import pipeline
+from utils.factories import *
+from videos.models import Video
+
+class PrepareBatchTest(TestCase):
+    def setUp(self):
+        self.index = site.get_index(Video)
+        self.videos = [VideoFactory() for i in xrange(3)]
+        user = UserFactory()
+        pipeline.add_subtitles(self.videos[0], 'en', [(100, 200, 'one')],
+                               author=user)
+        pipeline.add_subtitles(self.videos[0], 'fr', [(100, 200, 'un')],
+                               author=UserFactory())
+        pipeline.add_subtitles(self.videos[1], 'en', [(100, 200, 'one')],
+                               author=user)
+        # language without any followers
+        pipeline.add_subtitles(self.videos[1], 'de', None)
+
+    def fetch_videos(self):
+        return list(Video.objects.filter(id__in=[v.id for v in self.videos])
+                    .order_by('id'))
+
+    def test_matches_prepare(self):
+        correct_data = [dict(self.index.prepare(v))
+                        for v in self.fetch_videos()]
+        videos = self.fetch_videos()
+        self.index.prepare_batch(videos)
+        batch_data = [dict(self.index.prepare(v)) for v in videos]
+        assert_equal(batch_data, correct_data)
@@ -26,6 +26,7 @@ from babelsubs.storage import SubtitleSet, diff
 from django.core import mail
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.db.models import ObjectDoesNotExist
 from django.test import TestCase
 from vidscraper.sites import blip
@@ -498,6 +499,42 @@ class MakeLanguageListTestCase(TestCase):
         pipeline.add_subtitles(self.video, 'pt', None)
         self.assertEquals(views.LanguageList(self.video).items, [ ])
 
+    def count_language_list_queries(self):
+        video = Video.objects.get(pk=self.video.pk)
+        video.cache.invalidate()
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            views.LanguageList(video)
+        finally:
+            connection.use_debug_cursor = False
+        return len(connection.queries) - start
+
+    def test_query_count(self):
+        # The number of queries shouldn't depend on the number of languages
+        self.setup_team()
+        self.add_completed_subtitles('en', [(0, 1000, "Hello")])
+        self.add_not_completed_subtitles('fr', [(None, None, "Hello")])
+        query_count = self.count_language_list_queries()
+        for language_code in ('de', 'es', 'ja'):
+            self.add_completed_subtitles(language_code, [(0, 1000, "Hello")])
+        for language_code in ('pt', 'ru'):
+            self.add_not_completed_subtitles(language_code,
+                                             [(0, 1000, "Hello")])
+        self.assertEquals(self.count_language_list_queries(), query_count)
+
+    def test_cache(self):
+        lang = self.add_completed_subtitles('en', [(0, 1000, "Hello")])
+        items = views.LanguageList(self.video).items
+        with self.assertNumQueries(0):
+            self.assertEquals(views.LanguageList(self.video).items, items)
+        # adding subtitles should invalidate the cache
+        fr = self.add_not_completed_subtitles('fr', [(0, 1000, "Hello")])
+        self.assertEquals(views.LanguageList(self.video).items, [
+            ('English', 'complete', ['original'], lang.get_absolute_url()),
+            ('French', 'incomplete', ['incomplete'], fr.get_absolute_url()),
+        ])
+
     def test_multiple_languages(self):
         # english is the original, completed language
         en = self.add_completed_subtitles('en', [
@@ -22,8 +22,6 @@ import urllib, urllib2
 from collections import namedtuple
 
 import json
-from babelsubs.storage import diff as diff_subs
-from babelsubs.generators.html import HTMLGenerator
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
@@ -44,7 +42,8 @@ from django.shortcuts import (render, render_to_response, get_object_or_404,
 from django.template import RequestContext
 from django.utils.encoding import force_unicode
 from django.utils.http import urlquote_plus
-from django.utils.translation import ugettext, ugettext_lazy as _
+from django.utils.translation import (ugettext, ugettext_lazy as _,
+                                      ugettext_noop)
 from django.views.decorators.http import require_POST
 from gdata.service import RequestError
 from vidscraper.errors import Error as VidscraperError
@@ -52,6 +51,7 @@ from vidscraper.errors import Error as VidscraperError
 import widget
 from widget import rpc as widget_rpc
 from auth.models import CustomUser as User
+from subtitles.diff import diff_versions, find_neighbors
 from subtitles.models import SubtitleLanguage, SubtitleVersion
 from subtitles.permissions import (user_can_view_private_subtitles,
                                    user_can_edit_subtitles)
@@ -100,22 +100,23 @@ AVAILABLE_SUBTITLE_FORMATS_FOR_DISPLAY = [
 LanguageListItem = namedtuple("LanguageListItem", "name status tags url")
 
 class LanguageList(object):
-    """List of languages for the video pages."""
+    """List of languages for the video pages.
+
+    The list is calculated with a fixed number of queries, regardless of the
+    number of languages, and stored in the video's CacheGroup.  The pipeline
+    and the Task/TeamVideo models invalidate that group when something
+    changes.
+    """
 
     def __init__(self, video):
+        rows = video.cache.get_or_calc('language-list-rows',
+                                       self._calc_rows, video)
         original_languages = []
         other_languages = []
-        for lang in video.all_subtitle_languages():
-            public_tip = lang.get_tip(public=False)
-            if public_tip is None or public_tip.subtitle_count == 0:
-                # no versions in this language yet
-                continue
-            language_name = lang.get_language_code_display()
-            status = self._calc_status(lang)
-            tags = self._calc_tags(lang)
-            url = lang.get_absolute_url()
-            item = LanguageListItem(language_name, status, tags, url)
-            if lang.language_code == video.primary_audio_language_code:
+        for language_code, name, status, tags, url in rows:
+            item = LanguageListItem(name, status,
+                                    [ugettext(tag) for tag in tags], url)
+            if language_code == video.primary_audio_language_code:
                 original_languages.append(item)
             else:
                 other_languages.append(item)
@@ -123,44 +124,84 @@ class LanguageList(object):
         other_languages.sort(key=lambda li: li.name)
         self.items = original_languages + other_languages
 
-    def _calc_status(self, lang):
+    def _calc_rows(self, video):
+        """Calculate the data for the list.
+
+        Returns: list of (language_code, name, status, tags, url) tuples.
+            Tags are untranslated, since we store this in the cache.
+        """
+        # Make sure we see the languages as they are now, rather than what
+        # was cached on the video before the CacheGroup was invalidated.
+        video.clear_language_cache()
+        video.prefetch_languages(with_public_tips=True,
+                                 with_private_tips=True)
+        languages = []
+        for lang in video.all_subtitle_languages():
+            private_tip = lang.get_tip(public=False)
+            if private_tip is None or private_tip.subtitle_count == 0:
+                # no versions in this language yet
+                continue
+            languages.append(lang)
+        synced = SubtitleLanguage.bulk_is_synced(
+            [lang for lang in languages if not lang.subtitles_complete],
+            public=False)
+        task_types = self._fetch_task_types(video, languages)
+        return [
+            (lang.language_code, lang.get_language_code_display(),
+             self._calc_status(lang, synced),
+             self._calc_tags(lang, task_types), lang.get_absolute_url())
+            for lang in languages
+        ]
+
+    def _fetch_task_types(self, video, languages):
+        """Get the incomplete task type for each complete language.
+
+        Returns: dict mapping language codes to task types.
+        """
+        team_video = video.get_team_video()
+        language_codes = [lang.language_code for lang in languages
+                          if lang.subtitles_complete]
+        if team_video is None or not language_codes:
+            return {}
+        task_types = {}
+        tasks = (Task.objects.incomplete()
+                 .filter(team_video=team_video,
+                         language__in=language_codes)
+                 .values_list('language', 'type'))
+        for language_code, task_type in tasks:
+            task_types.setdefault(language_code, task_type)
+        return task_types
+
+    def _calc_status(self, lang, synced):
         if lang.subtitles_complete:
             if lang.has_public_version():
                 return 'complete'
             else:
                 return 'needs-review'
         else:
-            if lang.is_synced(public=False):
+            if synced[lang.pk]:
                 return 'incomplete'
             else:
                 return 'needs-timing'
 
-    def _calc_tags(self, lang):
+    def _calc_tags(self, lang, task_types):
         tags = []
         if lang.is_primary_audio_language():
-            tags.append(ugettext(u'original'))
-
-        team_video = lang.video.get_team_video()
+            tags.append(ugettext_noop(u'original'))
 
         if not lang.subtitles_complete:
-            tags.append(ugettext(u'incomplete'))
-        elif team_video is not None:
+            tags.append(ugettext_noop(u'incomplete'))
+        elif lang.language_code in task_types:
             # subtiltes are complete, check if they are under review/approval.
-            incomplete_tasks = (Task.objects.incomplete()
-                                            .filter(team_video=team_video,
-                                                    language=lang.language_code))
-            for t in incomplete_tasks:
-                if t.type == Task.TYPE_IDS['Review']:
-                    tags.append(ugettext(u'needs review'))
-                    break
-                elif t.type == Task.TYPE_IDS['Approve']:
-                    tags.append(ugettext(u'needs approval'))
-                    break
-                else:
-                    # subtitles are complete, but there's a subtitle/translate
-                    # task for them.  They must have gotten sent back.
-                    tags.append(ugettext(u'needs editing'))
-                    break
+            task_type = task_types[lang.language_code]
+            if task_type == Task.TYPE_IDS['Review']:
+                tags.append(ugettext_noop(u'needs review'))
+            elif task_type == Task.TYPE_IDS['Approve']:
+                tags.append(ugettext_noop(u'needs approval'))
+            else:
+                # subtitles are complete, but there's a subtitle/translate
+                # task for them.  They must have gotten sent back.
+                tags.append(ugettext_noop(u'needs editing'))
         return tags
 
     def __iter__(self):
@@ -731,12 +772,12 @@ def diffing(request, first_version, second_pk):
         first_version, second_version = second_version, first_version
 
     video = first_version.subtitle_language.video
-    diff_data = diff_subs(first_version.get_subtitles(), second_version.get_subtitles(), mappings=HTMLGenerator.MAPPINGS)
+    diff_data = diff_versions(first_version, second_version)
     team_video = video.get_team_video()
-    first_version_previous = first_version.previous_version()
-    first_version_next = first_version.next_version()
-    second_version_previous = second_version.previous_version()
-    second_version_next = second_version.next_version()
+    neighbors = find_neighbors(language, [first_version, second_version])
+    first_version_previous, first_version_next = neighbors[first_version.pk]
+    second_version_previous, second_version_next = \
+            neighbors[second_version.pk]
     context = {
         'video': video,
         'diff_data': diff_data,
@@ -744,10 +785,10 @@ def diffing(request, first_version, second_pk):
         'first_version': first_version,
         'second_version': second_version,
         'latest_version': language.get_tip(),
-        'first_version_previous': first_version_previous if (first_version_previous != second_version) else None,
+        'first_version_previous': first_version_previous if (first_version_previous != second_version.pk) else None,
         'first_version_next': first_version_next,
         'second_version_previous': second_version_previous,
-        'second_version_next': second_version_next if (second_version_next != first_version) else None,
+        'second_version_next': second_version_next if (second_version_next != first_version.pk) else None,
     }
     if team_video and not can_rollback_language(request.user, language):
         context['rollback_allowed'] = False
@@ -100,10 +100,10 @@ class Rpc(BaseRpc):
 
 
     # Widget
-    def _check_visibility_policy_for_widget(self, request, video_id):
+    def _check_visibility_policy_for_widget(self, request, snapshot):
         """Return an error if the user cannot see the widget, None otherwise."""
 
-        visibility_policy = video_cache.get_visibility_policies(video_id)
+        visibility_policy = snapshot.get_visibility_policies()
 
         if not visibility_policy.get("is_public", True):
             team = Team.objects.get(id=visibility_policy['team_id'])
@@ -111,11 +111,11 @@ class Rpc(BaseRpc):
             if not team.is_member(request.user):
                 return {"error_msg": _("Video embedding disabled by owner")}
 
-    def _get_video_urls_for_widget(self, video_url, video_id):
-        """Return the video URLs, 'cleaned' video id, and error."""
+    def _get_video_urls_for_widget(self, video_url, snapshot):
+        """Return the video URLs, 'cleaned' widget snapshot, and error."""
 
         try:
-            video_urls = video_cache.get_video_urls(video_id)
+            video_urls = snapshot.get_video_urls()
         except models.Video.DoesNotExist:
             video_cache.invalidate_video_id(video_url)
 
@@ -124,9 +124,10 @@ class Rpc(BaseRpc):
             except Exception as e:
                 return None, None, {"error_msg": unicode(e)}
 
-            video_urls = video_cache.get_video_urls(video_id)
+            snapshot = video_cache.VideoWidgetSnapshot(video_id)
+            video_urls = snapshot.get_video_urls()
 
-        return video_urls, video_id, None
+        return video_urls, snapshot, None
 
     def _find_remote_autoplay_language(self, request):
         language = None
@@ -167,22 +168,25 @@ class Rpc(BaseRpc):
         if video_id is None:
             return None
 
-        error = self._check_visibility_policy_for_widget(request, video_id)
+        # Fetch all the cached widget data for the video at once
+        snapshot = video_cache.VideoWidgetSnapshot(video_id)
+        error = self._check_visibility_policy_for_widget(request, snapshot)
 
         if error:
             return error
 
-        video_urls, video_id, error = self._get_video_urls_for_widget(video_url, video_id)
+        video_urls, snapshot, error = self._get_video_urls_for_widget(video_url, snapshot)
 
         if error:
             return error
 
+        video_id = snapshot.video_id
         resp = {
             'video_id' : video_id,
             'subtitles': None,
             'video_urls': video_urls,
-            'is_moderated': video_cache.get_is_moderated(video_id),
-            'filename': video_cache.get_download_filename(video_id),
+            'is_moderated': snapshot.get_is_moderated(),
+            'filename': snapshot.get_download_filename(),
         }
 
         if additional_video_urls is not None:
@@ -194,7 +198,7 @@ class Rpc(BaseRpc):
         if request.user.is_authenticated():
             resp['username'] = request.user.username
 
-        resp['drop_down_contents'] = video_cache.get_video_languages(video_id)
+        resp['drop_down_contents'] = snapshot.get_video_languages()
         resp['my_languages'] = get_user_languages_from_request(request)
         resp['subtitles'] = self._get_subtitles_for_widget(request, base_state,
                                                            video_id, is_remote)
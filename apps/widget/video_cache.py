@@ -72,40 +72,37 @@ def associate_extra_url(video_url, video_id):
 
 # Invalidation
 def invalidate_cache(video_id):
-    cache.delete(_video_urls_key(video_id))
+    """Invalidate all widget data for a video.
 
-    try:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        for l in video.newsubtitlelanguage_set.all():
-            cache.delete(_subtitles_dict_key(video_id, l.pk))
-    except Video.DoesNotExist:
-        pass
-
-    for language in settings.ALL_LANGUAGES:
-        cache.delete(_subtitle_language_pk_key(video_id, language[0]))
+    All keys are deleted with a single delete_many() call, so the widget
+    never sees a mix of old and new values from a partial invalidation.
+    """
+    from videos.models import Video
 
-    cache.delete(_subtitle_language_pk_key(video_id, None))
-    cache.delete(_subtitles_dict_key(video_id, None))
-    cache.delete(_subtitles_count_key(video_id))
-    cache.delete(_video_languages_key(video_id))
-    cache.delete(_video_languages_verbose_key(video_id))
-    cache.delete(_video_is_moderated_key(video_id))
-    cache.delete(_video_visibility_policy_key(video_id))
-    cache.delete(_video_filename_key(video_id))
+    keys = [
+        _subtitle_language_pk_key(video_id, None),
+        _subtitles_dict_key(video_id, None),
+        _subtitles_count_key(video_id),
+        _video_languages_verbose_key(video_id),
+    ]
+    keys.extend(VideoWidgetSnapshot.cache_keys(video_id).values())
+    keys.extend(_subtitle_language_pk_key(video_id, language[0])
+                for language in settings.ALL_LANGUAGES)
 
-    from videos.models import Video
     try:
         video = Video.objects.get(video_id=video_id)
-        for url in video.videourl_set.all():
-            cache.delete(_video_id_key(url.url))
-
-        team_video = video.get_team_video()
-
-        if team_video:
-            cache.delete(_video_completed_languages(team_video.id))
     except Video.DoesNotExist:
         pass
+    else:
+        keys.extend(_subtitles_dict_key(video_id, l.pk)
+                    for l in video.newsubtitlelanguage_set.all())
+        keys.extend(_video_id_key(url.url)
+                    for url in video.videourl_set.all())
+        team_video = video.get_team_video()
+        if team_video:
+            keys.append(_video_completed_languages(team_video.id))
+
+    cache.delete_many(keys)
 
 def invalidate_video_id(video_url):
     cache.delete(_video_id_key(video_url))
@@ -177,17 +174,128 @@ def pk_for_default_language(video_id, language_code):
 
     return value
 
-def get_video_urls(video_id):
-    cache_key = _video_urls_key(video_id)
-    video_urls = cache.get(cache_key)
+class VideoWidgetSnapshot(object):
+    """Cached data that the widget needs for a video.
+
+    VideoWidgetSnapshot fetches all of its values with one get_many() call.
+    For any values that aren't in the cache, it loads the video once,
+    calculates the values from it, and stores them with one set_many() call.
 
-    if video_urls is None:
+    Values are loaded the first time one of the get_* methods is called.
+    If the video doesn't exist, they raise Video.DoesNotExist (except for
+    get_visibility_policies(), which returns an empty dict).
+    """
+
+    # maps value names to the functions that calculate their cache keys
+    KEY_FUNCS = {
+        'video_urls': _video_urls_key,
+        'video_languages': _video_languages_key,
+        'is_moderated': _video_is_moderated_key,
+        'download_filename': _video_filename_key,
+        'visibility_policies': _video_visibility_policy_key,
+    }
+
+    def __init__(self, video_id, names=None):
+        """Create a VideoWidgetSnapshot
+
+        Args:
+            video_id: video_id for the video
+            names: names of the values to fetch (keys of KEY_FUNCS).  By
+                default we fetch everything.
+        """
+        self.video_id = video_id
+        if names is None:
+            names = self.KEY_FUNCS.keys()
+        self.names = names
+        self._values = None
+
+    @classmethod
+    def cache_keys(cls, video_id, names=None):
+        if names is None:
+            names = cls.KEY_FUNCS.keys()
+        return dict((name, cls.KEY_FUNCS[name](video_id)) for name in names)
+
+    def _load(self):
         from videos.models import Video
-        video_urls = [vu.effective_url for vu
-                 in Video.objects.get(video_id=video_id).videourl_set.all()]
-        cache.set(cache_key, video_urls, TIMEOUT)
 
-    return video_urls
+        keys = self.cache_keys(self.video_id, self.names)
+        cached = cache.get_many(keys.values())
+        values = {}
+        missing = []
+        for name, key in keys.items():
+            if key in cached:
+                values[name] = cached[key]
+            else:
+                missing.append(name)
+        if missing:
+            video = (Video.objects.select_related('teamvideo__team')
+                     .get(video_id=self.video_id))
+            to_store = {}
+            for name in missing:
+                values[name] = getattr(self, '_calc_' + name)(video)
+                to_store[keys[name]] = values[name]
+            cache.set_many(to_store, TIMEOUT)
+        self._values = values
+
+    def _get(self, name):
+        if self._values is None:
+            self._load()
+        return self._values[name]
+
+    def get_video_urls(self):
+        return self._get('video_urls')
+
+    def get_video_languages(self):
+        return self._get('video_languages')
+
+    def get_is_moderated(self):
+        return self._get('is_moderated')
+
+    def get_download_filename(self):
+        return self._get('download_filename')
+
+    def get_visibility_policies(self):
+        from videos.models import Video
+        try:
+            return self._get('visibility_policies')
+        except Video.DoesNotExist:
+            return {}
+
+    def _calc_video_urls(self, video):
+        return [vu.effective_url for vu in video.videourl_set.all()]
+
+    def _calc_video_languages(self, video):
+        from widget.rpc import language_summary
+
+        languages = video.newsubtitlelanguage_set.having_nonempty_versions()
+        team_video = video.get_team_video()
+        if team_video:
+            languages = languages.filter(
+                language_code__in=team_video.team.get_readable_langs())
+        return [language_summary(l) for l in languages]
+
+    def _calc_is_moderated(self, video):
+        return video.is_moderated
+
+    def _calc_download_filename(self, video):
+        return video.get_download_filename()
+
+    def _calc_visibility_policies(self, video):
+        team_video = video.get_team_video()
+        if team_video:
+            team = team_video.team
+            return {
+                "is_public": team.is_visible,
+                "team_id": team.id,
+            }
+        else:
+            return {
+                "is_public": True,
+                "team_id": None,
+            }
+
+def get_video_urls(video_id):
+    return VideoWidgetSnapshot(video_id, ['video_urls']).get_video_urls()
 
 def get_subtitles_dict(video_id, language_pk, version_number, 
                        subtitles_dict_fn, is_remote=False):
@@ -221,25 +329,8 @@ def get_subtitles_dict(video_id, language_pk, version_number,
     return cached_value
 
 def get_video_languages(video_id):
-    from widget.rpc import language_summary
-
-    cache_key = _video_languages_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        languages = video.newsubtitlelanguage_set.having_nonempty_versions()
-
-        team_video = video.get_team_video()
-
-        if team_video:
-            languages = languages.filter(language_code__in=team_video.team.get_readable_langs())
-
-        value = [language_summary(l) for l in languages]
-        cache.set(cache_key, value, TIMEOUT)
-
-    return value
+    snapshot = VideoWidgetSnapshot(video_id, ['video_languages'])
+    return snapshot.get_video_languages()
 
 def get_video_completed_languages(team_video_id):
     cache_key = _video_completed_languages(team_video_id)
@@ -291,59 +382,15 @@ def get_video_languages_verbose(video_id, max_items=6):
     return data
 
 def get_is_moderated(video_id):
-    cache_key = _video_is_moderated_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        value = video.is_moderated
-        cache.set(cache_key, value, TIMEOUT)
-
-    return value
+    return VideoWidgetSnapshot(video_id, ['is_moderated']).get_is_moderated()
 
 def get_download_filename(video_id):
-    cache_key = _video_filename_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        value = video.get_download_filename()
-        cache.set(cache_key, value, TIMEOUT)
-
-    return value
+    snapshot = VideoWidgetSnapshot(video_id, ['download_filename'])
+    return snapshot.get_download_filename()
 
 def get_visibility_policies(video_id):
-    cache_key = _video_visibility_policy_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-
-        try:
-            video = Video.objects.get(video_id=video_id)
-        except Video.DoesNotExist:
-            return {}
-
-        team_video = video.get_team_video()
-
-        if team_video:
-            team = team_video.team
-            is_public = team.is_visible
-            team_id = team.id
-        else:
-            is_public = True
-            team_id = None
-
-        value = {
-            "is_public": is_public,
-            "team_id": team_id
-        }
-
-        cache.set(cache_key, value, TIMEOUT)
-
-    return value
+    snapshot = VideoWidgetSnapshot(video_id, ['visibility_policies'])
+    return snapshot.get_visibility_policies()
 
 # Writelocking
 def _writelocked_store_langs(video_id, langs):
@@ -273,6 +273,10 @@ HAYSTACK_SITECONF = 'search_site'
 HAYSTACK_SEARCH_ENGINE = 'solr'
 HAYSTACK_SOLR_URL = 'http://127.0.0.1:8983/solr'
 HAYSTACK_SEARCH_RESULTS_PER_PAGE = 20
+# Search index updates get queued and sent to solr in batches, see
+# utils.celery_search_index
+SEARCH_INDEX_FLUSH_INTERVAL = 10
+SEARCH_INDEX_BATCH_SIZE = 100
 SOLR_ROOT = rel('..', 'buildout', 'parts', 'solr', 'example')
 
 # socialauth-related
@@ -364,6 +368,54 @@ EMAIL_BCC_LIST = []
 
 CACHE_BACKEND = 'locmem://'
 
+# Byte budget for the per-process cache of parsed SubtitleSets
+PARSED_SUBTITLES_CACHE_SIZE = 64 * 1024 * 1024
+# Rendered subtitle output bigger than this (after compression) doesn't go in
+# memcached.  If RENDERED_SUBTITLES_DISK_CACHE_DIR is set it's stored there.
+RENDERED_SUBTITLES_MAX_SIZE = 900 * 1024
+RENDERED_SUBTITLES_DISK_CACHE_DIR = None
+# CacheGroup.get_or_calc() returns values from before an invalidation for this
+# many seconds while another process recalculates them.
+CACHE_GROUP_STALE_GRACE_PERIOD = 30
+# How long a process can hold the lock to recalculate a CacheGroup value
+CACHE_GROUP_LOCK_TIMEOUT = 10
+# How long get_or_calc() waits for another process to calculate a value when
+# there's no stale value to return
+CACHE_GROUP_LOCK_WAIT = 2
+# HTTP notifications to teams/partners, see teams.notification_delivery
+TEAM_NOTIFICATION_COALESCE_WINDOW = 5
+TEAM_NOTIFICATION_MAX_CONCURRENCY = 2
+TEAM_NOTIFICATION_BATCH_SIZE = 50
+TEAM_NOTIFICATION_MAX_ATTEMPTS = 8
+TEAM_NOTIFICATION_RETRY_DELAY = 30
+TEAM_NOTIFICATION_HTTP_TIMEOUT = 30
+# App-wide locks, see utils.applock
+APPLOCK_BACKEND = 'cache'
+APPLOCK_LEASE = 60 * 5
+# Syncing all subtitles for an external account, see
+# externalsites.bulksync
+BULK_SYNC_BATCH_SIZE = 100
+BULK_SYNC_RATE = 10
+BULK_SYNC_STALL_TIMEOUT = 60 * 30
+# Moving TeamVideos to another team, see teams.bulk_move
+BULK_MOVE_BATCH_SIZE = 100
+# Max requests per second that we send to each external site API, see
+# externalsites.apiclient
+EXTERNAL_SITES_RATE_LIMITS = {
+    'youtube': 20,
+    'kaltura': 10,
+    'brightcove': 5,
+}
+# How long to reuse OAuth access tokens / Kaltura sessions for.  These need to
+# be less than the lifetimes that the sites give them.
+YOUTUBE_ACCESS_TOKEN_CACHE_TIME = 60 * 50
+KALTURA_SESSION_CACHE_TIME = 60 * 60 * 12
+# Threads used to fetch feed pages and video info when importing feeds, see
+# videos.feed_parser.importer
+FEED_FETCH_CONCURRENCY = 4
+# Threads used to run batches of readonly RPC calls, see utils.rpc
+RPC_BATCH_CONCURRENCY = 4
+
 #for unisubs.example.com
 RECAPTCHA_PUBLIC = '6LdoScUSAAAAANmmrD7ALuV6Gqncu0iJk7ks7jZ0'
 RECAPTCHA_SECRET = ' 6LdoScUSAAAAALvQj3aI1dRL9mHgh85Ks2xZH1qc'
@@ -53,6 +53,18 @@ CELERYBEAT_SCHEDULE = {
         'task': 'teams.tasks.add_videos_notification_hourly',
         'schedule': crontab(minute=0),
     },
+    'check-team-notification-outbox': {
+        'task': 'teams.tasks.check_team_notification_outbox',
+        'schedule': timedelta(seconds=60),
+    },
+    'purge-sent-team-notifications': {
+        'task': 'teams.tasks.purge_sent_team_notifications',
+        'schedule': crontab(minute=30, hour=6),
+    },
+    'rebuild-team-stats': {
+        'task': 'teams.tasks.rebuild_all_team_stats',
+        'schedule': crontab(minute=0, hour=4),
+    },
     'gauge_teams': {
         'task': 'teams.tasks.gauge_teams',
         'schedule': timedelta(seconds=300),
@@ -85,6 +97,10 @@ CELERYBEAT_SCHEDULE = {
         'task': 'externalsites.tasks.retry_failed_sync',
         'schedule': timedelta(seconds=10),
     },
+    'resume_stalled_bulk_syncs': {
+        'task': 'externalsites.tasks.resume_stalled_bulk_syncs',
+        'schedule': timedelta(minutes=10),
+    },
 }
 
 __all__ = ['CELERYBEAT_SCHEDULE', 'CELERY_QUEUES', ]
@@ -36,6 +36,9 @@ DEFAULT_PROTOCOL = 'https'
 TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
 NOSE_PLUGINS = ['utils.test_utils.UnisubsTestPlugin']
 CELERY_ALWAYS_EAGER = True
+# Worker threads use their own DB connection, which can't see the data from
+# the test transaction.
+RPC_BATCH_CONCURRENCY = 1
 
 # Use MD5 password hashing, other algorithms are purposefully slow to increase
 # security.  Also include the SHA1 hasher since some of the tests use it.
@@ -25,7 +25,7 @@ from django.template.context import RequestContext
 from django.http import HttpResponse
 from django.core.serializers.json import DjangoJSONEncoder
 from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
 from django.contrib.sites.models import Site
 from utils.metrics import Meter
@@ -85,6 +85,27 @@ def send_templated_email(to, subject, body_template, body_dict,
              situations where you must send the email, for example on
              password retrivals.
     """
+    email = make_templated_email(to, subject, body_template, body_dict,
+                                 from_email, ct, check_user_preference)
+    return email.send(fail_silently)
+
+def make_templated_email(to, subject, body_template, body_dict,
+                         from_email=None, ct="html",
+                         check_user_preference=True):
+    """Create an EmailMessage for send_templated_email()
+
+    Use this with send_email_batch() to send many emails at once.  Arguments
+    are the same as send_templated_email().
+    """
+    body = render_templated_email_body(body_template, body_dict)
+    return make_email(email_recipients(to, check_user_preference), subject,
+                      body, from_email, ct)
+
+def email_recipients(to, check_user_preference=True):
+    """Get a list of email addresses to send a templated email to.
+
+    to can be an email address, a User, or a list of them.
+    """
     from auth.models import CustomUser
     from django.contrib.auth.models import User
     to_unchecked = to
@@ -103,21 +124,38 @@ def send_templated_email(to, subject, body_template, body_dict,
                 to.append(recipient.email)
         else:
             to.append(recipient)
-    if not from_email: from_email = settings.DEFAULT_FROM_EMAIL
+    return to
 
+def render_templated_email_body(body_template, body_dict):
     body_dict['domain'] = Site.objects.get_current().domain
     body_dict['url_base'] = "%s://%s" % (DEFAULT_PROTOCOL,  Site.objects.get_current().domain)
-    message = render_to_string(body_template, body_dict)
-    bcc = settings.EMAIL_BCC_LIST
-    email = EmailMessage(subject, message, from_email, to, bcc=bcc)
-    email.content_subtype = ct
     if oboe:
         try:
             oboe.Context.log('email', 'info', backtrace=False,**{"template":body_template})
         except Exception, e:
             print >> sys.stderr, "Oboe error: %s" % e
+    return render_to_string(body_template, body_dict)
+
+def make_email(to, subject, body, from_email=None, ct="html"):
+    """Create an EmailMessage from a pre-rendered body
 
+    Args:
+        to: list of email addresses
+    """
+    if not from_email: from_email = settings.DEFAULT_FROM_EMAIL
+    bcc = settings.EMAIL_BCC_LIST
+    email = EmailMessage(subject, body, from_email, to, bcc=bcc)
+    email.content_subtype = ct
     Meter('templated-emails-sent').inc()
+    return email
 
-    return email.send(fail_silently)
+def send_email_batch(emails, fail_silently=False):
+    """Send a list of EmailMessages over a single connection.
+
+    Returns the number of emails sent.
+    """
+    if not emails:
+        return 0
+    connection = get_connection(fail_silently=fail_silently)
+    return connection.send_messages(emails)
 
@@ -19,14 +19,57 @@
 
 """utils.applock -- manage application-level locks
 
-This module handle creating app-wide locks.  We currently implement them using
-the MySQL GET_LOCK() statement.
+Usage:
+
+    with lock('my-lock-name', timeout=10) as held:
+        # do work
+        held.extend()  # if the work takes longer than the lease
+
+Locks have a lease.  If the process holding a lock dies without releasing
+it, the lock expires after APPLOCK_LEASE seconds (or the lease passed to
+lock()).  Long-running code should call HeldLock.extend() before the lease
+runs out.
+
+Each time a lock is acquired, it gets a fencing token that's greater than the
+tokens for previous acquisitions of the same lock.  Code that writes to
+shared resources can store the token and reject writes with older tokens,
+which protects against a process that paused long enough to lose its lease.
+
+The lock data is stored by a backend, selected with the APPLOCK_BACKEND
+setting:
+
+    - "cache" (the default) stores locks in the Django cache using add().
+      The Django cache API has no compare-and-set, so extend() and release()
+      can clobber a lock that another process acquired after our lease
+      expired.  This backend does not provide fencing, use it for locks that
+      only prevent duplicate work.
+    - "db" stores locks as rows in the utils_applock table.  Writes happen in
+      the current transaction, so only use this outside of managed
+      transactions (tasks, management commands).  Use this backend if you
+      rely on the fencing tokens.
+
+Neither backend can notify waiters when a lock is released, so lock() waits
+with randomized exponential backoff rather than checking on a fixed
+interval.
 """
 
 import contextlib
+import datetime
+import logging
+import random
 import time
 
-from django.db import connection
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+
+from utils.metrics import Histogram, Meter
+
+logger = logging.getLogger(__name__)
+
+# Backoff limits when waiting for a lock (in seconds)
+MIN_WAIT = 0.01
+MAX_WAIT = 1.0
 
 class LockBusy(StandardError):
     pass
@@ -34,24 +77,178 @@ class LockBusy(StandardError):
 def _lock_name(name):
     return "amara.%s" % name
 
-def acquire_lock(cursor, name, timeout=None):
+def _default_lease():
+    return getattr(settings, 'APPLOCK_LEASE', 60 * 5)
+
+class CacheLockBackend(object):
+    """Store locks in the django cache.
+
+    extend() and release() check the token with get(), then call set() or
+    delete().  Those aren't atomic, so if our lease expires and another
+    process acquires the lock between the 2 calls we will overwrite or delete
+    its lock.  This means the cache backend does not provide fencing.
+    """
+
+    def _lock_key(self, name):
+        return 'applock:%s' % name
+
+    def _token_key(self, name):
+        return 'applock-token:%s' % name
+
+    def _next_token(self, name):
+        key = self._token_key(name)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Start the counter from the current time in milliseconds.  That
+            # way the tokens keep increasing if the counter gets evicted.
+            cache.add(key, int(time.time() * 1000), 60 * 60 * 24 * 30)
+            return cache.incr(key)
+
+    def try_acquire(self, name, lease):
+        """Try to acquire a lock.
+
+        Returns the fencing token if we got the lock, otherwise None.
+        """
+        key = self._lock_key(name)
+        # Don't create a token unless the lock looks free, so that
+        # contended locks don't burn through tokens.
+        if cache.get(key) is not None:
+            return None
+        token = self._next_token(name)
+        if cache.add(key, token, lease):
+            return token
+        return None
+
+    def extend(self, name, token, lease):
+        key = self._lock_key(name)
+        if cache.get(key) != token:
+            return False
+        cache.set(key, token, lease)
+        return True
+
+    def release(self, name, token):
+        key = self._lock_key(name)
+        if cache.get(key) != token:
+            return False
+        cache.delete(key)
+        return True
+
+class DBLockBackend(object):
+    """Store locks as rows in the utils_applock table."""
+
+    def try_acquire(self, name, lease):
+        from utils.models import AppLock
+        now = datetime.datetime.now()
+        AppLock.objects.get_or_create(name=name)
+        acquired = AppLock.objects.filter(
+            Q(expires__isnull=True) | Q(expires__lte=now), name=name
+        ).update(token=F('token') + 1,
+                 expires=now + datetime.timedelta(seconds=lease))
+        if not acquired:
+            return None
+        # Nobody else can change the row until our lease expires, so it's
+        # safe to read the token now.
+        return AppLock.objects.filter(name=name).values_list(
+            'token', flat=True)[0]
+
+    def extend(self, name, token, lease):
+        from utils.models import AppLock
+        expires = datetime.datetime.now() + datetime.timedelta(seconds=lease)
+        return bool(AppLock.objects.filter(name=name, token=token)
+                    .update(expires=expires))
+
+    def release(self, name, token):
+        from utils.models import AppLock
+        return bool(AppLock.objects.filter(name=name, token=token)
+                    .update(expires=None))
+
+BACKENDS = {
+    'cache': CacheLockBackend,
+    'db': DBLockBackend,
+}
+
+def get_backend():
+    return BACKENDS[getattr(settings, 'APPLOCK_BACKEND', 'cache')]()
+
+class HeldLock(object):
+    """A lock that we've acquired.
+
+    Attributes:
+        name: name of the lock
+        token: fencing token for this acquisition
+        lease: lease length in seconds
+    """
+    def __init__(self, name, token, lease, backend=None):
+        self.name = name
+        self.token = token
+        self.lease = lease
+        self.backend = backend
+
+    def extend(self, lease=None):
+        """Extend the lease on the lock.
+
+        Returns False if we lost the lock because the lease expired.
+        """
+        if lease is None:
+            lease = self.lease
+        return self.backend.extend(_lock_name(self.name), self.token, lease)
+
+def _wait_time(attempt, deadline):
+    wait = min(MIN_WAIT * 2 ** attempt, MAX_WAIT)
+    # Randomize the wait so that waiters don't all retry at once
+    wait = random.uniform(wait / 2, wait)
+    if deadline is not None:
+        wait = min(wait, max(deadline - time.time(), 0))
+    return wait
+
+def acquire_lock(name, timeout=None, lease=None):
+    """Acquire a lock.
+
+    Args:
+        name: name of the lock
+        timeout: how long to wait for the lock.  None means don't wait.
+        lease: how long we can hold the lock before it expires.
+
+    Returns:
+        HeldLock object
+    Raises:
+        LockBusy: the lock is held by someone else.
+    """
+    if lease is None:
+        lease = _default_lease()
+    backend = get_backend()
     start_time = time.time()
+    deadline = start_time + timeout if timeout is not None else None
+    attempt = 0
     while True:
-        cursor.execute("SELECT GET_LOCK(%s, 0)", (_lock_name(name),))
-        rv = cursor.fetchone()[0]
-        if rv != 0:
+        token = backend.try_acquire(_lock_name(name), lease)
+        if token is not None:
             break
-        if timeout is None or time.time() >= start_time + timeout:
+        if attempt == 0:
+            Meter('applock.contended.%s' % name).inc()
+        if deadline is None or time.time() >= deadline:
+            Meter('applock.busy.%s' % name).inc()
             raise LockBusy()
-        time.sleep(0.1)
+        time.sleep(_wait_time(attempt, deadline))
+        attempt += 1
+    Histogram('applock.wait-time.%s' % name).record(
+        (time.time() - start_time) * 1000)
+    return HeldLock(name, token, lease, backend)
 
-def release_lock(cursor, name):
-    cursor.execute("SELECT RELEASE_LOCK(%s)", (_lock_name(name),))
+def release_lock(held_lock):
+    if not held_lock.backend.release(_lock_name(held_lock.name),
+                                     held_lock.token):
+        logger.warn("Lock %s expired before it was released", held_lock.name)
 
 @contextlib.contextmanager
-def lock(name, timeout=None):
-    """Context manager that manages an app-wide lock."""
-    cursor = connection.cursor()
-    acquire_lock(cursor, name, timeout=timeout)
-    yield
-    release_lock(cursor, name)
+def lock(name, timeout=None, lease=None):
+    """Context manager that manages an app-wide lock.
+
+    The context manager returns a HeldLock object.
+    """
+    held_lock = acquire_lock(name, timeout=timeout, lease=lease)
+    try:
+        yield held_lock
+    finally:
+        release_lock(held_lock)
@@ -1,11 +1,40 @@
-import time
+"""utils.celery_search_index -- Update the search index from celery
+
+Updating the search index one object at a time means a Solr request for each
+save, which gets slow during imports and bulk operations.  Instead,
+queue_update() adds the object to a per-model queue stored in the cache and
+schedules a flush_search_index_queue task.  That task runs
+SEARCH_INDEX_FLUSH_INTERVAL seconds later and updates all the queued objects
+with one Solr request for each batch of SEARCH_INDEX_BATCH_SIZE objects.
+
+Search indexes can define a prepare_batch() method to fetch data for a batch
+of objects before they get prepared.
+
+The queue is stored as a counter and a cache key for each slot in the queue,
+since memcached doesn't have a set type.
+"""
+
+import logging
 
 from celery.task import task
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import signals
 from haystack import indexes, site
 from haystack.exceptions import NotRegistered
 from haystack.utils import get_identifier
 
+from utils.metrics import Histogram, Meter, Timer
+
+# How long to keep the queue state in the cache
+QUEUE_TIMEOUT = 60 * 60 * 24 * 7
+
+def _flush_interval():
+    return getattr(settings, 'SEARCH_INDEX_FLUSH_INTERVAL', 10)
+
+def _batch_size():
+    return getattr(settings, 'SEARCH_INDEX_BATCH_SIZE', 100)
+
 class CelerySearchIndex(indexes.SearchIndex):
     def _setup_save(self, model):
         signals.post_save.connect(self.update_handler, sender=model)
@@ -20,18 +49,148 @@ class CelerySearchIndex(indexes.SearchIndex):
         signals.post_delete.disconnect(self.remove_handler, sender=model)
 
     def update_handler(self, instance, **kwargs):
-        update_search_index.deplay(instance.__class__, instance.pk)
+        queue_update(instance.__class__, instance.pk)
 
     def remove_handler(self, instance, **kwargs):
         remove_search_index.delay(instance.__class__, get_identifier(instance))
 
+    def prepare_batch(self, objects):
+        """Fetch data for a batch of objects that are about to be prepared.
+
+        Subclasses can override this to fetch related data for all the objects
+        at once, rather than in prepare() for each object.
+        """
+        pass
+
 
 def log(*args, **kwargs):
-    import logging
     logger = logging.getLogger('search.index.updater')
     logger.warning(*args, **kwargs)
 
 
+class IndexQueue(object):
+    """Queue of objects waiting to be updated in the search index."""
+    def __init__(self, model_class):
+        self.model_class = model_class
+        self.key_prefix = 'search-index-queue:%s.%s' % (
+            model_class._meta.app_label, model_class._meta.object_name)
+        self.counter_key = self.key_prefix + ':counter'
+        self.flushed_key = self.key_prefix + ':flushed'
+        self.scheduled_key = self.key_prefix + ':scheduled'
+        self.lock_key = self.key_prefix + ':lock'
+
+    def slot_key(self, position):
+        return '%s:%s' % (self.key_prefix, position)
+
+    def _next_position(self):
+        try:
+            return cache.incr(self.counter_key)
+        except ValueError:
+            # The counter isn't set or was evicted.  Start it where the
+            # flushes left off so that we don't reuse positions.
+            cache.add(self.counter_key, cache.get(self.flushed_key, 0),
+                      QUEUE_TIMEOUT)
+            return cache.incr(self.counter_key)
+
+    def add(self, pk):
+        cache.set(self.slot_key(self._next_position()), pk, QUEUE_TIMEOUT)
+
+    def pop(self):
+        """Remove up to batch_size pks from the queue
+
+        Returns a tuple (pks, missing_keys).  missing_keys are the slot keys
+        that we didn't find in the cache.  Usually this means that they were
+        evicted, but it could also mean that add() has incremented the
+        counter and hasn't stored the pk yet.
+        """
+        start = cache.get(self.flushed_key, 0)
+        end = min(cache.get(self.counter_key, 0), start + _batch_size())
+        if end <= start:
+            return [], []
+        keys = [self.slot_key(i) for i in xrange(start + 1, end + 1)]
+        values = cache.get_many(keys)
+        cache.set(self.flushed_key, end, QUEUE_TIMEOUT)
+        cache.delete_many(values.keys())
+        missing_keys = [key for key in keys if key not in values]
+        return set(values.values()), missing_keys
+
+    def pop_late(self, missing_keys):
+        """Check for pks that were missing when we called pop()."""
+        values = cache.get_many(missing_keys)
+        cache.delete_many(values.keys())
+        return set(values.values())
+
+    def is_empty(self):
+        return (cache.get(self.counter_key, 0) <=
+                cache.get(self.flushed_key, 0))
+
+    def schedule_flush(self):
+        if cache.add(self.scheduled_key, 1, _flush_interval()):
+            flush_search_index_queue.apply_async(
+                args=(self.model_class,), countdown=_flush_interval())
+
+    def acquire_lock(self):
+        return cache.add(self.lock_key, 1, 60 * 10)
+
+    def release_lock(self):
+        cache.delete(self.lock_key)
+
+def queue_update(model_class, pk):
+    """Queue an object to be updated in the search index.
+
+    This is the preferred way to update the index, since it batches together
+    updates that happen close together.  Use the update_search_index task
+    instead if you need the update to happen right away.
+    """
+    queue = IndexQueue(model_class)
+    queue.add(pk)
+    queue.schedule_flush()
+
+def update_objects(model_class, pks):
+    """Update a batch of objects in the search index with 1 request."""
+    try:
+        search_index = site.get_index(model_class)
+    except NotRegistered:
+        log(u'Search index is not registered for %s' % model_class)
+        return
+    objects = list(search_index.index_queryset().filter(pk__in=pks))
+    if not objects:
+        return
+    prepare_batch = getattr(search_index, 'prepare_batch', None)
+    if prepare_batch is not None:
+        prepare_batch(objects)
+    search_index.backend.update(search_index, objects)
+    Histogram('search-index.batch-size').record(len(objects))
+
+@task()
+def flush_search_index_queue(model_class):
+    queue = IndexQueue(model_class)
+    # Allow new updates to schedule another flush
+    cache.delete(queue.scheduled_key)
+    if not queue.acquire_lock():
+        # Another task is flushing the queue.  It will schedule a new flush
+        # if needed once it's done.
+        return
+    try:
+        with Timer('search-index.flush-time'):
+            missing_keys = []
+            while True:
+                pks, batch_missing_keys = queue.pop()
+                if not pks and not batch_missing_keys:
+                    break
+                update_objects(model_class, pks)
+                missing_keys.extend(batch_missing_keys)
+            if missing_keys:
+                late_pks = queue.pop_late(missing_keys)
+                if late_pks:
+                    update_objects(model_class, late_pks)
+                Meter('search-index.missing-queue-slots').inc(
+                    len(missing_keys) - len(late_pks))
+    finally:
+        queue.release_lock()
+    if not queue.is_empty():
+        queue.schedule_flush()
+
 @task()
 def remove_search_index(model_class, obj_identifier):
     try:
@@ -9,3 +9,19 @@ class ErrorHandlingCommand(BaseCommand):
     def print_to_console(self, msg, min_verbosity=1):
         if self.verbosity >= min_verbosity:
             print msg
+
+
+def reset_connections():
+    """Reset the DB connections after forking a worker process.
+
+    Otherwise the different processes will try to share the connection, which
+    causes things to blow up.
+    """
+    from django.db import connections
+
+    for alias, info in connections.databases.items():
+        if not 'sqlite3' in info['ENGINE']:
+            try:
+                del(connections._connections[alias])
+            except KeyError:
+                pass
@@ -0,0 +1,82 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""utils.lrucache -- Process-local LRU cache with a size budget."""
+
+import threading
+from collections import OrderedDict
+
+class LRUCache(object):
+    """Least-recently-used cache bounded by the total size of its values.
+
+    Each value is stored with a size, which is whatever unit the caller
+    wants (normally an estimate of bytes).  When the total size goes over
+    max_size, the least recently used values are evicted.  Values bigger than
+    max_size are never stored.
+
+    This cache is local to the process, so it's only appropriate for data that
+    never changes, or where the caller handles invalidation.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.current_size = 0
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            # re-insert to move the key to the most recently used position
+            self._data[key] = (value, size)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size):
+        with self._lock:
+            self._remove(key)
+            if size > self.max_size:
+                return
+            self._data[key] = (value, size)
+            self.current_size += size
+            while self.current_size > self.max_size:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_size = 0
+
+    def _remove(self, key):
+        if key in self._data:
+            value, size = self._data.pop(key)
+            self.current_size -= size
@@ -1 +1,9 @@
-# Blank file to ensure Django loads this as an app properly.
+from django.db import models
+
+class AppLock(models.Model):
+    """Lock row used by utils.applock.DBLockBackend."""
+    name = models.CharField(max_length=255, unique=True)
+    # fencing token, incremented each time the lock is acquired
+    token = models.BigIntegerField(default=0)
+    # when the lock expires, or NULL if it's not held
+    expires = models.DateTimeField(blank=True, null=True)
@@ -1,17 +1,24 @@
 import datetime, time
 import json as json
+import os
+import threading
 from Cookie import SimpleCookie
 from inspect import getargspec
+from multiprocessing.pool import ThreadPool
 from urllib import urlencode, quote
 
+from django.conf import settings
 from django.core.serializers.json import DateTimeAwareJSONEncoder
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import connection, models
 from django.http import HttpResponse
+from django.utils import translation
 from django.utils.datastructures import MultiValueDict
 from django.utils.encoding import smart_str, force_unicode
 from django.utils.functional import Promise
 
+from utils.metrics import Histogram, Timer
+
 
 class LazyEncoder(DateTimeAwareJSONEncoder):
     """
@@ -106,6 +113,47 @@ class RpcHttpResponse(RpcResponse):
         if secure:
             self.cookies[key]['secure'] = True
 
+class RpcBatchContext(object):
+    """Data shared by all the calls in one RPC batch.
+
+    The client sends bursts of calls that concern the same objects.  Methods
+    decorated with add_context_to_kwargs get this object as the context
+    argument, and can use memoize() so that the lookups only happen once per
+    batch.
+
+    Attributes:
+        request: the HttpRequest for the batch
+        user: request.user, resolved once for the batch
+    """
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        # force the lazy user object to be loaded now, rather than in one of
+        # the worker threads
+        self.user.is_authenticated()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def memoize(self, key, func, *args, **kwargs):
+        """Get a value, calling func to calculate it the first time."""
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        value = func(*args, **kwargs)
+        with self._lock:
+            return self._cache.setdefault(key, value)
+
+# Maps pid -> ThreadPool.  We store the pid so that we don't try to use the
+# parent's threads after a fork.
+_pools = {}
+
+def _get_pool():
+    pid = os.getpid()
+    if pid not in _pools:
+        _pools.clear()
+        _pools[pid] = ThreadPool(settings.RPC_BATCH_CONCURRENCY)
+    return _pools[pid]
+
 # For jQuery.Rpc
 class RpcRouter(object):
     """
@@ -152,9 +200,7 @@ class RpcRouter(object):
 
         output = []
 
-        for rd in requests:
-            mr = self.call_action(rd, request, *args, **kwargs)
-
+        for mr in self.call_batch(requests, request, *args, **kwargs):
             #This looks like a little ugly
             if 'result' in mr and isinstance(mr['result'], RpcHttpResponse):
                 for key, val in mr['result'].cookies.items():
@@ -167,6 +213,55 @@ class RpcRouter(object):
 
         return response
 
+    def call_batch(self, requests, request, *args, **kwargs):
+        """Run a batch of calls and return the results in order.
+
+        All calls share one RpcBatchContext.  If every call in the batch is
+        marked with readonly, we run them concurrently using a pool of
+        RPC_BATCH_CONCURRENCY threads.  Otherwise the calls run one after
+        another, since later calls may depend on earlier ones.
+        """
+        request.rpc_context = RpcBatchContext(request)
+        Histogram('rpc.batch-size').record(len(requests))
+        if (len(requests) > 1 and
+                getattr(settings, 'RPC_BATCH_CONCURRENCY', 1) > 1 and
+                all(self.is_readonly(rd) for rd in requests)):
+            language = translation.get_language()
+            def run_call(rd):
+                translation.activate(language)
+                try:
+                    return self.timed_call_action(rd, request, *args,
+                                                  **kwargs)
+                finally:
+                    translation.deactivate()
+                    # Each thread gets its own DB connection, close it so
+                    # that we don't leak them.
+                    connection.close()
+            return _get_pool().map(run_call, requests)
+        else:
+            return [self.timed_call_action(rd, request, *args, **kwargs)
+                    for rd in requests]
+
+    def is_readonly(self, rd):
+        action = self.actions.get(rd.get('action'))
+        method = getattr(action, rd.get('method') or '', None)
+        return getattr(method, '_readonly', False)
+
+    def timed_call_action(self, rd, request, *args, **kwargs):
+        with Timer(self.timer_name(rd)):
+            return self.call_action(rd, request, *args, **kwargs)
+
+    def timer_name(self, rd):
+        # The action/method names come from the client, so only use them for
+        # the metric name if they exist.  Otherwise clients could create any
+        # number of metrics.
+        action = self.actions.get(rd.get('action'))
+        method = rd.get('method')
+        if (action is None or not isinstance(method, basestring) or
+                not hasattr(action, method)):
+            return 'rpc.unknown'
+        return 'rpc.%s.%s' % (rd['action'], method)
+
     def action_extra_kwargs(self, action, request, *args, **kwargs):
         """
         Check maybe this action get some extra arguments from request
@@ -310,3 +405,24 @@ def add_request_to_kwargs(func):
 
     func._extra_kwargs = extra_kwargs_func
     return func
+
+def add_context_to_kwargs(func):
+    """Pass the RpcBatchContext for the call as the context argument.
+
+    Note: this replaces add_request_to_kwargs, use context.request to get the
+    request.
+    """
+    def extra_kwargs_func(request, *args, **kwargs):
+        return dict(context=request.rpc_context)
+
+    func._extra_kwargs = extra_kwargs_func
+    return func
+
+def readonly(func):
+    """Mark an RPC method as not changing any data.
+
+    Batches made up of only readonly methods can run concurrently, so these
+    methods need to be thread-safe.
+    """
+    func._readonly = True
+    return func
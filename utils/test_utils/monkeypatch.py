@@ -42,12 +42,14 @@ from celery.task import Task
 import mock
 
 from subtitles.workflows import SaveDraft
+from utils import applock
 import externalsites.google
 
 save_thumbnail_in_s3 = mock.Mock()
 video_changed_tasks = mock.Mock()
 update_team_video = mock.Mock()
 update_search_index = mock.Mock()
+queue_search_index_update = mock.Mock()
 
 test_video_info = externalsites.google.VideoInfo(
     'test-channel-id', 'test-title', 'test-description', 60,
@@ -61,12 +63,15 @@ youtube_get_uploaded_video_ids = mock.Mock(return_value=[])
 url_exists = mock.Mock(return_value=True)
 
 current_locks = set()
-acquire_lock = mock.Mock(
-    side_effect=lambda c, name, timeout=None: current_locks.add(name))
+def _mock_acquire_lock(name, timeout=None, lease=None):
+    current_locks.add(name)
+    return applock.HeldLock(name, len(current_locks), lease)
+acquire_lock = mock.Mock(side_effect=_mock_acquire_lock)
 release_lock = mock.Mock(
-    side_effect=lambda c, name: current_locks.remove(name))
+    side_effect=lambda held_lock: current_locks.remove(held_lock.name))
 invalidate_widget_video_cache = mock.Mock()
 update_subtitles = mock.Mock()
+update_subtitles_batch = mock.Mock()
 delete_subtitles = mock.Mock()
 update_all_subtitles = mock.Mock()
 fetch_subs_task = mock.Mock()
@@ -84,6 +89,8 @@ class MonkeyPatcher(object):
             ('teams.tasks.update_one_team_video', update_team_video),
             ('utils.celery_search_index.update_search_index',
              update_search_index),
+            ('utils.celery_search_index.queue_update',
+             queue_search_index_update),
             ('externalsites.google.get_video_info', youtube_get_video_info),
             ('externalsites.google.get_youtube_user_info',
              youtube_get_user_info),
@@ -101,6 +108,8 @@ class MonkeyPatcher(object):
             ('widget.video_cache.invalidate_cache',
              invalidate_widget_video_cache),
             ('externalsites.tasks.update_subtitles', update_subtitles),
+            ('externalsites.tasks.update_subtitles_batch',
+             update_subtitles_batch),
             ('externalsites.tasks.delete_subtitles', delete_subtitles),
             ('externalsites.tasks.update_all_subtitles', update_all_subtitles),
             ('externalsites.tasks.fetch_subs', fetch_subs_task),
@@ -65,8 +65,10 @@ class UnisubsTestPlugin(Plugin):
         xvfb.stop_xvfb()
 
     def afterTest(self, test):
+        from subtitles.cache import parsed_subtitles_cache
         self.patcher.reset_mocks()
         cache.clear()
+        parsed_subtitles_cache.clear()
         test_case_complete.send(self)
 
     def wantDirectory(self, dirname):
@@ -97,6 +97,11 @@ class RequestsMocker(object):
             patcher = mock.patch('requests.%s' % method, mock_obj)
             patcher.start()
             self.patchers.append(patcher)
+        # Also patch requests made with sessions
+        patcher = mock.patch('requests.sessions.Session.request',
+                             mock.Mock(side_effect=self.mock_request))
+        patcher.start()
+        self.patchers.append(patcher)
 
     def unpatch(self):
         for patcher in self.patchers:
@@ -115,7 +120,8 @@ class RequestsMocker(object):
     def mock_delete(self, url, params=None, data=None, headers=None):
         return self.check_request('delete', url, params, data, headers)
 
-    def mock_request(self, method, url, params=None, data=None, headers=None):
+    def mock_request(self, method, url, params=None, data=None, headers=None,
+                     **kwargs):
         return self.check_request(method.lower(), url, params, data, headers)
 
     def check_request(self, method, url, params, data, headers):
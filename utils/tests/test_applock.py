@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import datetime
+
+from django.test import TestCase
+from nose.tools import *
+
+from utils import applock
+from utils import test_utils
+from utils.models import AppLock
+
+class BackendTestMixin(object):
+    def test_acquire_release(self):
+        token = self.backend.try_acquire('test', 60)
+        assert_not_equal(token, None)
+        assert_equal(self.backend.try_acquire('test', 60), None)
+        assert_true(self.backend.release('test', token))
+        assert_not_equal(self.backend.try_acquire('test', 60), None)
+
+    def test_fencing_tokens_increase(self):
+        token1 = self.backend.try_acquire('test', 60)
+        self.backend.release('test', token1)
+        token2 = self.backend.try_acquire('test', 60)
+        assert_true(token2 > token1)
+
+    def test_release_with_old_token(self):
+        token = self.backend.try_acquire('test', 60)
+        self.expire_lock('test')
+        new_token = self.backend.try_acquire('test', 60)
+        assert_not_equal(new_token, None)
+        # releasing with the old token shouldn't affect the new holder
+        assert_false(self.backend.release('test', token))
+        assert_false(self.backend.extend('test', token, 60))
+        assert_equal(self.backend.try_acquire('test', 60), None)
+
+class CacheLockBackendTest(BackendTestMixin, TestCase):
+    def setUp(self):
+        self.backend = applock.CacheLockBackend()
+
+    def expire_lock(self, name):
+        applock.cache.delete(self.backend._lock_key(name))
+
+class DBLockBackendTest(BackendTestMixin, TestCase):
+    def setUp(self):
+        self.backend = applock.DBLockBackend()
+
+    def expire_lock(self, name):
+        AppLock.objects.filter(name=name).update(
+            expires=datetime.datetime.now() - datetime.timedelta(seconds=1))
+
+class LockTest(TestCase):
+    def test_release_on_exception(self):
+        with assert_raises(ValueError):
+            with applock.lock('test'):
+                assert_equal(test_utils.current_locks, set(['test']))
+                raise ValueError()
+        assert_equal(test_utils.current_locks, set())
+
+    def test_lock_busy(self):
+        test_utils.acquire_lock.run_original_for_test()
+        test_utils.release_lock.run_original_for_test()
+        with applock.lock('test') as held_lock:
+            with assert_raises(applock.LockBusy):
+                applock.acquire_lock('test', timeout=0.05)
+        # after the lock is released, we can acquire it again
+        applock.release_lock(applock.acquire_lock('test'))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.core.cache import cache
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from utils import celery_search_index
+from utils.celery_search_index import IndexQueue, flush_search_index_queue
+from videos.models import Video
+
+class IndexQueueTest(TestCase):
+    def setUp(self):
+        self.queue = IndexQueue(Video)
+
+    def test_pop(self):
+        for pk in [1, 2, 3, 4, 3, 5]:
+            self.queue.add(pk)
+        with self.settings(SEARCH_INDEX_BATCH_SIZE=4):
+            assert_equal(self.queue.pop(), (set([1, 2, 3, 4]), []))
+            assert_equal(self.queue.pop(), (set([3, 5]), []))
+            assert_equal(self.queue.pop(), ([], []))
+        assert_true(self.queue.is_empty())
+
+    def test_late_slot(self):
+        # Simulate add() being called at the same time as pop().  The counter
+        # gets incremented, but the pk isn't set yet.
+        position = self.queue._next_position()
+        self.queue.add(1)
+        pks, missing_keys = self.queue.pop()
+        assert_equal(pks, set([1]))
+        assert_equal(missing_keys, [self.queue.slot_key(position)])
+        cache.set(self.queue.slot_key(position), 2)
+        assert_equal(self.queue.pop_late(missing_keys), set([2]))
+
+    def test_counter_evicted(self):
+        self.queue.add(1)
+        self.queue.pop()
+        cache.delete(self.queue.counter_key)
+        self.queue.add(2)
+        assert_equal(self.queue.pop(), (set([2]), []))
+
+    def test_flush(self):
+        for pk in [1, 2, 3]:
+            self.queue.add(pk)
+        with mock.patch.object(celery_search_index,
+                               'update_objects') as update_objects:
+            with self.settings(SEARCH_INDEX_BATCH_SIZE=2):
+                flush_search_index_queue.apply(args=(Video,))
+        assert_equal(update_objects.call_args_list, [
+            ((Video, set([1, 2])), {}),
+            ((Video, set([3])), {}),
+        ])
+        assert_true(self.queue.is_empty())
+
+    def test_flush_locked(self):
+        self.queue.add(1)
+        self.queue.acquire_lock()
+        with mock.patch.object(celery_search_index,
+                               'update_objects') as update_objects:
+            flush_search_index_queue.apply(args=(Video,))
+        assert_equal(update_objects.call_count, 0)
+        assert_false(self.queue.is_empty())
@@ -0,0 +1,58 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.test import TestCase
+from nose.tools import *
+
+from utils.lrucache import LRUCache
+
+class LRUCacheTest(TestCase):
+    def test_get_set(self):
+        cache = LRUCache(100)
+        cache.set('a', 'value', 10)
+        assert_equal(cache.get('a'), 'value')
+        assert_equal(cache.get('b'), None)
+        assert_equal(cache.hits, 1)
+        assert_equal(cache.misses, 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(30)
+        cache.set('a', 1, 10)
+        cache.set('b', 2, 10)
+        cache.set('c', 3, 10)
+        # accessing a makes b the least recently used
+        cache.get('a')
+        cache.set('d', 4, 10)
+        assert_equal(cache.get('b'), None)
+        assert_equal(cache.get('a'), 1)
+        assert_equal(cache.current_size, 30)
+
+    def test_too_big(self):
+        cache = LRUCache(30)
+        cache.set('a', 1, 31)
+        assert_false('a' in cache)
+        assert_equal(cache.current_size, 0)
+
+    def test_replace_and_delete(self):
+        cache = LRUCache(30)
+        cache.set('a', 1, 10)
+        cache.set('a', 2, 20)
+        assert_equal(cache.current_size, 20)
+        cache.delete('a')
+        assert_equal(cache.current_size, 0)
+        assert_equal(len(cache), 0)
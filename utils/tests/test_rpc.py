@@ -0,0 +1,103 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+import threading
+
+from django.test import TestCase
+from django.test.client import RequestFactory
+from nose.tools import *
+
+from utils.factories import *
+from utils.rpc import RpcRouter, add_context_to_kwargs, readonly
+
+class TestApi(object):
+    def __init__(self):
+        self.lookups = []
+        self.threads = []
+
+    def _lookup(self, key):
+        self.lookups.append(key)
+        return key.upper()
+
+    @readonly
+    @add_context_to_kwargs
+    def lookup(self, key, user, context):
+        self.threads.append(threading.current_thread())
+        return context.memoize(key, self._lookup, key)
+
+    def write(self, value, user):
+        self.threads.append(threading.current_thread())
+        return value
+
+class RpcBatchTest(TestCase):
+    def setUp(self):
+        self.api = TestApi()
+        self.router = RpcRouter('videos:rpc_router', {'TestApi': self.api})
+        self.request = RequestFactory().post('/')
+        self.request.user = UserFactory()
+
+    def call(self, method, *args):
+        return {
+            'action': 'TestApi',
+            'method': method,
+            'data': list(args),
+            'tid': 1,
+        }
+
+    def run_batch(self, *calls):
+        return [rv.get('result') for rv in
+                self.router.call_batch(calls, self.request)]
+
+    def test_shared_context(self):
+        results = self.run_batch(self.call('lookup', 'a'),
+                                 self.call('lookup', 'a'),
+                                 self.call('lookup', 'b'))
+        assert_equal(results, ['A', 'A', 'B'])
+        assert_equal(sorted(self.api.lookups), ['a', 'b'])
+
+    def test_context_per_batch(self):
+        self.run_batch(self.call('lookup', 'a'))
+        self.run_batch(self.call('lookup', 'a'))
+        assert_equal(self.api.lookups, ['a', 'a'])
+
+    def test_readonly_batch_runs_concurrently(self):
+        with self.settings(RPC_BATCH_CONCURRENCY=2):
+            results = self.run_batch(*[self.call('lookup', name)
+                                       for name in 'abcd'])
+        # results should be in order, even though the calls ran in worker
+        # threads
+        assert_equal(results, ['A', 'B', 'C', 'D'])
+        assert_false(threading.current_thread() in self.api.threads)
+
+    def test_mixed_batch_runs_in_order(self):
+        # If any call can change data, the batch should run sequentially
+        with self.settings(RPC_BATCH_CONCURRENCY=2):
+            results = self.run_batch(self.call('write', 'a'),
+                                     self.call('lookup', 'b'))
+        assert_equal(results, ['a', 'B'])
+        assert_equal(self.api.threads, [threading.current_thread()] * 2)
+
+    def test_timer_name(self):
+        assert_equal(self.router.timer_name(self.call('lookup')),
+                     'rpc.TestApi.lookup')
+        # client-supplied names that don't exist shouldn't create new metrics
+        assert_equal(self.router.timer_name(self.call('bogus-method')),
+                     'rpc.unknown')
+        assert_equal(self.router.timer_name({'action': 'Bogus',
+                                             'method': 'lookup'}),
+                     'rpc.unknown')